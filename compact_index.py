@@ -0,0 +1,313 @@
+# Gelin Eguinosa Rosique
+
+import mmap
+import json
+import struct
+from os import replace
+from os.path import isfile
+from collections.abc import Mapping
+from multiprocessing import get_context
+
+from time_keeper import TimeKeeper
+from extra_funcs import peak_memory
+
+
+# Binary layout of the file (all integers are little-endian):
+# - Header: magic word, version, and the position of each of the sections.
+# - Text blob: UTF-8 bytes of every string saved in the index.
+# - String table: (offset, length) of the interned strings (cord_uids,
+#   publish times, authors and file paths) inside the text blob.
+# - List table: the ids of the interned strings in the authors, pdf and pmc
+#   lists of the papers.
+# - Records: one fixed-width record per paper, in the order of the original
+#   index.
+# - Offset table: the position of the records sorted by 'cord_uid', to find a
+#   paper using binary search.
+_MAGIC = b'CORDIDX1'
+_VERSION = 1
+_HEADER = struct.Struct('<8sIIQQQQQQQ')
+_STRING = struct.Struct('<QI')
+_RECORD = struct.Struct('<IQIQIIIIIIIIB')
+_UINT = struct.Struct('<I')
+
+# Flags to know if a paper has the 'pdf_json_files' or 'pmc_json_files' keys.
+_HAS_PDF = 1
+_HAS_PMC = 2
+
+
+class CompactPapersIndex(Mapping):
+    """
+    Read-only view of the Papers' Index saved in a compact binary file. The
+    file is memory-mapped, and the information of a paper is only decoded when
+    it is requested, returning the same dictionary the JSON index would have.
+    """
+
+    def __init__(self, index_path):
+        """
+        Memory-map the binary index file located in 'index_path'.
+        :param index_path: The path of the compact index file.
+        """
+        with open(index_path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Read the Header of the file.
+        header = _HEADER.unpack_from(self._mmap, 0)
+        magic, version, self._num_papers = header[:3]
+        if magic != _MAGIC or version != _VERSION:
+            raise Exception("The file is not a valid compact papers index.")
+        (self._blob_start, self._strings_start, self._lists_start,
+         self._records_start, self._offsets_start, _) = header[3:9]
+
+    def __getitem__(self, cord_uid):
+        """
+        Decode the information of the paper 'cord_uid'.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: A dictionary with the information of the paper.
+        """
+        record_i = self._find_record(cord_uid)
+        if record_i < 0:
+            raise KeyError(cord_uid)
+        return self._decode_record(record_i)
+
+    def __contains__(self, cord_uid):
+        return isinstance(cord_uid, str) and self._find_record(cord_uid) >= 0
+
+    def __iter__(self):
+        """
+        Iterate through the 'cord_uid' of the papers, in the same order they
+        had in the original index.
+        """
+        for record_i in range(self._num_papers):
+            record_offset = self._records_start + record_i * _RECORD.size
+            uid_id = _UINT.unpack_from(self._mmap, record_offset)[0]
+            yield self._string(uid_id)
+
+    def __len__(self):
+        return self._num_papers
+
+    def _text(self, offset, length):
+        """
+        Decode a string saved in the text blob.
+        """
+        start = self._blob_start + offset
+        return self._mmap[start:start + length].decode('utf-8')
+
+    def _string(self, string_id):
+        """
+        Decode the interned string with the id 'string_id'.
+        """
+        string_offset = self._strings_start + string_id * _STRING.size
+        offset, length = _STRING.unpack_from(self._mmap, string_offset)
+        return self._text(offset, length)
+
+    def _string_list(self, start, count):
+        """
+        Decode a list of interned strings saved in the list table.
+        """
+        list_offset = self._lists_start + start * _UINT.size
+        string_ids = struct.unpack_from(f'<{count}I', self._mmap, list_offset)
+        return [self._string(string_id) for string_id in string_ids]
+
+    def _record_uid_bytes(self, record_i):
+        """
+        Get the encoded 'cord_uid' of a record, to compare it during the binary
+        search without decoding it.
+        """
+        record_offset = self._records_start + record_i * _RECORD.size
+        uid_id = _UINT.unpack_from(self._mmap, record_offset)[0]
+        string_offset = self._strings_start + uid_id * _STRING.size
+        offset, length = _STRING.unpack_from(self._mmap, string_offset)
+        start = self._blob_start + offset
+        return self._mmap[start:start + length]
+
+    def _find_record(self, cord_uid):
+        """
+        Use binary search in the offset table to find the position of the
+        record of the paper 'cord_uid'.
+        :return: The position of the record, or -1 if the paper is not in the
+        index.
+        """
+        uid_bytes = cord_uid.encode('utf-8')
+        low, high = 0, self._num_papers
+        while low < high:
+            middle = (low + high) // 2
+            record_i = _UINT.unpack_from(
+                self._mmap, self._offsets_start + middle * _UINT.size)[0]
+            middle_bytes = self._record_uid_bytes(record_i)
+            if middle_bytes < uid_bytes:
+                low = middle + 1
+            elif middle_bytes > uid_bytes:
+                high = middle
+            else:
+                return record_i
+        return -1
+
+    def _decode_record(self, record_i):
+        """
+        Create the dictionary of the paper saved in the given record.
+        """
+        record_offset = self._records_start + record_i * _RECORD.size
+        (uid_id, title_offset, title_length, abstract_offset, abstract_length,
+         time_id, authors_start, authors_count, pdf_start, pdf_count,
+         pmc_start, pmc_count, flags) = _RECORD.unpack_from(self._mmap,
+                                                             record_offset)
+        paper_dict = {
+            'cord_uid': self._string(uid_id),
+            'title': self._text(title_offset, title_length),
+            'abstract': self._text(abstract_offset, abstract_length),
+            'publish_time': self._string(time_id),
+            'authors': self._string_list(authors_start, authors_count),
+        }
+        if flags & _HAS_PDF:
+            paper_dict['pdf_json_files'] = self._string_list(pdf_start, pdf_count)
+        if flags & _HAS_PMC:
+            paper_dict['pmc_json_files'] = self._string_list(pmc_start, pmc_count)
+        return paper_dict
+
+    def close(self):
+        """
+        Release the memory-mapped file.
+        """
+        self._mmap.close()
+
+
+def save_compact_index(papers_index, index_path):
+    """
+    Save the Papers' Index in the compact binary format read by
+    CompactPapersIndex. The file is written to a temporary location first, so
+    an interrupted save never leaves a broken index behind.
+    :param papers_index: Dictionary with the information of the CORD-19 papers.
+    :param index_path: The path of the file where the index will be saved.
+    """
+    blob = bytearray()
+    strings = []
+    string_ids = {}
+    lists = []
+    records = []
+
+    def add_text(text):
+        # Save the text in the blob, and return its position.
+        text_bytes = text.encode('utf-8')
+        offset = len(blob)
+        blob.extend(text_bytes)
+        return offset, len(text_bytes)
+
+    def intern(text):
+        # Save the string only once, and return its id.
+        if text not in string_ids:
+            string_ids[text] = len(strings)
+            strings.append(add_text(text))
+        return string_ids[text]
+
+    def add_list(texts):
+        # Save the ids of the strings in the list table.
+        start = len(lists)
+        lists.extend(intern(text) for text in texts)
+        return start, len(texts)
+
+    # Encode the papers in the order of the original index.
+    for cord_uid, paper_dict in papers_index.items():
+        uid_id = intern(cord_uid)
+        title_offset, title_length = add_text(paper_dict['title'])
+        abstract_offset, abstract_length = add_text(paper_dict['abstract'])
+        time_id = intern(paper_dict['publish_time'])
+        authors_start, authors_count = add_list(paper_dict['authors'])
+        flags = 0
+        pdf_start, pdf_count = 0, 0
+        if 'pdf_json_files' in paper_dict:
+            flags |= _HAS_PDF
+            pdf_start, pdf_count = add_list(paper_dict['pdf_json_files'])
+        pmc_start, pmc_count = 0, 0
+        if 'pmc_json_files' in paper_dict:
+            flags |= _HAS_PMC
+            pmc_start, pmc_count = add_list(paper_dict['pmc_json_files'])
+        records.append((uid_id, title_offset, title_length, abstract_offset,
+                        abstract_length, time_id, authors_start, authors_count,
+                        pdf_start, pdf_count, pmc_start, pmc_count, flags))
+
+    # Sort the records by the encoded 'cord_uid' for the binary search.
+    uids = list(papers_index)
+    sorted_records = sorted(range(len(uids)),
+                            key=lambda i: uids[i].encode('utf-8'))
+
+    # Positions of the sections in the file.
+    blob_start = _HEADER.size
+    strings_start = blob_start + len(blob)
+    lists_start = strings_start + len(strings) * _STRING.size
+    records_start = lists_start + len(lists) * _UINT.size
+    offsets_start = records_start + len(records) * _RECORD.size
+    file_size = offsets_start + len(sorted_records) * _UINT.size
+
+    temp_path = index_path + '.temp'
+    with open(temp_path, 'wb') as file:
+        file.write(_HEADER.pack(_MAGIC, _VERSION, len(records), blob_start,
+                                strings_start, lists_start, records_start,
+                                offsets_start, file_size, 0))
+        file.write(blob)
+        for offset, length in strings:
+            file.write(_STRING.pack(offset, length))
+        file.write(struct.pack(f'<{len(lists)}I', *lists))
+        for record in records:
+            file.write(_RECORD.pack(*record))
+        file.write(struct.pack(f'<{len(sorted_records)}I', *sorted_records))
+    replace(temp_path, index_path)
+
+
+def _index_load_stats(index_path, index_format):
+    """
+    Load the papers' index in the given format and measure how long it took and
+    how much memory it added to the process. Meant to run in a fresh process.
+    :param index_path: The path of the index file.
+    :param index_format: String with the format of the file, 'json' or 'compact'.
+    :return: Tuple with the load time in seconds and the memory in megabytes.
+    """
+    start_rss = peak_memory()
+    stopwatch = TimeKeeper()
+    if index_format == 'json':
+        with open(index_path, 'r') as file:
+            papers_index = json.load(file)
+    else:
+        papers_index = CompactPapersIndex(index_path)
+    # Access one paper, like any user of the index would.
+    first_uid = next(iter(papers_index))
+    _ = papers_index[first_uid]['title']
+    load_time = stopwatch.total_runtime()
+    return load_time, peak_memory() - start_rss
+
+
+def index_formats_comparison(json_path, compact_path):
+    """
+    Compare the startup time and the resident memory needed to load the JSON
+    and the compact papers' indexes. Each index is loaded in a new process, so
+    the measures don't affect each other.
+    :param json_path: The path of the JSON papers' index.
+    :param compact_path: The path of the compact papers' index.
+    """
+    # Create the compact index if it doesn't exist.
+    if not isfile(compact_path):
+        with open(json_path, 'r') as file:
+            save_compact_index(json.load(file), compact_path)
+
+    spawn_context = get_context('spawn')
+    for format_name, index_format, index_path in [
+            ('JSON', 'json', json_path), ('Compact', 'compact', compact_path)]:
+        with spawn_context.Pool(1) as pool:
+            load_time, memory = pool.apply(_index_load_stats,
+                                           (index_path, index_format))
+        print(f"{format_name} Index: {load_time:.3f} seconds, "
+              f"{memory:.1f} MB of resident memory.")
+
+
+# Compare the two formats of the Papers' Index.
+if __name__ == '__main__':
+    from os.path import join
+    from papers import Papers
+
+    # Make sure the JSON index is available.
+    _ = Papers()
+    print("\nComparing the JSON and Compact Papers' Indexes...")
+    index_formats_comparison(
+        join(Papers.data_folder, Papers.papers_index_file),
+        join(Papers.data_folder, Papers.compact_index_file)
+    )
+    print("Done.")
@@ -0,0 +1,338 @@
+# Gelin Eguinosa Rosique
+
+import json
+import numpy as np
+from array import array
+from os import mkdir
+from os.path import isdir, isfile, join, getmtime
+
+from topic_processing import TopicManager
+from time_keeper import TimeKeeper
+
+
+class CorpusSearch:
+    """
+    Inverted index over the tokenized documents of the corpus, to find the
+    documents that mention a token and rank them using BM25. The postings of
+    each token are compressed using the gaps between the document numbers and
+    variable-length integers.
+    """
+    # Location of the Class Data
+    data_folder = 'project_data'
+    search_folder = 'search_index'
+    search_info_file = 'search_index.json'
+    postings_file = 'postings.bin'
+    offsets_file = 'postings_offsets.bin'
+    doc_lengths_file = 'doc_lengths.bin'
+
+    # BM25 Parameters.
+    k1 = 1.5
+    b = 0.75
+
+    def __init__(self, topic_manager, _use_saved=False):
+        """
+        Create the inverted index of the corpus using the bag-of-words of the
+        documents and the dictionary of the TopicManager, or load it if it was
+        saved.
+        :param topic_manager: The TopicManager with the dictionary and corpus
+        bag-of-words of the tokenized documents.
+        :param _use_saved: Bool to determine if we load the saved inverted
+        index instead of creating it. The saved index is created again if it
+        doesn't belong to the corpus of the TopicManager.
+        """
+        self.dictionary = topic_manager.dictionary
+        # The ids of the documents (their cord_uid), in the order of the rows
+        # of the corpus bag-of-words (None in old TopicManagers).
+        self.doc_ids = topic_manager.corpus_doc_ids
+        search_folder_path = join(self.data_folder, self.search_folder)
+
+        # Create the index if we are not loading it, or if it's outdated.
+        if not _use_saved or self._is_index_outdated(topic_manager):
+            if not isdir(search_folder_path):
+                mkdir(search_folder_path)
+            self._create_index(topic_manager.corpus_bow)
+
+        # Load the information of the index.
+        info_path = join(search_folder_path, self.search_info_file)
+        if not isfile(info_path):
+            raise Exception("The Search Index of the corpus was not saved.")
+        with open(info_path, 'r') as file:
+            search_info = json.load(file)
+        self.num_docs = search_info['num_docs']
+        self.avg_doc_length = search_info['avg_doc_length']
+        self.doc_freqs = search_info['doc_freqs']
+
+        # Load the offsets of the postings and the length of the documents.
+        self.offsets = np.fromfile(join(search_folder_path, self.offsets_file),
+                                   dtype=np.uint64, count=len(self.doc_freqs) + 1)
+        self.doc_lengths = np.fromfile(join(search_folder_path, self.doc_lengths_file),
+                                       dtype=np.uint32, count=self.num_docs)
+
+        # Memory-map the postings (only if there are any).
+        self.postings = np.zeros(0, dtype=np.uint8)
+        if self.offsets[-1]:
+            self.postings = np.memmap(join(search_folder_path, self.postings_file),
+                                      dtype=np.uint8, mode='r')
+
+    def _is_index_outdated(self, topic_manager):
+        """
+        Check if the saved index was created with a different dictionary or
+        corpus bag-of-words than the ones of the TopicManager, or if the corpus
+        was saved again after the index was created.
+        :param topic_manager: The TopicManager with the dictionary and corpus
+        bag-of-words of the tokenized documents.
+        :return: Bool representing if the index needs to be created again.
+        """
+        info_path = join(self.data_folder, self.search_folder, self.search_info_file)
+        if not isfile(info_path):
+            return False
+        with open(info_path, 'r') as file:
+            search_info = json.load(file)
+        if len(search_info['doc_freqs']) != len(self.dictionary):
+            return True
+        if search_info['num_docs'] != len(topic_manager.corpus_bow):
+            return True
+        corpus_path = join(TopicManager.data_folder, TopicManager.corpus_file)
+        return isfile(corpus_path) and getmtime(info_path) < getmtime(corpus_path)
+
+    def _create_index(self, corpus_bow):
+        """
+        Create the postings lists of the tokens with one pass through the
+        corpus bag-of-words, and save them with the length of each document.
+        :param corpus_bow: The corpus in bag-of-words representation.
+        """
+        num_terms = len(self.dictionary)
+        # The compressed postings of each token, and the last document added to
+        # them.
+        token_postings = [bytearray() for _ in range(num_terms)]
+        last_docs = [0] * num_terms
+        doc_freqs = [0] * num_terms
+        doc_lengths = array('I')
+
+        for doc_num, doc_bow in enumerate(corpus_bow):
+            doc_length = 0
+            for token_id, token_count in doc_bow:
+                token_count = int(token_count)
+                # Save the gap with the previous document and the frequency.
+                postings = token_postings[token_id]
+                _add_varint(postings, doc_num - last_docs[token_id])
+                _add_varint(postings, token_count)
+                last_docs[token_id] = doc_num
+                doc_freqs[token_id] += 1
+                doc_length += token_count
+            doc_lengths.append(doc_length)
+
+        # Save the postings one after the other, and their offsets.
+        search_folder_path = join(self.data_folder, self.search_folder)
+        offsets = array('Q', [0])
+        with open(join(search_folder_path, self.postings_file), 'wb') as file:
+            for postings in token_postings:
+                file.write(postings)
+                offsets.append(offsets[-1] + len(postings))
+        with open(join(search_folder_path, self.offsets_file), 'wb') as file:
+            offsets.tofile(file)
+        with open(join(search_folder_path, self.doc_lengths_file), 'wb') as file:
+            doc_lengths.tofile(file)
+
+        # Save the statistics of the corpus.
+        num_docs = len(doc_lengths)
+        search_info = {
+            'num_docs': num_docs,
+            'avg_doc_length': sum(doc_lengths) / num_docs if num_docs else 0,
+            'doc_freqs': doc_freqs,
+        }
+        with open(join(search_folder_path, self.search_info_file), 'w') as file:
+            json.dump(search_info, file)
+
+    def token_postings(self, token):
+        """
+        Get the documents where the token appears, and how many times it
+        appears in each of them.
+        :param token: String with the token.
+        :return: A list of tuples with the number of the document (its position
+        in the corpus) and the frequency of the token.
+        """
+        doc_nums, frequencies = self._decode_postings(token)
+        return list(zip(doc_nums.tolist(), frequencies.tolist()))
+
+    def _decode_postings(self, token):
+        """
+        Decode the postings of the token with numpy, without going through its
+        bytes one at a time.
+        :param token: String with the token.
+        :return: A tuple with two arrays, the numbers of the documents where
+        the token appears and its frequency in each of them.
+        """
+        token_id = self.dictionary.token2id.get(token)
+        if token_id is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        data = self.postings[int(self.offsets[token_id]):int(self.offsets[token_id + 1])]
+
+        # Find where each variable-length integer starts, and the position of
+        # each byte inside its integer.
+        is_last = data < 0x80
+        starts = np.concatenate(([0], np.flatnonzero(is_last)[:-1] + 1))
+        number_ids = np.concatenate(([0], np.cumsum(is_last)[:-1]))
+        byte_positions = np.arange(len(data)) - starts[number_ids]
+        # Join the 7 bits of the bytes of each integer (they don't overlap, so
+        # adding them is the same as joining them).
+        payloads = (data & 0x7F).astype(np.int64) << (7 * byte_positions)
+        numbers = np.add.reduceat(payloads, starts) if len(data) else payloads
+
+        # Transform the gaps into document numbers.
+        return np.cumsum(numbers[0::2]), numbers[1::2]
+
+    def query_tokens(self, query):
+        """
+        Transform the query into the tokens of the dictionary. The words of the
+        query are lowercased, and the consecutive words that form a phrase of
+        the corpus (e.g. 'covid 19' -> 'covid_19') are also added.
+        :param query: A string with the query, or a list with its tokens.
+        :return: A list with the tokens of the query found in the dictionary.
+        """
+        words = query.lower().split() if isinstance(query, str) else list(query)
+        token2id = self.dictionary.token2id
+        tokens = [word for word in words if word in token2id]
+        # Find the Bigrams and Trigrams of the query.
+        for size in (2, 3):
+            for i in range(len(words) - size + 1):
+                phrase = '_'.join(words[i:i + size])
+                if phrase in token2id:
+                    tokens.append(phrase)
+        return tokens
+
+    def search(self, query, n=10):
+        """
+        Find the 'n' documents that best match the query using BM25.
+        :param query: A string with the query (lemmatized words), or a list
+        with its tokens.
+        :param n: The number of documents to return.
+        :return: A list of tuples with the id of the document (e.g. its
+        cord_uid) and its score, sorted by score. If the TopicManager didn't
+        save the ids of the documents, their position in the corpus is used.
+        """
+        scores = np.zeros(self.num_docs)
+        found = np.zeros(self.num_docs, dtype=bool)
+        for token in self.query_tokens(query):
+            doc_nums, frequencies = self._decode_postings(token)
+            if not len(doc_nums):
+                continue
+            # Inverse Document Frequency of the token.
+            doc_freq = len(doc_nums)
+            idf = np.log(1 + (self.num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            # Add the score of the token to each document.
+            length_norm = 1 - self.b + self.b * self.doc_lengths[doc_nums] / self.avg_doc_length
+            scores[doc_nums] += idf * frequencies * (self.k1 + 1) / (frequencies + self.k1 * length_norm)
+            found[doc_nums] = True
+
+        # Select the documents with the best scores.
+        found_docs = np.flatnonzero(found)
+        best_order = np.argsort(-scores[found_docs], kind='stable')[:n]
+        best_docs = [(int(doc_num), float(scores[doc_num]))
+                     for doc_num in found_docs[best_order]]
+        # Use the ids of the documents instead of their positions.
+        if self.doc_ids is not None:
+            best_docs = [(self.doc_ids[doc_num], score) for doc_num, score in best_docs]
+        return best_docs
+
+    def phrase_search(self, words, n=10):
+        """
+        Find the documents that contain the phrase formed by the given words,
+        using the phrase tokens of the corpus ('covid_19', 'severe_acute_
+        respiratory'), ranked with BM25.
+        :param words: A list with the words of the phrase, or a string with the
+        words separated by spaces.
+        :param n: The number of documents to return.
+        :return: A list of tuples with the id of the document and its score,
+        sorted by score.
+        """
+        if isinstance(words, str):
+            words = words.lower().split()
+        return self.search(['_'.join(words)], n)
+
+    @classmethod
+    def is_search_index_saved(cls):
+        """
+        Check if the inverted index of the corpus was saved.
+        :return: Bool representing if the index can be loaded.
+        """
+        search_folder_path = join(cls.data_folder, cls.search_folder)
+        for file_name in [cls.search_info_file, cls.offsets_file,
+                          cls.doc_lengths_file]:
+            if not isfile(join(search_folder_path, file_name)):
+                return False
+        return True
+
+    @classmethod
+    def saved_search_index(cls, topic_manager):
+        """
+        Load the inverted index saved by a previous CorpusSearch.
+        :param topic_manager: The TopicManager used to create the index.
+        :return: A CorpusSearch.
+        """
+        return cls(topic_manager, _use_saved=True)
+
+
+def _add_varint(buffer, number):
+    """
+    Add a non-negative integer to the buffer, using 7 bits per byte and the
+    highest bit to mark that more bytes follow.
+    """
+    while number >= 0x80:
+        buffer.append((number & 0x7F) | 0x80)
+        number >>= 7
+    buffer.append(number)
+
+
+def search_latency(corpus_search, queries, repetitions=20, n=10):
+    """
+    Measure how long the search of each query takes, repeating it to get a
+    stable average.
+    :param corpus_search: The CorpusSearch used to run the queries.
+    :param queries: A list with the queries (strings or lists of tokens).
+    :param repetitions: The number of times each query is run.
+    :param n: The number of documents returned by each search.
+    :return: A list with the average milliseconds of each query.
+    """
+    latencies = []
+    for query in queries:
+        stopwatch = TimeKeeper()
+        for _ in range(repetitions):
+            corpus_search.search(query, n)
+        latencies.append(stopwatch.total_runtime() * 1000 / repetitions)
+    return latencies
+
+
+# Test the class.
+if __name__ == '__main__':
+    # Record the Runtime of the Program
+    stopwatch = TimeKeeper()
+
+    print("\nLoading the Topic Manager...")
+    the_topic_manager = TopicManager.saved_topic_manager()
+    print("Done.")
+    print(f"[{stopwatch.formatted_runtime()}]")
+
+    print("\nLoading the Search Index...")
+    if CorpusSearch.is_search_index_saved():
+        corpus_search = CorpusSearch.saved_search_index(the_topic_manager)
+    else:
+        corpus_search = CorpusSearch(the_topic_manager)
+    print("Done.")
+    print(f"[{stopwatch.formatted_runtime()}]")
+
+    the_query = 'covid 19 transmission'
+    print(f"\nSearching: '{the_query}'")
+    stopwatch.restart()
+    for doc_id, doc_score in corpus_search.search(the_query):
+        print(f"Document {doc_id}: {doc_score:.4f}")
+    print(f"[{stopwatch.formatted_runtime()}]")
+
+    # Measure the latency of the query, and of the most common tokens of the
+    # corpus (the ones with the longest postings).
+    dictionary = the_topic_manager.dictionary
+    common_ids = sorted(dictionary.dfs, key=lambda token_id: -dictionary.dfs[token_id])
+    the_queries = [the_query] + [[dictionary[token_id]] for token_id in common_ids[:5]]
+    print("\nQuery Latency:")
+    for query, latency in zip(the_queries, search_latency(corpus_search, the_queries)):
+        print(f"{query}: {latency:.2f} ms")
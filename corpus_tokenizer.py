@@ -1,41 +1,101 @@
 # Gelin Eguinosa Rosique
 
 import json
-from os import mkdir
+from os import mkdir, remove, replace
+from shutil import rmtree
+from collections import deque
+from itertools import islice, chain
 from os.path import isdir, isfile, join
 from gensim.models import Phrases
+from gensim.models.phrases import FrozenPhrases
 
-from docs_tokenization import lazy_corpus_tokenization
+from docs_tokenization import (
+    lazy_corpus_tokenization, pipe_corpus_tokenization, documents_tokenization,
+    regex_corpus_tokenization, regex_tokenizer, tokenizer_signature
+)
+from tokenization_cache import TokenizationCache
+from token_store import PackedTokenStore
 from papers_analyzer import PapersAnalyzer
 from time_keeper import TimeKeeper
-from extra_funcs import big_number
+from extra_funcs import big_number, ordered_parallel_map
 
 
 class CorpusTokenizer:
     """
     Class to tokenize the documents of a corpus and save the results in case
-    they are needed later.
+    they are needed later. The tokens are saved in a PackedTokenStore, and the
+    tokenization index has the position of each document in the store.
     """
     # Location Class Data
     data_folder = 'project_data'
     tokens_folder = 'docs_tokenized'
     tokens_prefix = 'doc_tokens_'
     tokenization_index_name = 'tokenization_index.json'
+    tokenization_config_name = 'tokenization_config.json'
+    phrases_folder = 'doc_phrases'
+    phraser_file = 'phrases_model'
+    phrases_vocab_file = 'phrases_vocab'
 
-    def __init__(self, documents, _use_saved=False):
+    # Number of documents sent at a time to the Phrases model or the workers.
+    phrases_batch_size = 1_000
+
+    def __init__(self, documents, _use_saved=False, shard_index=0, shard_count=1,
+                 batch_size=None, n_process=1, learn_phrases=False,
+                 phrases_workers=1, checkpoint_every=1_000, resume=False,
+                 documents_start=0, use_cache=False, backend='spacy'):
         """
         Receives the texts from the documents in the corpus and creates, and
         transforms each document into an array of tokens.
         Removes all the stop words, punctuation symbols and numbers in the
         documents, lowercases the text and lemmatizes each token.
         :param documents: An iterable sequence containing the texts of the
-        documents in the corpus.
+        documents in the corpus, or tuples with the id of each document (e.g.
+        its cord_uid) and its text.
         :param _use_saved: Bool to determine if we used a previously generated
         tokenization of the corpus, or if we start from scratch, even if we have
         the result of the tokenization saved.
+        :param shard_index: The shard of the corpus the documents belong to,
+        when the corpus is tokenized by several machines.
+        :param shard_count: The number of shards of the corpus. If it's bigger
+        than 1, the tokens are saved in the folder of the shard, and the Phrases
+        are not added until the shards are merged with merge_shards().
+        :param batch_size: The number of documents processed together by
+        nlp.pipe(). If it's None and 'n_process' is 1, the documents are
+        tokenized one at a time.
+        :param n_process: The number of processes used by nlp.pipe() to
+        tokenize the documents.
+        :param learn_phrases: Bool to determine if the vocabulary of the Phrases
+        model is collected while the documents are tokenized, instead of
+        reading the tokens again to train it.
+        :param phrases_workers: The number of processes used to find the Phrases
+        of the documents.
+        :param checkpoint_every: The number of documents tokenized between
+        checkpoints, to resume the tokenization if it's interrupted. If it's
+        None, no checkpoints are saved.
+        :param resume: Bool to determine if we continue the tokenization from
+        its last checkpoint, skipping the documents already tokenized.
+        :param documents_start: The position of the first document of
+        'documents' in the corpus. If the generator of the documents already
+        starts at resume_position(), only the documents before this position
+        are skipped.
+        :param use_cache: Bool to determine if the tokens of the texts already
+        tokenized (e.g. the same paper under another cord_uid) are taken from
+        the TokenizationCache, instead of processing them again with spaCy.
+        :param backend: The backend of the tokenization: 'spacy' uses the full
+        spaCy pipeline, and 'regex' uses a regular expression with the lemmas
+        exported from spaCy (much faster, for quick experiments). The backend
+        is saved with the tokens, to tokenize new documents the same way.
         """
         # The path of the folder for the tokenized documents.
         tokens_folder_path = join(self.data_folder, self.tokens_folder)
+        # The frozen Phrases model, loaded when it's needed.
+        self._phraser = None
+        # The number of documents taken from the tokenization cache.
+        self.cached_docs = 0
+        # The backend used in the tokenization.
+        if backend not in ('spacy', 'regex'):
+            raise Exception(f"The tokenization backend '{backend}' is not supported.")
+        self.backend = backend
 
         # Create data folder if it doesn't exist.
         if not isdir(self.data_folder):
@@ -54,65 +114,529 @@ class CorpusTokenizer:
             # Load the tokens information from the index file:
             with open(index_path, 'r') as file:
                 self.tokens_info = json.load(file)
+            # Move the tokens saved in JSON files by a previous version of the
+            # class to the token store.
+            if not PackedTokenStore.is_store_saved(tokens_folder_path):
+                self._migrate_json_documents()
+            self.token_store = PackedTokenStore(tokens_folder_path)
+            # Load the Phrases of the documents.
+            phrases_folder_path = join(tokens_folder_path, self.phrases_folder)
+            self.phrases_store = None
+            if PackedTokenStore.is_store_saved(phrases_folder_path):
+                self.phrases_store = PackedTokenStore(phrases_folder_path)
+            # Load the backend of the tokenization (before it was saved, only
+            # spaCy was used).
+            config_path = join(tokens_folder_path, self.tokenization_config_name)
+            if isfile(config_path):
+                with open(config_path, 'r') as file:
+                    self.backend = json.load(file)['backend']
+
+        # Tokenize the documents of one shard of the corpus.
+        elif shard_count > 1:
+            shard_folder = self.shard_folder_name(shard_index, shard_count)
+            shard_folder_path = join(tokens_folder_path, shard_folder)
+            if not isdir(shard_folder_path):
+                mkdir(shard_folder_path)
+            # Save the tokens in the folder of the shard.
+            self.phrases_store = None
+            self._tokenize_documents(documents, shard_folder_path, batch_size,
+                                     n_process, None, checkpoint_every, resume,
+                                     documents_start, use_cache)
+            # Save the index of the shard.
+            shard_info = {
+                'shard_index': shard_index,
+                'shard_count': shard_count,
+                'backend': backend,
+                'tokens_info': self.tokens_info,
+            }
+            shard_index_path = join(shard_folder_path, self.tokenization_index_name)
+            save_json(shard_index_path, shard_info)
 
         # Do the tokenization of the documents
         else:
-            # Initialize the tokens dictionary
-            self.tokens_info = {}
-
+            # Remove the Phrases of a previous tokenization.
+            self._remove_phrases()
+            # The vocabulary of the Phrases can't be collected during the
+            # tokenization if it's resumed (the model is trained at the end).
+            resuming = resume and self.resume_position() > 0
+            phrase_model = Phrases() if learn_phrases and not resuming else None
             # Do the lazy tokenization and save the results
-            for doc_tokens in lazy_corpus_tokenization(documents):
-                # Create the name of the file where the tokenization will be
-                # saved
-                doc_id = len(self.tokens_info) + 1
-                doc_name = self.tokens_prefix + str(doc_id) + '.json'
-                # Save the name in a dictionary for later use.
-                self.tokens_info[doc_id] = doc_name
-                # Save the tokenization in a file.
-                self._save_document(doc_name, doc_tokens)
-
-            # Save the index of the tokens.
+            self._tokenize_documents(documents, tokens_folder_path, batch_size,
+                                     n_process, phrase_model, checkpoint_every,
+                                     resume, documents_start, use_cache)
+
+            # Save the index of the tokens and the backend used.
             index_path = join(tokens_folder_path, self.tokenization_index_name)
-            with open(index_path, 'w') as file:
-                json.dump(self.tokens_info, file)
+            save_json(index_path, self.tokens_info)
+            config_path = join(tokens_folder_path, self.tokenization_config_name)
+            save_json(config_path, {'backend': backend})
+
+            # Find the Phrases in the documents and add them to their
+            # tokenization.
+            self._add_phrases(phrase_model, phrases_workers)
+
+    def _tokenize_documents(self, documents, store_folder_path, batch_size=None,
+                            n_process=1, phrase_model=None, checkpoint_every=None,
+                            resume=False, documents_start=0, use_cache=False):
+        """
+        Tokenize the documents and save their tokens in a PackedTokenStore.
+        Creates the 'token_store' and the 'tokens_info' of the tokenizer.
+        :param documents: An iterable sequence containing the texts of the
+        documents.
+        :param store_folder_path: The folder where the token store is saved
+        (e.g. the folder of a shard).
+        :param batch_size: The number of documents processed together by
+        nlp.pipe(), or None to tokenize them one at a time.
+        :param n_process: The number of processes used by nlp.pipe().
+        :param phrase_model: A Phrases model to collect the vocabulary of the
+        documents while they are tokenized, or None.
+        :param checkpoint_every: The number of documents between the
+        checkpoints of the token store, or None.
+        :param resume: Bool to determine if we continue from the last checkpoint
+        of the token store.
+        :param documents_start: The position of the first document of
+        'documents' in the corpus.
+        :param use_cache: Bool to determine if we use the TokenizationCache.
+        """
+        # Skip the documents tokenized before the last checkpoint.
+        if resume:
+            position = PackedTokenStore.checkpoint_position(store_folder_path)
+            if documents_start > position:
+                raise Exception(f"The documents start at {documents_start}, but "
+                                f"only {position} documents were tokenized.")
+            documents = islice(documents, position - documents_start, None)
+        # Tokenize the documents, keeping their keys if they have them.
+        cache = None
+        if use_cache:
+            cache = TokenizationCache(tokenizer_signature(backend=self.backend))
+        try:
+            keyed, docs_tokens = self._documents_tokens(documents, batch_size,
+                                                        n_process, phrase_model,
+                                                        cache)
+            # Save the tokens of the documents in the store.
+            self.token_store = PackedTokenStore.create(
+                store_folder_path, docs_tokens, checkpoint_every, resume, keyed
+            )
+        finally:
+            if cache is not None:
+                self.cached_docs = cache.hits
+                cache.close()
+        # The position of each document in the store.
+        self.tokens_info = store_tokens_info(self.token_store)
+
+    def _documents_tokens(self, documents, batch_size=None, n_process=1,
+                          phrase_model=None, cache=None):
+        """
+        Tokenize the documents, that can be texts or tuples with the id of the
+        document (e.g. its cord_uid) and its text.
+        :param documents: An iterable with the texts of the documents, or with
+        the tuples of their ids and texts.
+        :param batch_size: The number of documents processed together by
+        nlp.pipe(), or None to tokenize them one at a time.
+        :param n_process: The number of processes used by nlp.pipe().
+        :param phrase_model: A Phrases model to collect the vocabulary of the
+        documents while they are tokenized, or None.
+        :param cache: The TokenizationCache with the tokens of the texts
+        already processed, or None.
+        :return: A tuple with a bool that is True if the documents have ids,
+        and an iterator with the tokens of each document (with their ids, if
+        they have them).
+        """
+        # Check if the documents come with their ids.
+        documents = iter(documents)
+        first_document = next(documents, None)
+        keyed = isinstance(first_document, tuple)
+        if first_document is not None:
+            documents = chain([first_document], documents)
+        # Send only the texts to the tokenization, and keep their ids in order.
+        doc_ids = deque()
+        if keyed:
+            documents = _documents_texts(documents, doc_ids)
+
+        docs_tokens = self._backend_tokenization(documents, batch_size, n_process,
+                                                 cache)
+        # Add the documents to the vocabulary of the Phrases.
+        if phrase_model is not None:
+            docs_tokens = self._phrases_vocab(docs_tokens, phrase_model)
+        # Put the ids back with the tokens (the documents keep their order).
+        if keyed:
+            docs_tokens = ((doc_ids.popleft(), doc_tokens)
+                           for doc_tokens in docs_tokens)
+        return keyed, docs_tokens
+
+    def _backend_tokenization(self, documents, batch_size=None, n_process=1,
+                              cache=None):
+        """
+        Tokenize the texts of the documents with the backend of the tokenizer.
+        :param documents: An iterable with the texts of the documents.
+        :param batch_size: The number of documents processed together by
+        nlp.pipe(), or None to tokenize them one at a time.
+        :param n_process: The number of processes used by nlp.pipe().
+        :param cache: The TokenizationCache with the tokens of the texts
+        already processed, or None.
+        :return: An iterator with the tokens of each document.
+        """
+        # The regex backend is fast enough to use one process.
+        if self.backend == 'regex':
+            return regex_corpus_tokenization(documents, cache=cache)
+        # Use the batched tokenization, if it was requested.
+        if batch_size is None and n_process == 1:
+            return lazy_corpus_tokenization(documents, cache=cache)
+        return pipe_corpus_tokenization(documents, batch_size or 64, n_process,
+                                        cache=cache)
 
-            # -- Find the Phrases in the documents and add them to their
-            # tokenization --
-            # First -> Train the Phrase Model with our corpus.
+    def _phrases_vocab(self, docs_tokens, phrase_model):
+        """
+        Add the documents to the vocabulary of the Phrases model as they pass,
+        in batches of 'phrases_batch_size' documents.
+        :param docs_tokens: An iterable with the tokens of the documents.
+        :param phrase_model: The Phrases model.
+        :return: An iterator with the same tokens of the documents.
+        """
+        docs_batch = []
+        for doc_tokens in docs_tokens:
+            docs_batch.append(doc_tokens)
+            if len(docs_batch) == self.phrases_batch_size:
+                phrase_model.add_vocab(docs_batch)
+                docs_batch = []
+            yield doc_tokens
+        if docs_batch:
+            phrase_model.add_vocab(docs_batch)
+
+    def _add_phrases(self, phrase_model=None, n_workers=1):
+        """
+        Find the Phrases (Bigrams, Trigrams, etc...) of the corpus, and save the
+        Phrases of each document in a separate store, next to its tokens. The
+        base tokens are not rewritten.
+        :param phrase_model: A Phrases model with the vocabulary of the corpus
+        already collected. If it's None, the model is trained reading the
+        tokens of the documents.
+        :param n_workers: The number of processes used to find the Phrases of
+        the documents.
+        """
+        # First -> Train the Phrase Model with our corpus, and save it to
+        # update its vocabulary with new documents.
+        self._remove_phrases()
+        if phrase_model is None:
             phrase_model = Phrases(self.corpus_tokens())
-            # Second -> Export the trained model to use less RAM, faster
-            # processing (Model updates are no longer possible).
-            phrase_model = phrase_model.freeze()
-            # Last -> Add the Bigrams, Trigrams, etc... to each of the tokenized
-            # documents.
-            for file_name in self.tokens_info.values():
-                # Load the list of tokens in the document.
-                doc_tokens = self._load_document(file_name)
-
-                # Apply the model to each document to find the phrases they have
-                for token in phrase_model[doc_tokens]:
-                    # Check if the current token is a 'phrase'
-                    if '_' in token:
-                        # Add the new phrase to the tokens of the document.
-                        doc_tokens.append(token)
-
-                # Save the changes made to the current tokenized document.
-                self._save_document(file_name, doc_tokens)
+        phrase_model.save(join(self.data_folder, self.tokens_folder,
+                               self.phrases_vocab_file))
+        # Second -> Export the trained model to use less RAM, faster
+        # processing (Model updates are no longer possible), and save it to
+        # find the Phrases of new documents.
+        phraser = phrase_model.freeze()
+        phraser.save(join(self.data_folder, self.tokens_folder, self.phraser_file))
+        self._phraser = phraser
+
+        # Last -> Find the Bigrams, Trigrams, etc... of each document (in the
+        # order of the token store). The documents that were invalidated get no
+        # Phrases, they are only kept to align the positions of both stores.
+        store_folder = self.token_store.store_folder
+        corpus_positions = set(self.tokens_info.values())
+        positions = [position if position in corpus_positions else None
+                     for position in range(len(self.token_store))]
+        if n_workers <= 1:
+            docs_phrases = (doc_phrases(phraser, self.token_store.doc_tokens(position))
+                            if position is not None else []
+                            for position in positions)
+        else:
+            # Each worker receives the phraser once, and reads the tokens from
+            # the memory-mapped store.
+            batches = (positions[i:i + self.phrases_batch_size]
+                       for i in range(0, len(positions), self.phrases_batch_size))
+            batches_phrases = ordered_parallel_map(
+                _batch_phrases, batches, n_workers,
+                initializer=_init_phrases_worker, initargs=(phraser, store_folder)
+            )
+            docs_phrases = (batch_doc_phrases for batch_phrases in batches_phrases
+                            for batch_doc_phrases in batch_phrases)
+
+        # Save the Phrases in their own store.
+        phrases_folder_path = join(store_folder, self.phrases_folder)
+        if not isdir(phrases_folder_path):
+            mkdir(phrases_folder_path)
+        self.phrases_store = PackedTokenStore.create(phrases_folder_path,
+                                                     docs_phrases)
+
+    def _remove_phrases(self):
+        """
+        Delete the store with the Phrases of the documents and the Phrases
+        models, if they exist.
+        """
+        self.phrases_store = None
+        self._phraser = None
+        self.delete_phrases_files()
+
+    @classmethod
+    def delete_phrases_files(cls):
+        """
+        Delete the files with the Phrases of the documents and the Phrases
+        models of the tokenization.
+        """
+        tokens_folder_path = join(cls.data_folder, cls.tokens_folder)
+        phrases_folder_path = join(tokens_folder_path, cls.phrases_folder)
+        if isdir(phrases_folder_path):
+            rmtree(phrases_folder_path)
+        for file_name in [cls.phraser_file, cls.phrases_vocab_file]:
+            file_path = join(tokens_folder_path, file_name)
+            if isfile(file_path):
+                remove(file_path)
+
+    def phraser(self):
+        """
+        Get the frozen Phrases model trained with the corpus. The model is
+        loaded from its file the first time it's needed.
+        :return: The FrozenPhrases model, or None if the tokenization has no
+        Phrases model saved (e.g. the tokens of a shard).
+        """
+        if self._phraser is None:
+            phraser_path = join(self.data_folder, self.tokens_folder,
+                                self.phraser_file)
+            if isfile(phraser_path):
+                self._phraser = FrozenPhrases.load(phraser_path)
+        return self._phraser
+
+    def tokenize_document(self, text):
+        """
+        Tokenize a new document the same way the documents of the corpus were
+        tokenized, adding the Phrases found by the model of the corpus.
+        :param text: The string with the text of the document.
+        :return: A list of strings with the tokens of the document.
+        """
+        if self.backend == 'regex':
+            text_tokens = regex_tokenizer().doc_tokens(text)
+        else:
+            text_tokens = documents_tokenization(text)
+        phraser = self.phraser()
+        if phraser:
+            text_tokens += doc_phrases(phraser, text_tokens)
+        return text_tokens
+
+    def tokenize_documents(self, documents, batch_size=None, n_process=1):
+        """
+        Tokenize new documents the same way the documents of the corpus were
+        tokenized, adding the Phrases found by the model of the corpus.
+        :param documents: An iterable sequence with the texts of the documents.
+        :param batch_size: The number of documents processed together by
+        nlp.pipe(). If it's None and 'n_process' is 1, the documents are
+        tokenized one at a time.
+        :param n_process: The number of processes used by nlp.pipe().
+        :return: An iterator with the list of tokens of each document.
+        """
+        docs_tokens = self._backend_tokenization(documents, batch_size, n_process)
+        phraser = self.phraser()
+        for text_tokens in docs_tokens:
+            if phraser:
+                text_tokens += doc_phrases(phraser, text_tokens)
+            yield text_tokens
 
     def corpus_tokens(self):
         """
-        Load, one at a time, the saved tokenized Documents.
+        Get, one at a time, the tokens of the documents from the token store,
+        followed by their Phrases.
         :return: a sequence of the tokens of the documents in the corpus.
         """
-        # Iterate through the names of the files where the tokens are stored
-        for file_name in self.tokens_info.values():
-            # Load each tokenized document and return it one at a time.
-            doc_tokens = self._load_document(file_name)
+        # Iterate through the positions of the documents in the store.
+        for position in self.tokens_info.values():
+            doc_tokens = self.token_store.doc_tokens(position)
+            if self.phrases_store:
+                doc_tokens += self.phrases_store.doc_tokens(position)
             yield doc_tokens
 
+    def corpus_ids(self):
+        """
+        Get, one at a time, the ids of the base tokens of the documents (in the
+        vocabulary of the token store), without decoding them. The Phrases are
+        not included.
+        :return: a sequence of numpy arrays.
+        """
+        for position in self.tokens_info.values():
+            yield self.token_store.doc_ids(position)
+
+    def corpus_doc_ids(self):
+        """
+        Get the ids of the documents (e.g. their cord_uid), in the same order
+        corpus_tokens() returns their tokens. The row 'i' of the bag-of-words
+        of the corpus belongs to the document 'i' of this list.
+        :return: A list with the ids of the documents.
+        """
+        return list(self.tokens_info)
+
+    def new_doc_ids(self, doc_ids):
+        """
+        Select the ids of the documents that are not in the tokenization, to
+        only read and tokenize the texts of those documents.
+        :param doc_ids: An iterable with the ids of the documents.
+        :return: A list with the ids that are not tokenized.
+        """
+        return [doc_id for doc_id in doc_ids if doc_id not in self.tokens_info]
+
+    def invalidate_documents(self, doc_ids):
+        """
+        Remove documents from the tokenization (e.g. papers whose content
+        changed), so they can be tokenized again with add_documents(). Their
+        tokens stay in the token store, but they are no longer part of the
+        corpus, until the store is compacted (by compact_store(), before
+        add_documents() adds the new documents).
+        The vocabulary of the Phrases still has the tokens of the removed
+        documents, so it's deleted and trained again the next time documents
+        are added.
+        :param doc_ids: An iterable with the ids of the documents.
+        :return: The number of documents removed.
+        """
+        tokens_folder_path = join(self.data_folder, self.tokens_folder)
+        removed_docs = 0
+        for doc_id in doc_ids:
+            if self.tokens_info.pop(doc_id, None) is not None:
+                removed_docs += 1
+        if removed_docs:
+            index_path = join(tokens_folder_path, self.tokenization_index_name)
+            save_json(index_path, self.tokens_info)
+            phrases_vocab_path = join(tokens_folder_path, self.phrases_vocab_file)
+            if isfile(phrases_vocab_path):
+                remove(phrases_vocab_path)
+        return removed_docs
+
+    def compact_store(self):
+        """
+        Rewrite the token store and the store of the Phrases with only the
+        documents of the corpus, removing the tokens of the invalidated
+        documents. The documents keep their order. If the store has no keys,
+        the documents are numbered again by their new positions.
+        :return: The number of documents removed from the store.
+        """
+        removed_docs = len(self.token_store) - len(self.tokens_info)
+        if not removed_docs:
+            return 0
+        # The positions of the documents in the current stores.
+        old_store = self.token_store
+        old_phrases = self.phrases_store
+        positions = list(self.tokens_info.values())
+
+        # Save the documents of the corpus in a new store (the current one can
+        # still be read while the new one is created).
+        keyed = old_store.doc_keys is not None
+        docs_tokens = (old_store.doc_tokens(position) for position in positions)
+        if keyed:
+            docs_tokens = zip(self.tokens_info, docs_tokens)
+        self.token_store = PackedTokenStore.create(old_store.store_folder,
+                                                   docs_tokens, keyed=keyed)
+        if old_phrases is not None:
+            self.phrases_store = PackedTokenStore.create(
+                old_phrases.store_folder,
+                (old_phrases.doc_tokens(position) for position in positions)
+            )
+
+        # Save the new positions of the documents.
+        self.tokens_info = store_tokens_info(self.token_store)
+        index_path = join(self.data_folder, self.tokens_folder,
+                          self.tokenization_index_name)
+        save_json(index_path, self.tokens_info)
+        return removed_docs
+
+    def add_documents(self, documents, batch_size=None, n_process=1,
+                      phrases_workers=1, use_cache=False):
+        """
+        Tokenize only the documents that are not in the corpus and append them
+        to the token store, without tokenizing the rest of the corpus again.
+        The vocabulary of the Phrases is updated with the new documents (or
+        trained again if documents were invalidated), and the Phrases of the
+        documents are found with the updated model.
+        :param documents: An iterable with tuples of the id of each document
+        (e.g. its cord_uid) and its text, or only the texts if the corpus was
+        tokenized without ids.
+        :param batch_size: The number of documents processed together by
+        nlp.pipe(), or None to tokenize them one at a time.
+        :param n_process: The number of processes used by nlp.pipe().
+        :param phrases_workers: The number of processes used to find the Phrases
+        of the documents.
+        :param use_cache: Bool to determine if we use the TokenizationCache.
+        :return: The number of documents added.
+        """
+        # Check the documents come with ids only if the corpus has them, before
+        # tokenizing any of them.
+        keyed = self.token_store.doc_keys is not None
+        documents = iter(documents)
+        first_document = next(documents, None)
+        if first_document is None:
+            return 0
+        if isinstance(first_document, tuple) != keyed:
+            if keyed:
+                raise Exception("The corpus was tokenized with the ids of the"
+                                " documents, add them as tuples (id, text).")
+            raise Exception("The corpus was tokenized without the ids of the"
+                            " documents, add only their texts.")
+        documents = chain([first_document], documents)
+
+        # Remove the tokens of the invalidated documents from the store.
+        self.compact_store()
+        # Skip the documents that are already tokenized.
+        if keyed:
+            documents = ((doc_id, text) for doc_id, text in documents
+                         if doc_id not in self.tokens_info)
+        cache = None
+        if use_cache:
+            cache = TokenizationCache(tokenizer_signature(backend=self.backend))
+        try:
+            _, docs_tokens = self._documents_tokens(documents, batch_size,
+                                                    n_process, cache=cache)
+            # Add the documents at the end of the store.
+            first_position = len(self.token_store)
+            self.token_store = self.token_store.append(docs_tokens, keyed)
+        finally:
+            if cache is not None:
+                self.cached_docs = cache.hits
+                cache.close()
+        new_positions = range(first_position, len(self.token_store))
+        if not new_positions:
+            return 0
+        for position in new_positions:
+            if keyed:
+                doc_id = self.token_store.doc_keys[position]
+            else:
+                doc_id = str(position + 1)
+            self.tokens_info[doc_id] = position
+        tokens_folder_path = join(self.data_folder, self.tokens_folder)
+        index_path = join(tokens_folder_path, self.tokenization_index_name)
+        save_json(index_path, self.tokens_info)
+
+        # Update the vocabulary of the Phrases with the new documents, if the
+        # vocabulary of the corpus was saved.
+        phrase_model = None
+        phrases_vocab_path = join(tokens_folder_path, self.phrases_vocab_file)
+        if isfile(phrases_vocab_path):
+            phrase_model = Phrases.load(phrases_vocab_path)
+            phrase_model.add_vocab(self.token_store.doc_tokens(position)
+                                   for position in new_positions)
+        self._add_phrases(phrase_model, phrases_workers)
+        return len(new_positions)
+
+    def _migrate_json_documents(self):
+        """
+        Save in a PackedTokenStore the tokens of the documents saved in one JSON
+        file per document by a previous version of the class, and update the
+        tokenization index with the positions of the documents. The JSON files
+        are deleted once the packed store and the new index are saved.
+        """
+        tokens_folder_path = join(self.data_folder, self.tokens_folder)
+        json_files = list(self.tokens_info.values())
+        json_docs = (self._load_document(file_name) for file_name in json_files)
+        self.token_store = PackedTokenStore.create(tokens_folder_path, json_docs)
+        self.tokens_info = {doc_id: position for position, doc_id
+                            in enumerate(self.tokens_info)}
+        index_path = join(tokens_folder_path, self.tokenization_index_name)
+        save_json(index_path, self.tokens_info)
+
+        # Delete the JSON files of the documents.
+        for file_name in json_files:
+            file_path = join(tokens_folder_path, file_name)
+            if isfile(file_path):
+                remove(file_path)
+
     def _load_document(self, file_name):
         """
-        Load a tokenized document with the given file name.
+        Load a tokenized document saved in a JSON file (the format used before
+        the token store).
         :param file_name: The name of the file where the tokenized document is
         saved.
         :return: The Document saved in the file with the given name.
@@ -129,22 +653,6 @@ class CorpusTokenizer:
         # Return the list of tokens
         return doc_tokens
 
-    def _save_document(self, file_name, doc_tokens):
-        """
-        Save a tokenized document to a file with the given name.
-        :param file_name: The name of the file where the tokenized document will
-        be saved.
-        :param doc_tokens: The tokenized document that will be saved to a file.
-        """
-        # The path of the folder for the tokenized documents.
-        tokens_folder_path = join(self.data_folder, self.tokens_folder)
-        # The path of the file where the document will be saved.
-        file_path = join(tokens_folder_path, file_name)
-
-        # Save the tokenized document.
-        with open(file_path, 'w') as file:
-            json.dump(doc_tokens, file)
-
     @classmethod
     def are_tokens_saved(cls):
         """
@@ -170,16 +678,176 @@ class CorpusTokenizer:
         # The Tokenization Index is ready and available.
         return True
 
+    @classmethod
+    def resume_position(cls, shard_index=0, shard_count=1):
+        """
+        Get the number of documents tokenized before the last checkpoint of an
+        interrupted tokenization, to continue the generator of the documents
+        from there.
+        :param shard_index: The shard of the corpus being tokenized.
+        :param shard_count: The number of shards of the corpus.
+        :return: The number of documents already tokenized, or 0 if there is no
+        tokenization to resume.
+        """
+        store_folder_path = join(cls.data_folder, cls.tokens_folder)
+        if shard_count > 1:
+            store_folder_path = join(store_folder_path,
+                                     cls.shard_folder_name(shard_index, shard_count))
+        return PackedTokenStore.checkpoint_position(store_folder_path)
+
+    @classmethod
+    def shard_folder_name(cls, shard_index, shard_count):
+        """
+        Create the name of the folder where the tokens of a shard are saved.
+        """
+        return f'shard_{shard_index}_of_{shard_count}'
+
+    @classmethod
+    def merge_shards(cls, shard_count, n_workers=1):
+        """
+        Merge the token stores of the shards of the corpus into one store with
+        its tokenization index, and add the Phrases of the whole corpus to the
+        documents. The documents are ordered by shard, and inside each shard in
+        the order they were tokenized.
+        :param shard_count: The number of shards of the corpus.
+        :param n_workers: The number of processes used to find the Phrases of
+        the documents.
+        :return: The CorpusTokenizer with the tokens of all the shards.
+        """
+        tokens_folder_path = join(cls.data_folder, cls.tokens_folder)
+        # Load the indexes of the shards.
+        shards_tokens = []
+        missing_shards = []
+        shards_backends = set()
+        for shard_index in range(shard_count):
+            shard_folder = cls.shard_folder_name(shard_index, shard_count)
+            shard_folder_path = join(tokens_folder_path, shard_folder)
+            shard_index_path = join(shard_folder_path, cls.tokenization_index_name)
+            if not isfile(shard_index_path):
+                missing_shards.append(shard_index)
+                continue
+            with open(shard_index_path, 'r') as file:
+                shard_info = json.load(file)
+            shards_tokens.append((PackedTokenStore(shard_folder_path),
+                                  shard_info['tokens_info']))
+            shards_backends.add(shard_info.get('backend', 'spacy'))
+        if missing_shards:
+            raise Exception(f"The shards {missing_shards} were not tokenized.")
+        if len(shards_backends) > 1:
+            raise Exception(f"The shards were tokenized with different backends"
+                            f" {sorted(shards_backends)}.")
+
+        # Save the documents in one store, shard after shard (without the
+        # Phrases of a previous tokenization). The ids of the documents are
+        # kept if all the shards have them.
+        cls.delete_phrases_files()
+        keyed = all(shard_store.doc_keys is not None
+                    for shard_store, _ in shards_tokens)
+        if keyed:
+            merged_docs = ((doc_id, shard_store.doc_tokens(position))
+                           for shard_store, shard_tokens_info in shards_tokens
+                           for doc_id, position in shard_tokens_info.items())
+        else:
+            merged_docs = (shard_store.doc_tokens(position)
+                           for shard_store, shard_tokens_info in shards_tokens
+                           for position in shard_tokens_info.values())
+        token_store = PackedTokenStore.create(tokens_folder_path, merged_docs,
+                                              keyed=keyed)
+        # Save the unified index of the tokens.
+        tokens_info = store_tokens_info(token_store)
+        index_path = join(tokens_folder_path, cls.tokenization_index_name)
+        save_json(index_path, tokens_info)
+        config_path = join(tokens_folder_path, cls.tokenization_config_name)
+        save_json(config_path, {'backend': shards_backends.pop()})
+
+        # Add the Phrases found in the whole corpus.
+        tokenizer = cls.saved_tokenizer()
+        tokenizer._add_phrases(n_workers=n_workers)
+        return tokenizer
+
     @classmethod
     def saved_tokenizer(cls):
         """
         Creates a CorpusTokenizer from the information saved by a previous
-        tokenizer.
+        tokenizer. The Phrases model is loaded the first time a new document is
+        tokenized.
         :return: A CorpusTokenizer
         """
         return cls(None, _use_saved=True)
 
 
+def store_tokens_info(token_store):
+    """
+    Create the tokenization index of the documents of a token store. The
+    documents are identified by their keys (e.g. their cord_uid), or by their
+    position in the store (starting at 1) if the store has no keys.
+    :param token_store: The PackedTokenStore with the documents.
+    :return: A dictionary with the id of each document and its position.
+    """
+    if token_store.doc_keys is not None:
+        return {doc_id: position
+                for position, doc_id in enumerate(token_store.doc_keys)}
+    return {str(position + 1): position for position in range(len(token_store))}
+
+
+def _documents_texts(documents, doc_ids):
+    """
+    Separate the ids of the documents from their texts, saving the ids in the
+    given queue as the texts are used.
+    """
+    for doc_id, text in documents:
+        doc_ids.append(doc_id)
+        yield text
+
+
+def save_json(file_path, data):
+    """
+    Save the data in a JSON file, writing it first with a temporary name, so
+    an interruption doesn't leave the file half written.
+    :param file_path: The path of the JSON file.
+    :param data: The data we want to save.
+    """
+    with open(file_path + '.temp', 'w') as file:
+        json.dump(data, file)
+    replace(file_path + '.temp', file_path)
+
+
+def doc_phrases(phraser, doc_tokens):
+    """
+    Find the Phrases (Bigrams, Trigrams, etc...) in the tokens of a document.
+    :param phraser: The frozen Phrases model.
+    :param doc_tokens: The list of tokens of the document.
+    :return: A list with the Phrases of the document.
+    """
+    return [token for token in phraser[doc_tokens] if '_' in token]
+
+
+# The frozen Phrases model and the token store used by a worker process.
+_worker_phraser = None
+_worker_store = None
+
+
+def _init_phrases_worker(phraser, store_folder):
+    """
+    Save the frozen Phrases model and open the token store, once per worker.
+    """
+    global _worker_phraser, _worker_store
+    _worker_phraser = phraser
+    _worker_store = PackedTokenStore(store_folder)
+
+
+def _batch_phrases(positions):
+    """
+    Find the Phrases of a batch of documents inside a worker process.
+    :param positions: The positions of the documents in the token store (None
+    for the documents that are no longer in the corpus).
+    :return: A list with the Phrases of each document.
+    """
+    return [doc_phrases(_worker_phraser, _worker_store.doc_tokens(position))
+            if position is not None else []
+            for position in positions]
+
+
 # Test the Class
 if __name__ == '__main__':
     # Record the Runtime of the Program.
@@ -202,15 +870,26 @@ if __name__ == '__main__':
 
     # Tokenize the Documents:.
     print("\nTokenizing the documents...")
-    # Get the documents (5 in this case):
-    papers_text = sorted_papers.big_papers_content(5)
     # Load the CorpusTokenizer, if it was saved.
     if CorpusTokenizer.are_tokens_saved():
         print("Loading the saved tokenized documents.")
         tokenizer = CorpusTokenizer.saved_tokenizer()
-    # Create the corpus tokenizer, if it can't be loaded.
+    # Create the corpus tokenizer, if it can't be loaded (continuing a previous
+    # tokenization, if it was interrupted).
     else:
-        print("Tokenizing the documents from scratch.")
-        tokenizer = CorpusTokenizer(papers_text)
+        tokenized_docs = CorpusTokenizer.resume_position()
+        print(f"Tokenizing the documents from document {tokenized_docs}.")
+        # Get the documents (5 in this case):
+        papers_text = sorted_papers.big_papers_content(5, start=tokenized_docs)
+        tokenizer = CorpusTokenizer(papers_text, resume=True,
+                                    documents_start=tokenized_docs)
     print("Done. ")
     print(f"[{stopwatch.formatted_runtime()}]")
+
+    # Tokenize a new document with the Phrases of the corpus.
+    print("\nTokenizing a new document...")
+    new_paper = next(sorted_papers.medium_papers_content(1))
+    new_tokens = tokenizer.tokenize_document(new_paper)
+    print(f"Tokens: {len(new_tokens)}, Phrases: "
+          f"{len([token for token in new_tokens if '_' in token])}")
+    print(f"[{stopwatch.formatted_runtime()}]")
@@ -1,24 +1,321 @@
 # Gelin Eguinosa Rosique
 
+import re
+import json
 import spacy
+import inspect
+from os import replace
+from os.path import join, isfile
+from hashlib import blake2b
+from functools import lru_cache
+from collections import OrderedDict, Counter, deque
+from spacy.language import Language
+from spacy.lang.en.stop_words import STOP_WORDS
 from spacy.util import compile_infix_regex
 from spacy.lang.char_classes import ALPHA, ALPHA_LOWER, ALPHA_UPPER, CONCAT_QUOTES, LIST_ELLIPSES, LIST_ICONS
 
+from time_keeper import TimeKeeper
 
-def lazy_corpus_tokenization(documents):
+
+# The maximum number of characters spaCy processes at a time. Longer documents
+# are split in chunks of at most this size.
+max_chunk_size = 100_000
+
+# The spaCy model used in the tokenization.
+spacy_model = 'en_core_web_md'
+
+
+def lazy_corpus_tokenization(documents, chunk_size=max_chunk_size, cache=None):
     """
     Does the tokenization of the corpus in a lazy fashion, one document at a
     time, when the document is needed.
     Removes all the stop words, punctuation symbols and numbers in the
     documents, lowercases the text and lemmatizes each token.
+    The documents longer than 'chunk_size' are split in chunks at their section
+    and paragraph boundaries, and the tokens of the chunks are concatenated.
+    :param documents: An iterable sequence containing the texts of the documents
+    in the corpus.
+    :param chunk_size: The maximum number of characters processed by spaCy at
+    a time.
+    :param cache: A TokenizationCache with the tokens of the texts already
+    processed, or None to tokenize all the documents with spaCy.
+    :return: The sequence of the tokens of the documents in the corpus in a lazy
+    fashion.
+    """
+    # Get the Spacy NLP Model (loaded once per process).
+    nlp = spacy_nlp()
+
+    # Iterating through the text of the documents and doing the tokenization
+    for text in documents:
+        # Use the tokens of the same text, if it was already tokenized.
+        if cache is not None:
+            text_key = cache.text_key(text)
+            text_tokens = cache.doc_tokens(text_key)
+            if text_tokens is not None:
+                yield text_tokens
+                continue
+        if len(text) <= chunk_size:
+            text_tokens = nlp(text).user_data['corpus_tokens']
+        else:
+            # Process the chunks of a long document one at a time.
+            text_tokens = []
+            for chunk_doc in nlp.pipe(text_chunks(text, chunk_size), batch_size=1):
+                text_tokens += chunk_doc.user_data['corpus_tokens']
+        if cache is not None:
+            cache.save_tokens(text_key, text_tokens)
+        # Returns one tokenized document at a time.
+        yield text_tokens
+
+
+def pipe_corpus_tokenization(documents, batch_size=64, n_process=1,
+                             chunk_size=max_chunk_size, cache=None):
+    """
+    Does the tokenization of the corpus using nlp.pipe(), processing the
+    documents in batches and (optionally) in several processes. The tokens are
+    the same lazy_corpus_tokenization() creates, and they are returned in the
+    same order of the documents.
+    The token filter runs inside the pipeline, as its last component, so each
+    worker process only sends back the Docs with their tokens saved in
+    'doc.user_data'.
+    The documents longer than 'chunk_size' are sent to the pipe in chunks, and
+    the tokens of their chunks are put together before returning them.
     :param documents: An iterable sequence containing the texts of the documents
     in the corpus.
+    :param batch_size: The number of documents (or chunks) spaCy processes
+    together.
+    :param n_process: The number of processes used by spaCy. Each process loads
+    its own copy of the model.
+    :param chunk_size: The maximum number of characters processed by spaCy at
+    a time.
+    :param cache: A TokenizationCache with the tokens of the texts already
+    processed, or None to tokenize all the documents with spaCy. Only the texts
+    that are not in the cache (or repeated in the documents) are sent to the
+    pipe.
     :return: The sequence of the tokens of the documents in the corpus in a lazy
     fashion.
     """
-    # Get the Spacy NLP Model.
-    nlp = spacy.load('en_core_web_md')
-    # Changing the infixes to accept words with hyphens (-), like 'covid-19'
+    if cache is None:
+        yield from _pipe_tokens(documents, batch_size, n_process, chunk_size)
+        return
+
+    # The key of each document, and if it was sent to the pipe, in order.
+    docs_queue = deque()
+    missing_texts = _cache_misses(documents, cache, docs_queue)
+    for text_tokens in _pipe_tokens(missing_texts, batch_size, n_process,
+                                    chunk_size):
+        # Return the documents found in the cache before this one.
+        while not docs_queue[0][1]:
+            yield cache.doc_tokens(docs_queue.popleft()[0])
+        text_key, _ = docs_queue.popleft()
+        cache.save_tokens(text_key, text_tokens)
+        yield text_tokens
+    # Return the documents found in the cache after the last tokenized one.
+    while docs_queue:
+        yield cache.doc_tokens(docs_queue.popleft()[0])
+
+
+def _pipe_tokens(documents, batch_size, n_process, chunk_size):
+    """
+    Tokenize the documents with nlp.pipe(), putting together the tokens of the
+    chunks of each document.
+    """
+    # Get the Spacy NLP Model (the token filter is its last component).
+    nlp = spacy_nlp()
+    # Send the chunks with a flag marking the last chunk of each document.
+    chunks_pipe = nlp.pipe(_documents_chunks(documents, chunk_size),
+                           as_tuples=True, batch_size=batch_size,
+                           n_process=n_process)
+    text_tokens = []
+    for chunk_doc, is_last_chunk in chunks_pipe:
+        text_tokens += chunk_doc.user_data['corpus_tokens']
+        if is_last_chunk:
+            yield text_tokens
+            text_tokens = []
+
+
+def _cache_misses(documents, cache, docs_queue):
+    """
+    Select the texts that are not in the cache, and save in the queue the key
+    of every document with a flag that is True if its text has to be
+    tokenized. The repeated texts are only tokenized the first time.
+    """
+    sent_keys = set()
+    for text in documents:
+        text_key = cache.text_key(text)
+        if text_key in sent_keys or text_key in cache:
+            docs_queue.append((text_key, False))
+            continue
+        sent_keys.add(text_key)
+        docs_queue.append((text_key, True))
+        yield text
+
+
+def text_chunks(text, chunk_size=max_chunk_size):
+    """
+    Split a text in chunks of at most 'chunk_size' characters. The text is cut
+    between its paragraphs (the sections of the papers start with a new
+    paragraph '<< section >>'), and a paragraph bigger than the chunk size is
+    cut at the last space that fits in the chunk.
+    :param text: The string with the text.
+    :param chunk_size: The maximum number of characters in a chunk.
+    :return: An iterator with the chunks of the text.
+    """
+    if len(text) <= chunk_size:
+        yield text
+        return
+
+    chunk_parts = []
+    chunk_length = 0
+    for paragraph in text.split('\n\n'):
+        # Cut the paragraphs that don't fit in a chunk.
+        while len(paragraph) > chunk_size:
+            cut = paragraph.rfind(' ', 0, chunk_size)
+            if cut <= 0:
+                cut = chunk_size
+            if chunk_parts:
+                yield '\n\n'.join(chunk_parts)
+                chunk_parts = []
+                chunk_length = 0
+            yield paragraph[:cut]
+            paragraph = paragraph[cut:]
+        # Close the chunk if the paragraph doesn't fit in it.
+        if chunk_parts and chunk_length + 2 + len(paragraph) > chunk_size:
+            yield '\n\n'.join(chunk_parts)
+            chunk_parts = []
+            chunk_length = 0
+        chunk_length += len(paragraph) + (2 if chunk_parts else 0)
+        chunk_parts.append(paragraph)
+    if chunk_parts:
+        yield '\n\n'.join(chunk_parts)
+
+
+def _documents_chunks(documents, chunk_size):
+    """
+    Split the documents in chunks, marking the last chunk of each document.
+    :return: An iterator of tuples with a chunk and a bool that is True if it
+    is the last chunk of its document.
+    """
+    for text in documents:
+        previous_chunk = None
+        for chunk in text_chunks(text, chunk_size):
+            if previous_chunk is not None:
+                yield previous_chunk, False
+            previous_chunk = chunk
+        yield previous_chunk, True
+
+
+def tokenization_benchmark(documents, batch_size=64, n_process=2):
+    """
+    Compare the number of documents per second tokenized by
+    lazy_corpus_tokenization() and by pipe_corpus_tokenization(), and check that
+    both create the same tokens.
+    :param documents: A list with the texts of the documents.
+    :param batch_size: The number of documents spaCy processes together.
+    :param n_process: The number of processes used by nlp.pipe().
+    """
+    print(f"\nTokenizing {len(documents)} documents...")
+    results = []
+    for name, tokenization in [
+            ('One document at a time', lambda: lazy_corpus_tokenization(documents)),
+            (f'nlp.pipe (batch size {batch_size}, {n_process} processes)',
+             lambda: pipe_corpus_tokenization(documents, batch_size, n_process))]:
+        stopwatch = TimeKeeper()
+        results.append(list(tokenization()))
+        run_time = stopwatch.total_runtime()
+        docs_per_sec = len(documents) / run_time if run_time else 0
+        print(f"{name}: {docs_per_sec:.1f} documents per second.")
+    print(f"Same tokens: {results[0] == results[1]}")
+    print(f"Token cache hit rate (this process): {token_cache.hit_rate():.1%}")
+
+
+def documents_tokenization(document, nlp=None):
+    """
+    Tokenize the document, removing all the stop words, punctuation symbols and numbers in the
+    documents. Also, lowercase and lemmatize each token.
+
+    :document: A string representing the text we want to tokenize.
+    :nlp: Natural Language Processing Model to use for the tokenization.
+    :return: A list of strings, with the tokes of the document.
+    """
+    # If the NLP Model wasn't provided, use the shared Spacy NLP Model.
+    if not nlp:
+        nlp = spacy_nlp()
+
+    # Process the long documents in chunks.
+    text_tokens = []
+    for chunk_doc in nlp.pipe(text_chunks(document), batch_size=1):
+        # Use the tokens of the filter component, if the model has it.
+        if 'corpus_tokens' in chunk_doc.user_data:
+            text_tokens += chunk_doc.user_data['corpus_tokens']
+        else:
+            text_tokens += doc_tokens(chunk_doc)
+    # Returns the tokens of the document.
+    return text_tokens
+
+
+@lru_cache(maxsize=None)
+def spacy_nlp():
+    """
+    Load the Spacy NLP Model used in the tokenization (the 2nd biggest English
+    Package) only once per process, and keep it for the next calls.
+    The 'parser', 'ner' and 'textcat' components are not loaded, because we
+    only use the lemmas and the stop words. The 'tok2vec', 'tagger' and
+    'attribute_ruler' are kept, the 'lemmatizer' needs the tags they assign.
+    The infixes of the tokenizer are changed to accept words with hyphens (-),
+    like 'covid-19', and the token filter is added at the end of the pipeline.
+    :return: The Spacy Language object.
+    """
+    nlp = spacy.load(spacy_model, exclude=['parser', 'ner', 'textcat'])
+    nlp.tokenizer.infix_finditer = _infix_regex().finditer
+    nlp.add_pipe('corpus_token_filter', last=True)
+    return nlp
+
+
+def tokenizer_signature(chunk_size=max_chunk_size, backend='spacy'):
+    """
+    Create a string that identifies the configuration of the tokenizer. For
+    spaCy: the versions of spaCy and of its model, the components of the
+    pipeline, the infixes of the tokenizer, the code of the token filter and
+    the size of the chunks. For the regex backend: the pattern of the words,
+    the stop words, the lemma table and the code of the filter. If any of them
+    changes, the signature changes.
+    :param chunk_size: The maximum number of characters processed by spaCy at
+    a time.
+    :param backend: The backend of the tokenization, 'spacy' or 'regex'.
+    :return: A string with the hash of the configuration.
+    """
+    if backend == 'regex':
+        config = {
+            'backend': backend,
+            'word_pattern': regex_word_pattern,
+            'stop_words': sorted(STOP_WORDS),
+            'lemma_table': regex_tokenizer().lemma_table,
+            'token_filter': (inspect.getsource(RegexTokenizer.word_token)
+                             + inspect.getsource(is_acceptable)),
+        }
+    elif backend == 'spacy':
+        nlp = spacy_nlp()
+        config = {
+            'spacy_version': spacy.__version__,
+            'model': spacy_model,
+            'model_version': nlp.meta.get('version'),
+            'pipeline': nlp.pipe_names,
+            'infixes': _infix_regex().pattern,
+            'token_filter': inspect.getsource(filter_token) + inspect.getsource(is_acceptable),
+            'chunk_size': chunk_size,
+        }
+    else:
+        raise Exception(f"The tokenization backend '{backend}' is not supported.")
+    config_json = json.dumps(config, sort_keys=True)
+    return blake2b(config_json.encode('utf-8'), digest_size=16).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _infix_regex():
+    """
+    Compile the infixes of the tokenizer, accepting words with hyphens (-).
+    :return: The compiled regular expression.
+    """
     infixes = (
             LIST_ELLIPSES
             + LIST_ICONS
@@ -32,68 +329,110 @@ def lazy_corpus_tokenization(documents):
                 r"(?<=[{a}0-9])[:<>=/](?=[{a}])".format(a=ALPHA),
             ]
     )
-    infix_re = compile_infix_regex(infixes)
-    nlp.tokenizer.infix_finditer = infix_re.finditer
+    return compile_infix_regex(infixes)
 
-    # Iterating through the text of the documents and doing the tokenization
-    for text in documents:
-        # Disable 'ner' and 'textcat' for faster processing
-        text_doc = nlp(text, disable=['ner', 'texcat'])
-
-        # Lemmatize the tokens, lower the characters, and take only the tokens
-        # with at least one alphabetic character. (food, covid-19, R2, etc..)
-        text_tokens = [token.lemma_.lower().strip()
-                       for token in text_doc
-                       if len(token.text) > 1
-                       and ((token.is_alpha and not token.is_stop)
-                       or (not token.is_alpha and is_acceptable(token.text)))]
-        # Returns one tokenized document at a time.
-        yield text_tokens
 
+def doc_tokens(text_doc):
+    """
+    Get the tokens of a document processed by Spacy.
+    Lemmatize the tokens, lower the characters, and take only the tokens
+    with at least one alphabetic character. (food, covid-19, R2, etc..)
+    The decision for each word (and its lemma) is saved in the token cache, so
+    the repeated words of the corpus are only checked once.
+    :param text_doc: The Spacy Doc of the document.
+    :return: A list of strings, with the tokens of the document.
+    """
+    text_tokens = []
+    for token in text_doc:
+        corpus_token = token_cache.corpus_token(token)
+        if corpus_token is not None:
+            text_tokens.append(corpus_token)
+    return text_tokens
 
-def documents_tokenization(document, nlp=None):
+
+def filter_token(token):
     """
-    Tokenize the document, removing all the stop words, punctuation symbols and numbers in the
-    documents. Also, lowercase and lemmatize each token.
+    Check if a token is kept in the tokenization, and normalize its lemma.
+    :param token: The Spacy Token.
+    :return: The lowercase lemma of the token, or None if the token is dropped.
+    """
+    if len(token.text) > 1 and ((token.is_alpha and not token.is_stop)
+                                or (not token.is_alpha and is_acceptable(token.text))):
+        return token.lemma_.lower().strip()
+    return None
 
-    :document: A string representing the text we want to tokenize.
-    :nlp: Natural Language Processing Model to use for the tokenization.
-    :return: A list of strings, with the tokes of the document.
+
+class TokenFilterCache:
     """
-    # If the NLP Model wasn't provided, get the Spacy NLP Model
-    if not nlp:
-        # 2nd biggest English Package
-        nlp = spacy.load('en_core_web_md')
-        # Change the infixes to accept words with hyphens (-), like 'covid-19'
-        infixes = (
-                LIST_ELLIPSES
-                + LIST_ICONS
-                + [
-                    r"(?<=[0-9])[+\-\*^](?=[0-9-])",
-                    r"(?<=[{al}{q}])\.(?=[{au}{q}])".format(
-                        al=ALPHA_LOWER, au=ALPHA_UPPER, q=CONCAT_QUOTES
-                    ),
-                    r"(?<=[{a}]),(?=[{a}])".format(a=ALPHA),
-                    # r"(?<=[{a}])(?:{h})(?=[{a}])".format(a=ALPHA, h=HYPHENS),
-                    r"(?<=[{a}0-9])[:<>=/](?=[{a}])".format(a=ALPHA),
-                ]
-        )
-        infix_re = compile_infix_regex(infixes)
-        nlp.tokenizer.infix_finditer = infix_re.finditer
-
-    # Disable 'ner' and 'textcat' for faster processing
-    text_doc = nlp(document, disable=['ner', 'texcat'])
-
-    # Lemmatize the tokens, lower the characters, and take only the tokens
-    # with at least one alphabetic character. (food, covid-19, R2, etc..)
-    text_tokens = [token.lemma_.lower().strip()
-                   for token in text_doc
-                   if len(token.text) > 1
-                   and ((token.is_alpha and not token.is_stop)
-                        or (not token.is_alpha and is_acceptable(token.text)))]
-
-    # Returns one tokenized document at a time.
-    return text_tokens
+    Bounded cache with the result of filter_token() for each word and lemma.
+    The decision only depends on the text of the token (its orth id) and its
+    lemma (which can change with the part of speech), so both ids are used as
+    the key. When the cache is full, the least recently used entry is removed.
+    """
+
+    def __init__(self, max_size=200_000):
+        """
+        Create an empty cache.
+        :param max_size: The maximum number of entries in the cache.
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def corpus_token(self, token):
+        """
+        Get the normalized lemma of the token, or None if it's dropped, using
+        the cached decision when the word was seen before.
+        :param token: The Spacy Token.
+        :return: The lowercase lemma of the token, or None.
+        """
+        key = (token.orth, token.lemma)
+        entries = self.entries
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        # Check the token, and save the decision.
+        self.misses += 1
+        corpus_token = filter_token(token)
+        entries[key] = corpus_token
+        if len(entries) > self.max_size:
+            entries.popitem(last=False)
+        return corpus_token
+
+    def hit_rate(self):
+        """
+        Get the fraction of the tokens found in the cache.
+        :return: A float between 0 and 1.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self):
+        """
+        Remove the entries of the cache and restart the counters.
+        """
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# The cache of the token filter of this process.
+token_cache = TokenFilterCache()
+
+
+@Language.component('corpus_token_filter')
+def corpus_token_filter(text_doc):
+    """
+    Pipeline component that saves the tokens of the document in
+    'doc.user_data', so the filter also runs in the worker processes of
+    nlp.pipe().
+    :param text_doc: The Spacy Doc of the document.
+    :return: The same Doc.
+    """
+    text_doc.user_data['corpus_tokens'] = doc_tokens(text_doc)
+    return text_doc
 
 
 def is_acceptable(text):
@@ -116,3 +455,188 @@ def is_acceptable(text):
         if char == '-':
             has_hyphen = True
     return has_alpha and has_hyphen
+
+
+# --- Regex Backend ---
+
+# The words of the regex backend: letters and digits, joined by hyphens (-),
+# like 'covid-19'. The negations are separated like spaCy does ("weren't" ->
+# "were", "n't").
+regex_word_pattern = r"[^\W_]+?(?=n['’]t\b)|[^\W_]+(?:-[^\W_]+)*"
+
+# The file with the lemmas exported from the spaCy model.
+lemma_table_path = join('project_data', 'lemma_table.json')
+
+
+def regex_corpus_tokenization(documents, cache=None):
+    """
+    Does the tokenization of the corpus in a lazy fashion with the regex
+    backend, that doesn't use spaCy. The words are found with a compiled
+    regular expression, filtered with the same rules of filter_token() and a
+    static list of stop words, and lemmatized with the lemma table exported
+    from the spaCy model.
+    The tokens are close to the ones of spaCy (see backend_agreement()), but
+    not the same.
+    :param documents: An iterable sequence containing the texts of the documents
+    in the corpus.
+    :param cache: A TokenizationCache with the tokens of the texts already
+    processed, or None.
+    :return: The sequence of the tokens of the documents in the corpus in a lazy
+    fashion.
+    """
+    tokenizer = regex_tokenizer()
+    for text in documents:
+        if cache is not None:
+            text_key = cache.text_key(text)
+            text_tokens = cache.doc_tokens(text_key)
+            if text_tokens is not None:
+                yield text_tokens
+                continue
+        text_tokens = tokenizer.doc_tokens(text)
+        if cache is not None:
+            cache.save_tokens(text_key, text_tokens)
+        yield text_tokens
+
+
+class RegexTokenizer:
+    """
+    Tokenizer of the regex backend. The decision for each word (keep it and
+    use its lemma, or drop it) is saved, so the repeated words of the corpus
+    are only checked once.
+    """
+
+    def __init__(self, lemma_table, max_size=200_000):
+        """
+        Create the tokenizer with the given lemmas.
+        :param lemma_table: A dictionary with the lowercase words and their
+        lemmas. The words that are not in the table are their own lemma.
+        :param max_size: The maximum number of word decisions saved.
+        """
+        self.lemma_table = lemma_table
+        self.max_size = max_size
+        self.word_finder = re.compile(regex_word_pattern).findall
+        self.decisions = {}
+
+    def doc_tokens(self, text):
+        """
+        Get the tokens of a text.
+        :param text: The string with the text.
+        :return: A list of strings, with the tokens of the text.
+        """
+        decisions = self.decisions
+        text_tokens = []
+        for word in self.word_finder(text):
+            if word in decisions:
+                corpus_token = decisions[word]
+            else:
+                corpus_token = self.word_token(word)
+                # Start again when the saved decisions are too many.
+                if len(decisions) >= self.max_size:
+                    decisions.clear()
+                decisions[word] = corpus_token
+            if corpus_token is not None:
+                text_tokens.append(corpus_token)
+        return text_tokens
+
+    def word_token(self, word):
+        """
+        Check if a word is kept in the tokenization (with the rules of
+        filter_token()), and get its lemma.
+        :param word: The string with the word.
+        :return: The lowercase lemma of the word, or None if it's dropped.
+        """
+        lower_word = word.lower()
+        if len(word) > 1 and ((word.isalpha() and lower_word not in STOP_WORDS)
+                              or (not word.isalpha() and is_acceptable(word))):
+            return self.lemma_table.get(lower_word, lower_word)
+        return None
+
+
+@lru_cache(maxsize=None)
+def regex_tokenizer():
+    """
+    Load the lemma table and create the tokenizer of the regex backend, only
+    once per process.
+    :return: The RegexTokenizer.
+    """
+    if not isfile(lemma_table_path):
+        raise Exception("The lemma table of the regex backend was not exported,"
+                        " create it with export_lemma_table().")
+    with open(lemma_table_path, 'r') as file:
+        lemma_table = json.load(file)
+    return RegexTokenizer(lemma_table)
+
+
+def export_lemma_table(documents, batch_size=64, n_process=1):
+    """
+    Create the lemma table of the regex backend with the spaCy model, using the
+    most frequent lemma of each word accepted by the token filter in the given
+    documents (a sample of the corpus). Only the words that have a lemma
+    different from themselves are saved.
+    :param documents: An iterable sequence with the texts of the documents.
+    :param batch_size: The number of documents spaCy processes together.
+    :param n_process: The number of processes used by spaCy.
+    :return: The number of words in the table.
+    """
+    nlp = spacy_nlp()
+    words_lemmas = {}
+    texts = (chunk for text in documents for chunk in text_chunks(text))
+    for text_doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process):
+        for token in text_doc:
+            corpus_token = token_cache.corpus_token(token)
+            if corpus_token is None:
+                continue
+            word_lemmas = words_lemmas.setdefault(token.text.lower(), Counter())
+            word_lemmas[corpus_token] += 1
+
+    # Save the most frequent lemma of the words.
+    lemma_table = {}
+    for word, word_lemmas in words_lemmas.items():
+        lemma = word_lemmas.most_common(1)[0][0]
+        if lemma != word:
+            lemma_table[word] = lemma
+    with open(lemma_table_path + '.temp', 'w') as file:
+        json.dump(lemma_table, file)
+    replace(lemma_table_path + '.temp', lemma_table_path)
+    # Use the new table in this process.
+    regex_tokenizer.cache_clear()
+    return len(lemma_table)
+
+
+def backend_agreement(documents):
+    """
+    Compare the tokens of the regex backend with the tokens of spaCy: the
+    documents per second of each backend, the overlap of the tokens of each
+    document (F1 of the bags of tokens) and the tokens where they disagree
+    the most.
+    :param documents: A list with the texts of the documents.
+    """
+    print(f"\nTokenizing {len(documents)} documents with both backends...")
+    results = []
+    for name, tokenization in [('spaCy', lazy_corpus_tokenization),
+                               ('Regex', regex_corpus_tokenization)]:
+        stopwatch = TimeKeeper()
+        results.append(list(tokenization(documents)))
+        run_time = stopwatch.total_runtime()
+        docs_per_sec = len(documents) / run_time if run_time else 0
+        print(f"{name}: {docs_per_sec:.1f} documents per second.")
+
+    # The overlap of the tokens of each document.
+    docs_f1 = []
+    spacy_only = Counter()
+    regex_only = Counter()
+    same_docs = 0
+    for spacy_tokens, regex_tokens in zip(*results):
+        spacy_bag = Counter(spacy_tokens)
+        regex_bag = Counter(regex_tokens)
+        common = sum((spacy_bag & regex_bag).values())
+        total = len(spacy_tokens) + len(regex_tokens)
+        docs_f1.append(2 * common / total if total else 1.0)
+        spacy_only.update(spacy_bag - regex_bag)
+        regex_only.update(regex_bag - spacy_bag)
+        same_docs += spacy_tokens == regex_tokens
+    mean_f1 = sum(docs_f1) / len(docs_f1) if docs_f1 else 1.0
+    print(f"Mean token agreement (F1): {mean_f1:.2%}")
+    print(f"Documents with the same tokens: {same_docs} of {len(documents)}")
+    print(f"Tokens only in spaCy: {spacy_only.most_common(10)}")
+    print(f"Tokens only in Regex: {regex_only.most_common(10)}")
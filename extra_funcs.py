@@ -1,6 +1,15 @@
 # Gelin Eguinosa Rosique
 
-from sys import stdout
+from sys import stdout, platform
+from random import Random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak memory can't be measured.
+    resource = None
 
 
 def progress_bar(progress, total):
@@ -44,3 +53,115 @@ def big_number(number):
 
     # Return the reformatted string of the number.
     return new_string
+
+
+def peak_memory():
+    """
+    Get the Peak Resident Memory of the current process in megabytes
+    ('ru_maxrss' is in bytes on macOS and in kilobytes on Linux).
+    :return: A float with the megabytes, or None if the memory can't be
+    measured on this platform (e.g. Windows).
+    """
+    if not resource:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if platform == 'darwin' else rss / 2**10
+
+
+def ordered_parallel_map(func, items, n_workers, max_in_flight=None,
+                         initializer=None, initargs=()):
+    """
+    Apply 'func' to each of the items using a pool of worker processes, and
+    return the results in the same order of the items. Only 'max_in_flight'
+    items are being processed or waiting to be consumed at the same time, to
+    keep the memory use flat even with big results or slow consumers.
+    :param func: Function to apply to the items, it needs to be defined at the
+    module level, so it can be sent to the worker processes.
+    :param items: An iterable with the arguments for each call of the function.
+    :param n_workers: The number of worker processes.
+    :param max_in_flight: The maximum number of items submitted to the workers
+    whose results haven't been consumed. By default, 4 times the number of
+    workers.
+    :param initializer: A function called once in each worker when it starts
+    (e.g. to receive a big object shared by all the items).
+    :param initargs: The arguments of the initializer.
+    :return: A lazy sequence with the results of the function.
+    """
+    # Default size of the window.
+    if not max_in_flight:
+        max_in_flight = 4 * n_workers
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=initializer,
+                             initargs=initargs) as executor:
+        # Futures of the items submitted, in the order of the items.
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            # Wait for the oldest item when the window is full.
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        # Return the remaining results.
+        while pending:
+            yield pending.popleft().result()
+
+
+def seeded_random(seed=None, stream=''):
+    """
+    Create a random number generator for the given seed. Different streams of
+    the same seed (e.g. one for each group of papers) get independent
+    generators, that are still the same between runs.
+    :param seed: An int or string with the seed. If it's None, the generator
+    is not reproducible.
+    :param stream: String with the name of the stream of random numbers.
+    :return: A random.Random instance.
+    """
+    if seed is None:
+        return Random()
+    return Random(f'{seed}:{stream}')
+
+
+def reservoir_sample(items, k, rng):
+    """
+    Select 'k' random items from an iterable of unknown length, going through
+    it only once and keeping at most 'k' items in memory.
+    :param items: An iterable with the items.
+    :param k: The number of items to select.
+    :param rng: The random.Random instance used to select the items.
+    :return: A list with the selected items, in the order they were found.
+    """
+    reservoir = []
+    positions = []
+    for position, item in enumerate(items):
+        if position < k:
+            reservoir.append(item)
+            positions.append(position)
+            continue
+        # Replace one of the selected items with probability k/(position+1).
+        slot = rng.randrange(position + 1)
+        if slot < k:
+            reservoir[slot] = item
+            positions[slot] = position
+    # Restore the order of the items.
+    return [item for _, item in sorted(zip(positions, reservoir),
+                                       key=lambda pair: pair[0])]
+
+
+def selection_sample(items, total, k, rng):
+    """
+    Select 'k' random items from an iterable with 'total' items, yielding them
+    while going through it. No item is kept in memory, so the sample can be
+    as big as the iterable.
+    :param items: An iterable with the items.
+    :param total: The number of items in the iterable.
+    :param k: The number of items to select.
+    :param rng: The random.Random instance used to select the items.
+    :return: A lazy sequence with the selected items, in their original order.
+    """
+    needed = min(k, total)
+    for remaining, item in zip(range(total, 0, -1), items):
+        if needed == 0:
+            break
+        # Select the item with probability needed/remaining.
+        if rng.randrange(remaining) < needed:
+            needed -= 1
+            yield item
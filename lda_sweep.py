@@ -0,0 +1,300 @@
+# Gelin Eguinosa Rosique
+
+import csv
+import argparse
+import numpy as np
+from os import mkdir
+from itertools import product
+from multiprocessing import get_context
+from os.path import isdir, isfile, join, getmtime
+from gensim.corpora import Dictionary
+from gensim.models import LdaModel
+
+from topic_processing import TopicManager
+from time_keeper import TimeKeeper
+from extra_funcs import peak_memory
+
+
+class CsrCorpus:
+    """
+    Corpus bag-of-words saved as a sparse CSR matrix in three numpy arrays (the
+    offsets of the documents, the ids of the words and their frequencies). The
+    arrays are memory-mapped, so all the processes of a sweep share the same
+    copy of the corpus in the page cache.
+    """
+    # Files of the Corpus (inside the folder given to the corpus).
+    indptr_file = 'corpus_indptr.npy'
+    indices_file = 'corpus_indices.npy'
+    data_file = 'corpus_data.npy'
+
+    def __init__(self, corpus_folder):
+        """
+        Memory-map the arrays of the corpus.
+        :param corpus_folder: The path of the folder where the corpus is saved.
+        """
+        self.indptr = np.load(join(corpus_folder, self.indptr_file), mmap_mode='r')
+        self.indices = np.load(join(corpus_folder, self.indices_file), mmap_mode='r')
+        self.data = np.load(join(corpus_folder, self.data_file), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __iter__(self):
+        """
+        Iterate through the bag-of-words of the documents.
+        :return: An iterator of lists of tuples (word id, frequency).
+        """
+        indptr = self.indptr
+        for position in range(len(self)):
+            start, end = int(indptr[position]), int(indptr[position + 1])
+            yield list(zip(self.indices[start:end].tolist(),
+                           self.data[start:end].tolist()))
+
+    @classmethod
+    def create(cls, corpus_folder, corpus_bow):
+        """
+        Save a corpus bag-of-words in the CSR arrays.
+        :param corpus_folder: The path of the folder of the corpus.
+        :param corpus_bow: An iterable with the bag-of-words of the documents.
+        :return: The created CsrCorpus.
+        """
+        if not isdir(corpus_folder):
+            mkdir(corpus_folder)
+        indptr = [0]
+        indices = []
+        data = []
+        for doc_bow in corpus_bow:
+            for word_id, frequency in doc_bow:
+                indices.append(word_id)
+                data.append(frequency)
+            indptr.append(len(indices))
+        np.save(join(corpus_folder, cls.indptr_file), np.array(indptr, dtype=np.int64))
+        np.save(join(corpus_folder, cls.indices_file), np.array(indices, dtype=np.int32))
+        np.save(join(corpus_folder, cls.data_file), np.array(data, dtype=np.float32))
+        return cls(corpus_folder)
+
+    @classmethod
+    def is_corpus_saved(cls, corpus_folder, source_path=None):
+        """
+        Check if the corpus is saved in the folder, and if it's newer than the
+        file it was created from.
+        :param corpus_folder: The path of the folder of the corpus.
+        :param source_path: The path of the corpus bag-of-words, or None.
+        :return: Bool representing if the corpus can be loaded.
+        """
+        for file_name in [cls.indptr_file, cls.indices_file, cls.data_file]:
+            file_path = join(corpus_folder, file_name)
+            if not isfile(file_path):
+                return False
+            if source_path and getmtime(file_path) < getmtime(source_path):
+                return False
+        return True
+
+
+class LdaSweep:
+    """
+    Train the LDA Models of a grid of parameters in a pool of processes, on top
+    of the models of the TopicManager. The grid points already in the index of
+    the TopicManager are skipped, and the coherence, perplexity, training time
+    and peak memory of the new models are saved in a CSV table.
+    """
+    # Location Class Data
+    data_folder = TopicManager.data_folder
+    csr_folder = 'corpus_csr'
+    results_file = 'lda_sweep_results.csv'
+    results_columns = ['lda_model', 'num_topics', 'chunksize', 'passes',
+                       'iterations', 'coherence', 'perplexity', 'train_seconds',
+                       'peak_memory_mb']
+
+    def __init__(self, topic_manager=None):
+        """
+        Prepare the memory-mapped copy of the corpus of the TopicManager.
+        :param topic_manager: The TopicManager with the dictionary, the corpus
+        and the index of the models. If it's None, the saved TopicManager is
+        loaded.
+        """
+        if topic_manager is None:
+            topic_manager = TopicManager.saved_topic_manager()
+        self.topic_manager = topic_manager
+        # Create the CSR copy of the corpus, if it's missing or outdated.
+        self.csr_folder_path = join(self.data_folder, self.csr_folder)
+        corpus_path = join(self.data_folder, TopicManager.corpus_file)
+        if not CsrCorpus.is_corpus_saved(self.csr_folder_path, corpus_path):
+            CsrCorpus.create(self.csr_folder_path, topic_manager.corpus_bow)
+
+    def run(self, topics_grid, chunksize_grid, passes_grid, iterations=400,
+            eval_every=None, n_workers=2, show_progress=True):
+        """
+        Train the LDA Models of all the combinations of the grid that are not
+        in the index of the TopicManager. Each model is trained in its own
+        process (a new process per model), and saved in the index as soon as
+        it's done.
+        :param topics_grid: A list with the numbers of topics.
+        :param chunksize_grid: A list with the chunk sizes.
+        :param passes_grid: A list with the numbers of passes.
+        :param iterations: Maximum number of iterations when inferring the
+        topic distribution of the documents.
+        :param eval_every: Log perplexity is estimated every that many updates.
+        :param n_workers: The number of models trained at the same time.
+        :param show_progress: Bool representing whether we print the results
+        of the models as they finish.
+        :return: A list of dictionaries with the results of the new models.
+        """
+        # Select the grid points that were not trained, and name their models.
+        lda_folder_path = join(self.data_folder, TopicManager.lda_folder)
+        dict_path = join(self.data_folder, TopicManager.dict_file)
+        grid_points = []
+        new_names = []
+        for num_topics, chunksize, passes in product(topics_grid, chunksize_grid,
+                                                     passes_grid):
+            lda_params = (num_topics, chunksize, passes, iterations, eval_every,
+                          'single', None, 'auto')
+            if lda_params in self.topic_manager.lda_index:
+                if show_progress:
+                    print(f"Skipping {num_topics} topics, chunksize {chunksize},"
+                          f" {passes} passes (already trained).")
+                continue
+            lda_model_name = self.topic_manager.new_lda_name(new_names)
+            new_names.append(lda_model_name)
+            grid_points.append((lda_params, join(lda_folder_path, lda_model_name),
+                                dict_path, self.csr_folder_path))
+
+        # Train the models, one process per model. The processes are spawned
+        # instead of forked, so they don't inherit the memory of this process
+        # (the TopicManager), and their peak memory is only from the training.
+        sweep_results = []
+        with get_context('spawn').Pool(processes=n_workers,
+                                       maxtasksperchild=1) as pool:
+            for lda_params, lda_model_path, model_results in pool.imap_unordered(
+                    _train_grid_point, grid_points):
+                lda_model_name = lda_model_path[len(lda_folder_path) + 1:]
+                self.topic_manager.add_lda_model(lda_params, lda_model_name)
+                model_results['lda_model'] = lda_model_name
+                self._save_results(model_results)
+                sweep_results.append(model_results)
+                if show_progress:
+                    print(f"{lda_model_name}: {model_results['num_topics']} topics, "
+                          f"coherence {model_results['coherence']:.4f}, "
+                          f"perplexity {model_results['perplexity']:.1f}, "
+                          f"{model_results['train_seconds']:.1f} seconds.")
+        return sweep_results
+
+    def _save_results(self, model_results):
+        """
+        Add the results of a model to the CSV table of the sweeps.
+        """
+        results_path = join(self.data_folder, TopicManager.lda_folder,
+                            self.results_file)
+        new_table = not isfile(results_path)
+        with open(results_path, 'a', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=self.results_columns)
+            if new_table:
+                writer.writeheader()
+            writer.writerow(model_results)
+
+    @classmethod
+    def saved_results(cls):
+        """
+        Load the results of the models trained in the sweeps.
+        :return: A list of dictionaries with the rows of the table.
+        """
+        results_path = join(cls.data_folder, TopicManager.lda_folder,
+                            cls.results_file)
+        if not isfile(results_path):
+            return []
+        with open(results_path, 'r', newline='') as file:
+            return list(csv.DictReader(file))
+
+
+def _train_grid_point(grid_point):
+    """
+    Train and evaluate the LDA Model of a grid point inside a worker process,
+    with the same settings as TopicManager.lda_model() in one process.
+    :param grid_point: A tuple with the parameters of the model, the path
+    where it's saved, the path of the dictionary and the folder of the CSR
+    corpus.
+    :return: A tuple with the parameters, the path of the model and a
+    dictionary with its results.
+    """
+    # The peak memory of the process before loading the model's data.
+    start_memory = peak_memory()
+    lda_params, lda_model_path, dict_path, csr_folder_path = grid_point
+    num_topics, chunksize, passes, iterations, eval_every = lda_params[:5]
+    dictionary = Dictionary.load(dict_path)
+    corpus = CsrCorpus(csr_folder_path)
+
+    # Train the model.
+    stopwatch = TimeKeeper()
+    temp = dictionary[0]  # This is only to "load" the dictionary
+    lda_model = LdaModel(
+        corpus=corpus,
+        id2word=dictionary.id2token,
+        chunksize=chunksize,
+        alpha='auto',
+        eta='auto',
+        iterations=iterations,
+        num_topics=num_topics,
+        passes=passes,
+        eval_every=eval_every
+    )
+    train_seconds = stopwatch.total_runtime()
+    lda_model.save(lda_model_path)
+
+    # Evaluate the model (the same coherence reported by main.py).
+    top_topics = lda_model.top_topics(corpus)
+    coherence = sum(topic[1] for topic in top_topics) / len(top_topics)
+    perplexity = 2 ** (-lda_model.log_perplexity(corpus))
+    # The memory used by the training and the evaluation of the model (not
+    # available on Windows).
+    train_memory = None
+    if start_memory is not None:
+        train_memory = round(peak_memory() - start_memory, 1)
+
+    model_results = {
+        'num_topics': num_topics,
+        'chunksize': chunksize,
+        'passes': passes,
+        'iterations': iterations,
+        'coherence': coherence,
+        'perplexity': perplexity,
+        'train_seconds': train_seconds,
+        'peak_memory_mb': train_memory,
+    }
+    return lda_params, lda_model_path, model_results
+
+
+# Run a sweep from the Command Line.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Train the LDA Models of a grid of parameters in parallel.")
+    parser.add_argument('--topics', type=int, nargs='+', default=[10, 15, 20, 40],
+                        help="The numbers of topics of the grid.")
+    parser.add_argument('--chunksize', type=int, nargs='+', default=[20],
+                        help="The chunk sizes of the grid.")
+    parser.add_argument('--passes', type=int, nargs='+', default=[10],
+                        help="The numbers of passes of the grid.")
+    parser.add_argument('--iterations', type=int, default=400)
+    parser.add_argument('--workers', type=int, default=2,
+                        help="The number of models trained at the same time.")
+    args = parser.parse_args()
+
+    # Record the Runtime of the Program.
+    sweep_stopwatch = TimeKeeper()
+    if not TopicManager.is_topic_manager_saved():
+        raise Exception("Run main.py first to create the dictionary and the"
+                        " corpus bag-of-words.")
+    print("\nLoading the corpus of the TopicManager...")
+    lda_sweep = LdaSweep()
+    print("Done.")
+    print(f"[{sweep_stopwatch.formatted_runtime()}]")
+
+    print("\nTraining the LDA Models of the grid...")
+    lda_sweep.run(args.topics, args.chunksize, args.passes, args.iterations,
+                  n_workers=args.workers)
+    print("Done.")
+    print(f"[{sweep_stopwatch.formatted_runtime()}]")
+
+    # Show the table with the results of all the sweeps.
+    print("\nResults of the sweeps:")
+    for row in LdaSweep.saved_results():
+        print(", ".join(f"{column}: {row[column]}" for column in LdaSweep.results_columns))
@@ -17,7 +17,7 @@ if __name__ == '__main__':
     # Separate the CORD-19 papers by their size in 3 categories
     # (small - 1 paragraph, medium - 1 page, big - more than 1 page)
     print("\nSorting and separating the CORD-19 papers by size in 3 categories...")
-    sorted_papers = PapersAnalyzer()
+    sorted_papers = PapersAnalyzer(compact_index=True)
     print("Done.")
     print(f"[{stopwatch.formatted_runtime()}]")
 
@@ -33,7 +33,9 @@ if __name__ == '__main__':
 
     # Get the 30,000 documents from the 'big' category.
     print("\nExtracting 30,000 Big Papers from CORD-19...")
-    papers_text = sorted_papers.big_papers_content(30_000)
+    # (with their cord_uid, to know the paper of each tokenized document).
+    big_uids = list(sorted_papers.big_papers)[:30_000]
+    papers_text = zip(big_uids, sorted_papers.papers_content(big_uids))
     print("Done.")
     print(f"[{stopwatch.formatted_runtime()}]")
 
@@ -46,7 +48,9 @@ if __name__ == '__main__':
     # Create the corpus tokenizer, if it can't be loaded.
     else:
         print("Tokenizing the documents from scratch.")
-        tokenizer = CorpusTokenizer(papers_text)
+        tokenizer = CorpusTokenizer(papers_text, use_cache=True)
+        print(f"Documents taken from the tokenization cache (spaCy calls "
+              f"saved): {big_number(tokenizer.cached_docs)}")
     print("Done. ")
     print(f"[{stopwatch.formatted_runtime()}]")
 
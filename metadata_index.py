@@ -0,0 +1,180 @@
+# Gelin Eguinosa Rosique
+
+import json
+from os.path import join, isfile
+from bisect import bisect_left, bisect_right
+
+from papers import Papers
+from time_keeper import TimeKeeper
+from extra_funcs import big_number
+
+
+class MetadataIndex:
+    """
+    Secondary indexes over the metadata of the CORD-19 papers, to select papers
+    by their publish time, authors or available documents without scanning
+    the whole Papers' Index.
+    """
+    # Class Data Locations
+    data_folder = 'project_data'
+    metadata_index_file = 'metadata_index.json'
+
+    def __init__(self, cord19_papers=None):
+        """
+        Load the saved metadata indexes, or create them if they don't exist or
+        belong to a different dataset.
+        :param cord19_papers: The Papers of the CORD-19 dataset. If it's None, a
+        new instance of Papers is created.
+        """
+        # Get the CORD-19 papers.
+        if cord19_papers is None:
+            cord19_papers = Papers()
+        current_dataset = cord19_papers.current_dataset
+
+        # Load the indexes if they were created for the current dataset.
+        metadata_index_path = join(self.data_folder, self.metadata_index_file)
+        metadata_index = None
+        if isfile(metadata_index_path):
+            with open(metadata_index_path, 'r') as file:
+                metadata_index = json.load(file)
+            if metadata_index['dataset'] != current_dataset:
+                metadata_index = None
+
+        # Create the indexes and save them.
+        if metadata_index is None:
+            metadata_index = self._create_indexes(cord19_papers.papers_index)
+            metadata_index['dataset'] = current_dataset
+            with open(metadata_index_path, 'w') as file:
+                json.dump(metadata_index, file)
+
+        # Sorted publish times, with the 'cord_uid' of their papers.
+        self.publish_times = metadata_index['publish_times']
+        self.times_uids = metadata_index['times_uids']
+        # The papers of each author.
+        self.authors_papers = metadata_index['authors_papers']
+        # The papers with each kind of documents.
+        self.pmc_papers = set(metadata_index['pmc_papers'])
+        self.pdf_papers = set(metadata_index['pdf_papers'])
+
+    @staticmethod
+    def _create_indexes(papers_index):
+        """
+        Scan the Papers' Index once to create the metadata indexes.
+        :param papers_index: Dictionary with the information of the papers.
+        :return: Dictionary with the metadata indexes.
+        """
+        papers_times = []
+        authors_papers = {}
+        pmc_papers = []
+        pdf_papers = []
+        for cord_uid, paper_dict in papers_index.items():
+            # Papers without publish time are not in the time index.
+            if paper_dict['publish_time']:
+                papers_times.append((paper_dict['publish_time'], cord_uid))
+            for author in paper_dict['authors']:
+                author_key = author.strip().lower()
+                if author_key:
+                    authors_papers.setdefault(author_key, []).append(cord_uid)
+            if 'pmc_json_files' in paper_dict:
+                pmc_papers.append(cord_uid)
+            if 'pdf_json_files' in paper_dict:
+                pdf_papers.append(cord_uid)
+
+        # Sort the papers by their publish time.
+        papers_times.sort()
+        metadata_index = {
+            'publish_times': [publish_time for publish_time, _ in papers_times],
+            'times_uids': [cord_uid for _, cord_uid in papers_times],
+            'authors_papers': authors_papers,
+            'pmc_papers': pmc_papers,
+            'pdf_papers': pdf_papers,
+        }
+        return metadata_index
+
+    def published_between(self, start='', end=''):
+        """
+        Find the papers published between the dates 'start' and 'end'. The dates
+        use the format of the CORD-19 metadata ('YYYY-MM-DD'), and can be
+        partial: published_between('2020-03', '2020') includes all the papers
+        from March to December of 2020.
+        :param start: The first date of the range. If it's empty, the range has
+        no start.
+        :param end: The last date of the range (inclusive). If it's empty, the
+        range has no end.
+        :return: A list with the 'cord_uid' of the papers, sorted by date.
+        """
+        first = bisect_left(self.publish_times, start) if start else 0
+        # Include all the dates that start with 'end'.
+        last = (bisect_right(self.publish_times, end + '\uffff') if end
+                else len(self.publish_times))
+        return self.times_uids[first:last]
+
+    def published_in(self, year):
+        """
+        Find the papers published in the given year.
+        :param year: An int or string with the year.
+        :return: A list with the 'cord_uid' of the papers.
+        """
+        return self.published_between(str(year), str(year))
+
+    def author_papers(self, author):
+        """
+        Find the papers of an author, as written in the metadata of CORD-19
+        ('Last Name, First Name'). The comparison ignores upper cases.
+        :param author: String with the name of the author.
+        :return: A list with the 'cord_uid' of the papers.
+        """
+        return self.authors_papers.get(author.strip().lower(), [])
+
+    def authors_papers_union(self, authors):
+        """
+        Find the papers written by at least one of the given authors.
+        :param authors: A list with the names of the authors.
+        :return: A set with the 'cord_uid' of the papers.
+        """
+        papers = set()
+        for author in authors:
+            papers.update(self.author_papers(author))
+        return papers
+
+    def authors_papers_intersection(self, authors):
+        """
+        Find the papers written by all the given authors.
+        :param authors: A list with the names of the authors.
+        :return: A set with the 'cord_uid' of the papers.
+        """
+        if not authors:
+            return set()
+        papers = set(self.author_papers(authors[0]))
+        for author in authors[1:]:
+            papers.intersection_update(self.author_papers(author))
+        return papers
+
+    def has_pmc(self, cord_uid):
+        """
+        Check if the paper has documents in the 'pmc_json_files'.
+        """
+        return cord_uid in self.pmc_papers
+
+    def has_pdf(self, cord_uid):
+        """
+        Check if the paper has documents in the 'pdf_json_files'.
+        """
+        return cord_uid in self.pdf_papers
+
+
+# Test the class.
+if __name__ == '__main__':
+    # Record the Runtime of the Program
+    stopwatch = TimeKeeper()
+
+    print("\nLoading the Metadata Indexes...")
+    metadata = MetadataIndex()
+    print("Done.")
+    print(f"[{stopwatch.formatted_runtime()}]")
+
+    papers_2020 = metadata.published_in(2020)
+    print(f"\nPapers published in 2020: {big_number(len(papers_2020))}")
+    pmc_2020 = [cord_uid for cord_uid in papers_2020 if metadata.has_pmc(cord_uid)]
+    print(f"Papers published in 2020 with PMC documents: {big_number(len(pmc_2020))}")
+    print(f"[{stopwatch.formatted_runtime()}]")
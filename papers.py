@@ -1,15 +1,26 @@
 # Gelin Eguinosa Rosique
 
+import re
 import csv
 import json
-from os import mkdir
+from os import mkdir, remove
 from os.path import join, isfile, isdir
+from hashlib import blake2b
 from collections import defaultdict
 
+from extra_funcs import ordered_parallel_map, progress_bar
+from compact_index import CompactPapersIndex, save_compact_index
+from text_store import PapersTextStore, compress_content
+from read_ahead import read_ahead as read_files_ahead
+
 # To test the class
 from random import randint
 from time_keeper import TimeKeeper
 
+# To decode only the 'body_text' of the CORD-19 documents.
+_json_decoder = json.JSONDecoder()
+_body_text_key = re.compile(r'[{,]\s*"body_text"\s*:\s*')
+
 
 class Papers:
     """
@@ -24,19 +35,47 @@ class Papers:
     # Project Data Location
     data_folder = 'project_data'
     papers_index_file = 'papers_index.json'
+    compact_index_file = 'papers_index.bin'
+    index_info_file = 'papers_index_info.json'
+    papers_update_file = 'papers_update.json'
 
-    def __init__(self):
+    def __init__(self, compact_index=False, read_ahead=0):
         """
         Load the metadata.csv to create the index of all the papers available in
         the current CORD-19 dataset and save all the information of interest.
+        :param compact_index: Bool to determine if we use the compact binary
+        version of the papers' index, which is memory-mapped and only decodes
+        the information of a paper when it is needed, instead of loading the
+        whole JSON index.
+        :param read_ahead: The number of papers whose JSON files are read in
+        background threads ahead of the consumer, when the content of several
+        papers is extracted in this process. If it's 0, the files are read one
+        at a time.
         """
+        # Papers read ahead by default in the iterators of contents.
+        self.read_ahead = read_ahead
+
         # Create a data folder if it doesn't exist.
         if not isdir(self.data_folder):
             mkdir(self.data_folder)
-        # Form the papers index path.
+        # Form the papers index paths.
         papers_index_path = join(self.data_folder, self.papers_index_file)
-        # Check if the papers' index exists or not.
+        compact_index_path = join(self.data_folder, self.compact_index_file)
+
+        # If the saved index belongs to a previous CORD-19 release, update it
+        # with the papers added, changed or removed in the current dataset.
         if isfile(papers_index_path):
+            index_info = self._load_index_info()
+            if index_info['dataset'] != self.current_dataset:
+                self._update_papers_index(index_info)
+        # The changes made by the last update of the index (if any).
+        self.last_update = self.load_last_update()
+
+        # Use the compact index if it was requested and already created.
+        if compact_index and isfile(compact_index_path):
+            self.papers_index = CompactPapersIndex(compact_index_path)
+        # Check if the papers' index exists or not.
+        elif isfile(papers_index_path):
             # Load the Papers' Index.
             with open(papers_index_path, 'r') as file:
                 self.papers_index = json.load(file)
@@ -46,6 +85,21 @@ class Papers:
             # Save the Papers' Index
             with open(papers_index_path, 'w') as file:
                 json.dump(self.papers_index, file)
+            # Save the dataset and the content hashes of the papers.
+            self._save_index_info(self.papers_index)
+
+        # Create the compact index the first time it is requested.
+        if compact_index and not isinstance(self.papers_index, CompactPapersIndex):
+            save_compact_index(self.papers_index, compact_index_path)
+            self.papers_index = CompactPapersIndex(compact_index_path)
+
+        # Use the texts of the papers already extracted from their JSON files,
+        # if they were saved for the current dataset.
+        self.text_store = None
+        if PapersTextStore.is_store_saved():
+            text_store = PapersTextStore()
+            if text_store.dataset == self.current_dataset:
+                self.text_store = text_store
 
     def _create_papers_index(self):
         """
@@ -90,6 +144,105 @@ class Papers:
         papers_index = dict(papers_index) 
         return papers_index
 
+    def _update_papers_index(self, index_info):
+        """
+        Update the saved papers' index to the current dataset, comparing the
+        papers in its metadata.csv with the papers in the index by their
+        'cord_uid' and the hash of their content. The papers added, changed or
+        removed are saved, so the other stages of the project only need to
+        process those papers.
+        :param index_info: Dictionary with the dataset and the content hashes of
+        the papers in the saved index.
+        :return: Dictionary with the 'cord_uid' of the 'added', 'changed' and
+        'removed' papers.
+        """
+        # Create the index of the current dataset.
+        papers_index = self._create_papers_index()
+        new_hashes = {cord_uid: paper_hash(paper_dict)
+                      for cord_uid, paper_dict in papers_index.items()}
+        old_hashes = index_info['hashes']
+
+        # Compare the papers of both datasets.
+        papers_update = {
+            'from_dataset': index_info['dataset'],
+            'to_dataset': self.current_dataset,
+            'added': [cord_uid for cord_uid in new_hashes
+                      if cord_uid not in old_hashes],
+            'changed': [cord_uid for cord_uid, new_hash in new_hashes.items()
+                        if cord_uid in old_hashes
+                        and old_hashes[cord_uid] != new_hash],
+            'removed': [cord_uid for cord_uid in old_hashes
+                        if cord_uid not in new_hashes],
+        }
+
+        # Save the new index, the update, and the new hashes.
+        papers_index_path = join(self.data_folder, self.papers_index_file)
+        with open(papers_index_path, 'w') as file:
+            json.dump(papers_index, file)
+        papers_update_path = join(self.data_folder, self.papers_update_file)
+        with open(papers_update_path, 'w') as file:
+            json.dump(papers_update, file)
+        self._save_index_info(papers_index, new_hashes)
+
+        # The compact index belongs to the previous dataset.
+        compact_index_path = join(self.data_folder, self.compact_index_file)
+        if isfile(compact_index_path):
+            remove(compact_index_path)
+
+        return papers_update
+
+    def _load_index_info(self):
+        """
+        Load the dataset and the content hashes of the papers in the saved
+        index. If the information is not available (the index was created by a
+        previous version of the class), assume the index belongs to the current
+        dataset and create it.
+        :return: Dictionary with the 'dataset' and the 'hashes' of the papers.
+        """
+        index_info_path = join(self.data_folder, self.index_info_file)
+        if isfile(index_info_path):
+            with open(index_info_path, 'r') as file:
+                return json.load(file)
+
+        # Create the information from the saved index.
+        papers_index_path = join(self.data_folder, self.papers_index_file)
+        with open(papers_index_path, 'r') as file:
+            papers_index = json.load(file)
+        return self._save_index_info(papers_index)
+
+    def _save_index_info(self, papers_index, papers_hashes=None):
+        """
+        Save the dataset of the papers' index and the hash of the content of
+        each of the papers, to compare them with future CORD-19 releases.
+        :param papers_index: Dictionary with the information of the papers.
+        :param papers_hashes: Dictionary with the hashes of the papers, if they
+        were already calculated.
+        :return: Dictionary with the 'dataset' and the 'hashes' of the papers.
+        """
+        if papers_hashes is None:
+            papers_hashes = {cord_uid: paper_hash(paper_dict)
+                             for cord_uid, paper_dict in papers_index.items()}
+        index_info = {'dataset': self.current_dataset, 'hashes': papers_hashes}
+        index_info_path = join(self.data_folder, self.index_info_file)
+        with open(index_info_path, 'w') as file:
+            json.dump(index_info, file)
+        return index_info
+
+    @classmethod
+    def load_last_update(cls):
+        """
+        Load the changes made to the papers' index by its last update to a new
+        CORD-19 release.
+        :return: Dictionary with the 'from_dataset' and 'to_dataset' of the
+        update, and the 'cord_uid' of the 'added', 'changed' and 'removed'
+        papers. None if the index was never updated.
+        """
+        papers_update_path = join(cls.data_folder, cls.papers_update_file)
+        if not isfile(papers_update_path):
+            return None
+        with open(papers_update_path, 'r') as file:
+            return json.load(file)
+
     def paper_title_abstract(self, cord_uid):
         """
         Find the title and abstract of the CORD-19 paper specified by the
@@ -110,6 +263,19 @@ class Papers:
         :return: A string with the content of the paper, excluding the title and
         abstract.
         """
+        # Get the content from the text store, if the paper was extracted.
+        if self.text_store and cord_uid in self.text_store:
+            return self.text_store.paper_content(cord_uid)
+        # Parse the JSON files of the paper.
+        return read_paper_content(self.paper_json_paths(cord_uid))
+
+    def paper_json_paths(self, cord_uid):
+        """
+        Get the paths of the JSON files with the content of the 'cord_uid'
+        paper, starting with the 'pmc_json_files'.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: A list with the paths of the documents of the paper.
+        """
         # Get the dictionary with the info of the paper
         paper_dict = self.papers_index[cord_uid]
         # Get the paths for the documents of the paper
@@ -119,34 +285,10 @@ class Papers:
         if 'pdf_json_files' in paper_dict:
             doc_json_files += paper_dict['pdf_json_files']
 
-        # Where we are going to store the text of the paper.
-        body_text = ''
-        # Access the files and extract the text.
-        for doc_json_file in doc_json_files:
-            doc_json_path = join(self.cord19_data_folder, self.current_dataset, doc_json_file)
-            with open(doc_json_path, 'r') as f_json:
-                # Get the dictionary containing all the info of the document.
-                full_text_dict = json.load(f_json)
-
-                # Get all the sections in the body of the document.
-                last_section = ''
-                for paragraph_dict in full_text_dict['body_text']:
-                    section_name = paragraph_dict['section']
-                    paragraph_text = paragraph_dict['text']
-                    # Check if we are still on the same section, or a new one.
-                    if section_name == last_section:
-                        body_text += paragraph_text + '\n\n'
-                    else:
-                        body_text += '<< ' + section_name + ' >>\n' + paragraph_text + '\n\n'
-                    # Save the section name for the next iteration.
-                    last_section = section_name
-
-                # If we find text in one of the documents, break, to avoid
-                # repeating content.
-                if body_text:
-                    break
-        # Return the found content.
-        return body_text
+        # Create the full paths of the documents.
+        doc_json_paths = [join(self.cord19_data_folder, self.current_dataset, doc_json_file)
+                          for doc_json_file in doc_json_files]
+        return doc_json_paths
 
     def paper_full_text(self, cord_uid):
         """
@@ -159,6 +301,83 @@ class Papers:
         full_text = self.paper_title_abstract(cord_uid) + '\n\n' + self.paper_content(cord_uid)
         return full_text
 
+    def paper_full_text_size(self, cord_uid):
+        """
+        Get the number of characters in the full text of the paper 'cord_uid',
+        without creating the full text.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: An int with the size of the full text of the paper.
+        """
+        # Size of the title & abstract, and the separation with the content.
+        title_abstract_size = len(self.paper_title_abstract(cord_uid)) + 2
+        # Get the size of the content from the text store, if available.
+        if self.text_store and cord_uid in self.text_store:
+            return title_abstract_size + self.text_store.content_size(cord_uid)
+        return title_abstract_size + read_content_size(self.paper_json_paths(cord_uid))
+
+    def papers_full_text_sizes(self, cord_uids, n_workers=1, batch_size=100):
+        """
+        Create an iterator with the size of the full text of the papers in
+        'cord_uids', in the same order. When using more than one worker, the
+        papers are sent to a pool of processes in batches, and the workers only
+        return the 'cord_uid' and size of each paper.
+        :param cord_uids: An iterable with the Unique Identifiers of the papers.
+        :param n_workers: The number of processes used to measure the papers.
+        :param batch_size: The number of papers sent to a worker at a time.
+        :return: An iterator of tuples with the 'cord_uid' and the size of the
+        full text of each paper.
+        """
+        # Measure the papers one at a time.
+        if n_workers <= 1 or self.text_store:
+            for cord_uid in cord_uids:
+                yield cord_uid, self.paper_full_text_size(cord_uid)
+        # Use the worker processes.
+        else:
+            batches = self._papers_batches(cord_uids, batch_size)
+            for batch_sizes in ordered_parallel_map(_full_text_sizes, batches,
+                                                    n_workers):
+                yield from batch_sizes
+
+    def papers_full_text_stats(self, cord_uids, n_workers=1, batch_size=100):
+        """
+        Create an iterator with the statistics of the full text of the papers in
+        'cord_uids', in the same order: the number of characters, paragraphs,
+        sections and an estimate of the number of tokens (the words separated by
+        spaces). The JSON files of the papers are parsed, but their full text is
+        never created.
+        :param cord_uids: An iterable with the Unique Identifiers of the papers.
+        :param n_workers: The number of processes used to measure the papers.
+        :param batch_size: The number of papers sent to a worker at a time.
+        :return: An iterator of tuples with the 'cord_uid', characters,
+        paragraphs, sections and tokens of each paper.
+        """
+        batches = self._papers_batches(cord_uids, batch_size)
+        if n_workers <= 1:
+            batches_stats = map(_full_text_stats, batches)
+        else:
+            batches_stats = ordered_parallel_map(_full_text_stats, batches,
+                                                 n_workers)
+        for batch_stats in batches_stats:
+            yield from batch_stats
+
+    def _papers_batches(self, cord_uids, batch_size):
+        """
+        Group the information the workers need to measure the papers in batches.
+        :param cord_uids: An iterable with the Unique Identifiers of the papers.
+        :param batch_size: The number of papers in each batch.
+        :return: An iterator of lists with the 'cord_uid', the title & abstract,
+        and the paths of the JSON files of each paper.
+        """
+        batch = []
+        for cord_uid in cord_uids:
+            batch.append((cord_uid, self.paper_title_abstract(cord_uid),
+                          self.paper_json_paths(cord_uid)))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
     def all_papers_title_abstract(self):
         """
         Create an iterator of strings containing the title and abstract of all
@@ -174,17 +393,381 @@ class Papers:
         the CORD-19 dataset.
         :return: An iterator of strings.
         """
-        for cord_uid in self.papers_index:
-            yield self.paper_content(cord_uid)
+        return self.papers_content(self.papers_index)
+
+    def papers_content(self, cord_uids, read_ahead=None, read_ahead_threads=4):
+        """
+        Create an iterator containing the body text of the papers in
+        'cord_uids', in the same order.
+        :param cord_uids: An iterable with the Unique Identifiers of the papers.
+        :param read_ahead: The number of papers whose JSON files are read in
+        background threads ahead of the consumer. If it's None, the value given
+        when the Papers were created is used.
+        :param read_ahead_threads: The number of threads reading the files.
+        :return: An iterator of strings.
+        """
+        for _, paper_content in self._uids_contents(cord_uids, read_ahead,
+                                                    read_ahead_threads):
+            yield paper_content
 
-    def all_papers_full_text(self):
+    def _uids_contents(self, cord_uids, read_ahead=None, read_ahead_threads=4):
+        """
+        Create an iterator with the 'cord_uid' and the body text of the papers
+        in 'cord_uids', reading their JSON files ahead of the consumer if
+        'read_ahead' is bigger than 0.
+        :return: An iterator of tuples with the 'cord_uid' and the content of
+        each paper.
+        """
+        if read_ahead is None:
+            read_ahead = self.read_ahead
+        # Read the files one at a time (or get the texts from the store).
+        if read_ahead <= 0 or self.text_store:
+            for cord_uid in cord_uids:
+                yield cord_uid, self.paper_content(cord_uid)
+            return
+
+        # Read the first JSON file of the papers in the background. (The other
+        # files are only needed when the first one has no content.)
+        first_paths = ((cord_uid, next(iter(self.paper_json_paths(cord_uid)), None))
+                       for cord_uid in cord_uids)
+        for cord_uid, first_json in read_files_ahead(first_paths, read_ahead,
+                                                     read_ahead_threads):
+            paper_content = read_paper_content(self.paper_json_paths(cord_uid),
+                                               first_json)
+            yield cord_uid, paper_content
+
+    def all_papers_full_text(self, n_workers=1, max_in_flight=None):
         """
         Create an iterator containing the full text for each of the papers in
         the CORD-19 dataset.
+        :param n_workers: The number of processes used to extract the text of
+        the papers. If it's 1, the papers are extracted in this process.
+        :param max_in_flight: The maximum number of papers being extracted by
+        the workers ahead of the consumer of the iterator.
         :return: An iterator of strings.
         """
-        for cord_uid in self.papers_index:
-            yield self.paper_full_text(cord_uid)
+        return self.papers_full_text(self.papers_index, n_workers, max_in_flight)
+
+    def papers_full_text(self, cord_uids, n_workers=1, max_in_flight=None,
+                         read_ahead=None, read_ahead_threads=4):
+        """
+        Create an iterator containing the full text of the papers in 'cord_uids',
+        in the same order. When using more than one worker, the JSON files of
+        the papers are parsed in parallel by a pool of processes, with at most
+        'max_in_flight' papers extracted ahead of the consumer.
+        :param cord_uids: An iterable with the Unique Identifiers of the papers.
+        :param n_workers: The number of processes used to extract the text of
+        the papers. If it's 1, the papers are extracted in this process.
+        :param max_in_flight: The maximum number of papers being extracted by
+        the workers ahead of the consumer of the iterator.
+        :param read_ahead: The number of papers whose JSON files are read in
+        background threads ahead of the consumer, when the papers are extracted
+        in this process. If it's None, the value given when the Papers were
+        created is used.
+        :param read_ahead_threads: The number of threads reading the files.
+        :return: An iterator of strings.
+        """
+        # Extract the papers one at a time. (No need for workers if the texts
+        # are in the store).
+        if n_workers <= 1 or self.text_store:
+            papers_contents = self._uids_contents(cord_uids, read_ahead,
+                                                  read_ahead_threads)
+            for cord_uid, paper_content in papers_contents:
+                yield self.paper_title_abstract(cord_uid) + '\n\n' + paper_content
+        # Use the worker processes.
+        else:
+            # Only send to the workers the information they need.
+            papers_info = ((self.paper_title_abstract(cord_uid),
+                            self.paper_json_paths(cord_uid))
+                           for cord_uid in cord_uids)
+            yield from ordered_parallel_map(_extract_full_text, papers_info,
+                                            n_workers, max_in_flight)
+
+    def create_text_store(self, n_shards=16, n_workers=1, show_progress=False):
+        """
+        Extract the content of all the papers in the dataset from their JSON
+        files and save them compressed in a PapersTextStore, so the papers are
+        only parsed once. After this, 'paper_content' reads the texts from the
+        store.
+        :param n_shards: The number of files used to save the texts.
+        :param n_workers: The number of processes used to extract and compress
+        the texts.
+        :param show_progress: Bool representing whether we show the progress of
+        the function or not.
+        """
+        # Parse the JSON files, not the previous store.
+        self.text_store = None
+        cord_uids = list(self.papers_index)
+        # Save the texts in the store.
+        papers_texts = self._compressed_contents(cord_uids, n_workers, show_progress)
+        self.text_store = PapersTextStore.create(self.current_dataset, papers_texts,
+                                                 len(cord_uids), n_shards)
+
+    def update_text_store(self, n_workers=1, show_progress=False):
+        """
+        Bring the text store to the current dataset, extracting only the papers
+        added or changed by the last update of the papers' index. If the store
+        doesn't belong to the dataset before the update, it is created again.
+        :param n_workers: The number of processes used to extract and compress
+        the texts.
+        :param show_progress: Bool representing whether we show the progress of
+        the function or not.
+        """
+        # Check if the store is already up-to-date.
+        if self.text_store:
+            return
+        # Check if the store can be updated.
+        papers_update = self.last_update
+        if (not PapersTextStore.is_store_saved() or not papers_update
+                or papers_update['to_dataset'] != self.current_dataset
+                or PapersTextStore().dataset != papers_update['from_dataset']):
+            self.create_text_store(n_workers=n_workers, show_progress=show_progress)
+            return
+
+        # Add the texts of the new and changed papers to the store.
+        cord_uids = papers_update['added'] + papers_update['changed']
+        papers_texts = self._compressed_contents(cord_uids, n_workers, show_progress)
+        self.text_store = PapersTextStore.update(self.current_dataset, papers_texts,
+                                                 papers_update['removed'])
+
+    def _compressed_contents(self, cord_uids, n_workers=1, show_progress=False):
+        """
+        Extract and compress the content of the papers in 'cord_uids' from
+        their JSON files, in the same order, to save them in the text store.
+        :param cord_uids: A list with the Unique Identifiers of the papers.
+        :param n_workers: The number of processes used to extract and compress
+        the texts.
+        :param show_progress: Bool representing whether we show the progress of
+        the function or not.
+        :return: A lazy sequence of tuples with the 'cord_uid', the compressed
+        content and the size of the content of each paper.
+        """
+        total = len(cord_uids)
+        papers_paths = (self.paper_json_paths(cord_uid) for cord_uid in cord_uids)
+        if n_workers <= 1:
+            compressed_contents = map(_compress_paper_content, papers_paths)
+        else:
+            compressed_contents = ordered_parallel_map(_compress_paper_content,
+                                                       papers_paths, n_workers)
+        # Add the 'cord_uid' of the papers, and show the progress.
+        for count, compressed_info in enumerate(compressed_contents, 1):
+            yield (cord_uids[count - 1],) + compressed_info
+            if show_progress:
+                progress_bar(count, total)
+
+
+def paper_hash(paper_dict):
+    """
+    Create a hash of the information of a paper, to detect when it changes
+    between CORD-19 releases.
+    :param paper_dict: Dictionary with the information of the paper.
+    :return: A string with the hexadecimal hash of the paper.
+    """
+    paper_bytes = json.dumps(paper_dict, sort_keys=True).encode('utf-8')
+    return blake2b(paper_bytes, digest_size=8).hexdigest()
+
+
+def paper_shard(cord_uid, shard_count):
+    """
+    Find the shard of a paper using a stable hash of its 'cord_uid', so the
+    paper goes to the same shard in every machine and every run.
+    :param cord_uid: The Unique Identifier of the CORD-19 paper.
+    :param shard_count: The number of shards.
+    :return: An int with the shard of the paper, from 0 to 'shard_count' - 1.
+    """
+    uid_hash = blake2b(cord_uid.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(uid_hash, 'little') % shard_count
+
+
+def shard_papers(cord_uids, shard_index=0, shard_count=1):
+    """
+    Keep only the papers that belong to the given shard, in the same order.
+    :param cord_uids: A list with the 'cord_uid' of the papers.
+    :param shard_index: The shard of the papers, from 0 to 'shard_count' - 1.
+    :param shard_count: The number of shards the papers are split into.
+    :return: A list with the 'cord_uid' of the papers in the shard.
+    """
+    if not 0 <= shard_index < shard_count:
+        raise Exception(f"The shard {shard_index} is not between 0 and {shard_count - 1}.")
+    if shard_count == 1:
+        return list(cord_uids)
+    return [cord_uid for cord_uid in cord_uids
+            if paper_shard(cord_uid, shard_count) == shard_index]
+
+
+def read_paper_content(doc_json_paths, first_json=None):
+    """
+    Extract the body text of a paper from the first of its JSON files that has
+    content, marking the start of each section with '<< section >>'.
+    :param doc_json_paths: A list with the paths of the JSON files of the paper.
+    :param first_json: The bytes of the first JSON file, if they were already
+    read (e.g. by the read-ahead threads).
+    :return: A string with the content of the paper.
+    """
+    # Where we are going to store the text of the paper.
+    body_text = ''
+    # Access the files and extract the text.
+    for i, doc_json_path in enumerate(doc_json_paths):
+        # Use the file already read.
+        if i == 0 and first_json is not None:
+            json_text = first_json.decode('utf-8')
+        else:
+            with open(doc_json_path, 'r') as f_json:
+                json_text = f_json.read()
+        # Get only the paragraphs in the body of the document.
+        paragraphs = load_body_text(json_text)
+        # Join the paragraphs of the document.
+        body_text = join_body_text(paragraphs)
+
+        # If we find text in one of the documents, break, to avoid repeating
+        # content.
+        if body_text:
+            break
+    # Return the found content.
+    return body_text
+
+
+def read_content_size(doc_json_paths):
+    """
+    Get the size of the content read_paper_content() would extract from the
+    JSON files of a paper, adding the size of the paragraphs and section names
+    without joining them.
+    :param doc_json_paths: A list with the paths of the JSON files of the paper.
+    :return: An int with the size of the content of the paper.
+    """
+    return read_content_stats(doc_json_paths, count_words=False)[0]
+
+
+def read_content_stats(doc_json_paths, count_words=True):
+    """
+    Get the statistics of the content read_paper_content() would extract from
+    the JSON files of a paper, without joining the paragraphs.
+    :param doc_json_paths: A list with the paths of the JSON files of the paper.
+    :param count_words: Bool to determine if we count the words (separated by
+    spaces) of the content, or leave them as 0.
+    :return: Tuple with the number of characters, paragraphs, sections and words
+    in the content of the paper.
+    """
+    for doc_json_path in doc_json_paths:
+        with open(doc_json_path, 'r') as f_json:
+            paragraphs = load_body_text(f_json.read())
+        content_size = 0
+        sections = 0
+        words = 0
+        last_section = ''
+        for paragraph_dict in paragraphs:
+            section_name = paragraph_dict['section']
+            paragraph_text = paragraph_dict['text']
+            # The section mark: '<< ' + section_name + ' >>\n'
+            if section_name != last_section:
+                content_size += len(section_name) + 7
+                sections += 1
+                if count_words:
+                    words += len(section_name.split()) + 2
+            # The paragraph and the '\n\n' after it.
+            content_size += len(paragraph_text) + 2
+            if count_words:
+                words += len(paragraph_text.split())
+            last_section = section_name
+        # Stop at the first document with content.
+        if content_size:
+            return content_size, len(paragraphs), sections, words
+    return 0, 0, 0, 0
+
+
+def load_body_text(json_text):
+    """
+    Decode only the 'body_text' array of a CORD-19 JSON document, skipping the
+    metadata, abstract, bibliography and references of the paper. If the array
+    can't be located in the text, the whole document is decoded.
+    :param json_text: The string with the content of the JSON file.
+    :return: A list with the dictionaries of the paragraphs of the document.
+    """
+    # Find the 'body_text' key. A quote inside a JSON string is always escaped,
+    # so the match can't be part of the text of the paper.
+    key_match = _body_text_key.search(json_text)
+    if key_match:
+        try:
+            paragraphs, _ = _json_decoder.raw_decode(json_text, key_match.end())
+            if isinstance(paragraphs, list):
+                return paragraphs
+        except ValueError:
+            pass
+    # Decode the whole document.
+    return json.loads(json_text)['body_text']
+
+
+def join_body_text(paragraphs):
+    """
+    Create the body text of a document, adding the name of the section before
+    the first paragraph of each section. All the pieces are joined at the end,
+    in linear time.
+    :param paragraphs: A list with the dictionaries of the paragraphs.
+    :return: A string with the body text of the document.
+    """
+    text_parts = []
+    last_section = ''
+    for paragraph_dict in paragraphs:
+        section_name = paragraph_dict['section']
+        # Check if we are starting a new section.
+        if section_name != last_section:
+            text_parts.append('<< ' + section_name + ' >>\n')
+        text_parts.append(paragraph_dict['text'])
+        text_parts.append('\n\n')
+        # Save the section name for the next iteration.
+        last_section = section_name
+    return ''.join(text_parts)
+
+
+def _extract_full_text(paper_info):
+    """
+    Create the full text of a paper inside a worker process.
+    :param paper_info: Tuple with the title & abstract of the paper, and the
+    paths of its JSON files.
+    :return: A string containing the title, abstract and body text of the
+    paper.
+    """
+    title_abstract, doc_json_paths = paper_info
+    return title_abstract + '\n\n' + read_paper_content(doc_json_paths)
+
+
+def _full_text_sizes(papers_batch):
+    """
+    Measure the full text of a batch of papers inside a worker process.
+    :param papers_batch: A list of tuples with the 'cord_uid', the title &
+    abstract, and the paths of the JSON files of each paper.
+    :return: A list of tuples with the 'cord_uid' and the size of the full text
+    of each paper.
+    """
+    return [(cord_uid, len(title_abstract) + 2 + read_content_size(doc_json_paths))
+            for cord_uid, title_abstract, doc_json_paths in papers_batch]
+
+
+def _full_text_stats(papers_batch):
+    """
+    Get the statistics of the full text of a batch of papers inside a worker
+    process.
+    :param papers_batch: A list of tuples with the 'cord_uid', the title &
+    abstract, and the paths of the JSON files of each paper.
+    :return: A list of tuples with the 'cord_uid', characters, paragraphs,
+    sections and words of each paper.
+    """
+    batch_stats = []
+    for cord_uid, title_abstract, doc_json_paths in papers_batch:
+        content_size, paragraphs, sections, words = read_content_stats(doc_json_paths)
+        batch_stats.append((cord_uid, len(title_abstract) + 2 + content_size,
+                            paragraphs, sections,
+                            len(title_abstract.split()) + words))
+    return batch_stats
+
+
+def _compress_paper_content(doc_json_paths):
+    """
+    Extract and compress the content of a paper, to save it in the text store.
+    :param doc_json_paths: A list with the paths of the JSON files of the paper.
+    :return: Tuple with the compressed content and the size of the content.
+    """
+    return compress_content(read_paper_content(doc_json_paths))
 
 
 # Testing the Papers class
@@ -202,6 +785,14 @@ if __name__ == '__main__':
     num_papers = len(cord19_papers.papers_index)
     print(f"\nThe current CORD-19 dataset has {num_papers} documents.")
 
+    # Report the changes of the last update of the index.
+    last_update = cord19_papers.last_update
+    if last_update:
+        print(f"\nLast update: {last_update['from_dataset']} -> {last_update['to_dataset']}")
+        print(f"Papers added: {len(last_update['added'])}")
+        print(f"Papers changed: {len(last_update['changed'])}")
+        print(f"Papers removed: {len(last_update['removed'])}")
+
     # Get the 'cord_uid' of one of the papers.
     cord19_uids = list(cord19_papers.papers_index.keys())
     rand_i = randint(0, num_papers - 1)
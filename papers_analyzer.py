@@ -3,10 +3,11 @@
 import json
 from os import mkdir
 from os.path import join, isfile, isdir
-from random import sample
 
-from papers import Papers
-from extra_funcs import progress_bar, big_number
+from papers import Papers, read_paper_content, shard_papers
+from papers_stats import PapersStats
+from extra_funcs import progress_bar, big_number, seeded_random
+from extra_funcs import reservoir_sample, selection_sample
 from time_keeper import TimeKeeper
 
 
@@ -20,10 +21,25 @@ class PapersAnalyzer:
     small_papers_index = 'small_papers_index.json'
     medium_papers_index = 'medium_papers_index.json'
     big_papers_index = 'big_papers_index.json'
+    indexes_info_file = 'sized_indexes_info.json'
 
-    def __init__(self, show_progress=False):
+    def __init__(self, show_progress=False, compact_index=False, n_workers=1,
+                 read_ahead=0):
+        """
+        Load the indexes of the small, medium and big papers of the CORD-19
+        dataset, or create them if they weren't saved before.
+        :param show_progress: Bool representing whether we show the progress of
+        the function or not.
+        :param compact_index: Bool to determine if the papers' index is loaded
+        using its compact memory-mapped format.
+        :param n_workers: The number of processes used to measure the size of
+        the papers when the indexes are created.
+        :param read_ahead: The number of papers whose JSON files are read in
+        background threads ahead of the consumer of the content iterators.
+        """
         # Get the CORD-19 papers.
-        self.cord19_papers = Papers()
+        self.cord19_papers = Papers(compact_index=compact_index,
+                                    read_ahead=read_ahead)
         
         # ...no need to check for the data folder, because Papers() will create
         # one if it doesn't exist.
@@ -33,6 +49,10 @@ class PapersAnalyzer:
         medium_papers_path = join(self.data_folder, self.medium_papers_index)
         big_papers_path = join(self.data_folder, self.big_papers_index)
         
+        # Load the size thresholds used by the saved indexes (or the default
+        # ones if the indexes weren't created yet).
+        self.small_max, self.medium_max = self._indexes_thresholds()
+
         # Check if the indexes for the small, medium, big papers were already
         # created.
         if (isfile(small_papers_path) and isfile(medium_papers_path)
@@ -44,57 +64,154 @@ class PapersAnalyzer:
                 self.medium_papers = json.load(file)
             with open(big_papers_path, 'r') as file:
                 self.big_papers = json.load(file)
+
+            # Check if the indexes belong to the current CORD-19 dataset.
+            current_dataset = self.cord19_papers.current_dataset
+            indexes_dataset = self._indexes_dataset()
+            if indexes_dataset != current_dataset:
+                # Only classify the papers that changed, if the papers' index
+                # was updated from the dataset of our indexes.
+                papers_update = self.cord19_papers.last_update
+                if (papers_update and papers_update['from_dataset'] == indexes_dataset
+                        and papers_update['to_dataset'] == current_dataset):
+                    self._update_indexes(papers_update, show_progress, n_workers)
+                else:
+                    indexes = self._organize_papers(show_progress=show_progress,
+                                                    n_workers=n_workers)
+                    self.small_papers, self.medium_papers, self.big_papers = indexes
+                # Save the new indexes.
+                self._save_indexes()
             # Show progress if required.
-            if show_progress:
+            elif show_progress:
                 total = len(self.cord19_papers.papers_index)
                 progress_bar(total, total)
         else:
             # Create the indexes.
-            indexes = self._organize_papers(show_progress)
+            indexes = self._organize_papers(show_progress=show_progress,
+                                            n_workers=n_workers)
             # Get the Papers Indexes.
             self.small_papers = indexes[0]
             self.medium_papers = indexes[1]
             self.big_papers = indexes[2]
             # Save them to their files.
-            with open(small_papers_path, 'w') as file:
-                json.dump(self.small_papers, file)
-            with open(medium_papers_path, 'w') as file:
-                json.dump(self.medium_papers, file)
-            with open(big_papers_path, 'w') as file:
-                json.dump(self.big_papers, file)
+            self._save_indexes()
 
-    def _organize_papers(self, show_progress=False):
+    def _save_indexes(self):
         """
-        Scan the papers inside the CORD-19 database and creates 3 different
-        indexes for them depending on their size:
-        - Small: For papers containing one paragraph or less (0-300 characters).
-        - Medium: For papers containing one page or less (301-3,000).
-        - Big: For papers containing more than one page (3,001 or more).
+        Save the small, medium and big papers' indexes, the dataset they belong
+        to, and the size thresholds used to classify the papers.
+        """
+        small_papers_path = join(self.data_folder, self.small_papers_index)
+        medium_papers_path = join(self.data_folder, self.medium_papers_index)
+        big_papers_path = join(self.data_folder, self.big_papers_index)
+        with open(small_papers_path, 'w') as file:
+            json.dump(self.small_papers, file)
+        with open(medium_papers_path, 'w') as file:
+            json.dump(self.medium_papers, file)
+        with open(big_papers_path, 'w') as file:
+            json.dump(self.big_papers, file)
+        # Save the dataset and the size thresholds of the indexes.
+        indexes_info = {'dataset': self.cord19_papers.current_dataset,
+                        'small_max': self.small_max,
+                        'medium_max': self.medium_max}
+        indexes_info_path = join(self.data_folder, self.indexes_info_file)
+        with open(indexes_info_path, 'w') as file:
+            json.dump(indexes_info, file)
+
+    def _indexes_dataset(self):
+        """
+        Get the name of the CORD-19 dataset used to create the saved indexes. If
+        the indexes were created by a previous version of the class, assume they
+        belong to the current dataset.
+        :return: A string with the name of the dataset.
+        """
+        indexes_info_path = join(self.data_folder, self.indexes_info_file)
+        if not isfile(indexes_info_path):
+            return self.cord19_papers.current_dataset
+        with open(indexes_info_path, 'r') as file:
+            return json.load(file)['dataset']
 
+    def _indexes_thresholds(self):
+        """
+        Get the size thresholds used to classify the papers of the saved indexes.
+        If the indexes were created by a previous version of the class, or they
+        weren't created yet, use the default thresholds (300 and 3,000).
+        :return: A tuple with the maximum number of characters of the small and
+        the medium papers.
+        """
+        indexes_info_path = join(self.data_folder, self.indexes_info_file)
+        if not isfile(indexes_info_path):
+            return 300, 3_000
+        with open(indexes_info_path, 'r') as file:
+            indexes_info = json.load(file)
+        return indexes_info.get('small_max', 300), indexes_info.get('medium_max', 3_000)
+
+    def _update_indexes(self, papers_update, show_progress=False, n_workers=1):
+        """
+        Update the small, medium and big papers' indexes with the papers added,
+        changed or removed in a new CORD-19 release, without classifying again
+        the rest of the papers.
+        :param papers_update: Dictionary with the 'cord_uid' of the 'added',
+        'changed' and 'removed' papers.
+        :param show_progress: Bool representing whether we show the progress of
+        the function or not.
+        :param n_workers: The number of processes used to measure the papers.
+        """
+        # Remove the papers that are no longer in the dataset, or that changed.
+        for cord_uid in papers_update['removed'] + papers_update['changed']:
+            self.small_papers.pop(cord_uid, None)
+            self.medium_papers.pop(cord_uid, None)
+            self.big_papers.pop(cord_uid, None)
+
+        # Classify the new and changed papers.
+        new_uids = papers_update['added'] + papers_update['changed']
+        indexes = self._organize_papers(new_uids, show_progress, n_workers)
+        self.small_papers.update(indexes[0])
+        self.medium_papers.update(indexes[1])
+        self.big_papers.update(indexes[2])
+
+    def _organize_papers(self, cord_uids=None, show_progress=False, n_workers=1):
+        """
+        Scan the papers inside the CORD-19 database and creates 3 different
+        indexes for them depending on their size, using the thresholds of the
+        indexes (by default 300 and 3,000 characters):
+        - Small: For papers containing one paragraph or less (0-small_max
+        characters).
+        - Medium: For papers containing one page or less (up to medium_max).
+        - Big: For papers containing more than one page (more than medium_max).
+
+        :param cord_uids: A list with the papers to classify. If it's None, all
+        the papers in the CORD-19 database are classified.
+        :param show_progress: Bool representing whether we show the progress of
+        the function or not.
+        :param n_workers: The number of processes used to measure the papers.
+        Only the 'cord_uid' and size of each paper is sent back by the workers.
         :return: A tuple containing 3 dictionaries with the small, medium, and
         big indexes.
         """
+        # Use all the papers, if no papers were given.
+        if cord_uids is None:
+            cord_uids = self.cord19_papers.papers_index
+
         # Create Papers Indexes
         small_papers = {}
         medium_papers = {}
         big_papers = {}
 
         # Variables to display the function's progress.
-        total = len(self.cord19_papers.papers_index)
+        total = len(cord_uids)
         count = 0
 
+        # Get the size of the papers, without creating their full text.
+        papers_sizes = self.cord19_papers.papers_full_text_sizes(cord_uids,
+                                                                 n_workers)
         # Iterate through the papers in the CORD-19 database.
-        for paper_cord_uid in self.cord19_papers.papers_index:
-            # Get the content of the paper.
-            paper_content = self.cord19_papers.paper_full_text(paper_cord_uid)
-            # Get the size of the paper.
-            paper_size = len(paper_content)
-
+        for paper_cord_uid, paper_size in papers_sizes:
             # Assign the paper to one of the indexes.
             paper_dict = {'cord_uid': paper_cord_uid, 'size': paper_size}
-            if paper_size <= 300:
+            if paper_size <= self.small_max:
                 small_papers[paper_cord_uid] = paper_dict
-            elif paper_size <= 3_000:
+            elif paper_size <= self.medium_max:
                 medium_papers[paper_cord_uid] = paper_dict
             else:
                 big_papers[paper_cord_uid] = paper_dict
@@ -107,96 +224,169 @@ class PapersAnalyzer:
         # Return the indexes.
         return small_papers, medium_papers, big_papers
 
-    def small_papers_content(self, n=-1, show_progress=False):
+    def rebin_papers(self, small_max=300, medium_max=3_000, papers_stats=None):
+        """
+        Classify the papers again in the small, medium and big indexes using
+        new size thresholds. The sizes are taken from the statistics of the
+        papers, so the papers are not read again.
+        :param small_max: The maximum number of characters of a small paper.
+        :param medium_max: The maximum number of characters of a medium paper.
+        :param papers_stats: The PapersStats of the current dataset. If it's
+        None, the statistics are loaded (or collected if they weren't saved).
+        """
+        if small_max > medium_max:
+            raise Exception("The size of the small papers can't be bigger than"
+                            " the size of the medium papers.")
+        if papers_stats is None:
+            papers_stats = PapersStats(self.cord19_papers)
+        small_uids, medium_uids, big_uids = papers_stats.size_buckets(
+            (small_max, medium_max))
+        sizes = dict(zip(papers_stats.cord_uids.tolist(),
+                         papers_stats.column('chars').tolist()))
+
+        # Create the new indexes.
+        self.small_papers = {cord_uid: {'cord_uid': cord_uid, 'size': sizes[cord_uid]}
+                             for cord_uid in small_uids}
+        self.medium_papers = {cord_uid: {'cord_uid': cord_uid, 'size': sizes[cord_uid]}
+                              for cord_uid in medium_uids}
+        self.big_papers = {cord_uid: {'cord_uid': cord_uid, 'size': sizes[cord_uid]}
+                           for cord_uid in big_uids}
+        # Save the new indexes with their thresholds, so the papers of the next
+        # updates are classified with them.
+        self.small_max, self.medium_max = small_max, medium_max
+        self._save_indexes()
+
+    def small_papers_content(self, n=-1, show_progress=False, n_workers=1,
+                             cord_uids=None, shard_index=0, shard_count=1,
+                             start=0):
         """
         Create a lazy sequence containing the texts of the first 'n' small
         papers in the corpus. If 'n' is -1, then return the content of all the
         small papers.
+        See _sized_papers_content() for the rest of the parameters.
         :param n: The amount of small papers to return.
         :param show_progress: Bool representing whether we show the progress of
         the function or not.
         :return: A lazy sequence of strings.
         """
-        return self._sized_papers_content('small', n, show_progress)
+        return self._sized_papers_content('small', n, show_progress, n_workers,
+                                          cord_uids, shard_index, shard_count,
+                                          start)
 
-    def medium_papers_content(self, n=-1, show_progress=False):
+    def medium_papers_content(self, n=-1, show_progress=False, n_workers=1,
+                              cord_uids=None, shard_index=0, shard_count=1,
+                              start=0):
         """
         Create a lazy sequence containing the texts of 'n' medium papers in the
         corpus. If 'n' is -1, return all the medium papers.
+        See _sized_papers_content() for the rest of the parameters.
         :param n: The amount of medium papers to return.
         :param show_progress: Bool representing whether we show the progress of
         the function or not.
         :return: A lazy sequence of strings.
         """
-        return self._sized_papers_content('medium', n, show_progress)
+        return self._sized_papers_content('medium', n, show_progress, n_workers,
+                                          cord_uids, shard_index, shard_count,
+                                          start)
 
-    def big_papers_content(self, n=-1, show_progress=False):
+    def big_papers_content(self, n=-1, show_progress=False, n_workers=1,
+                           cord_uids=None, shard_index=0, shard_count=1,
+                           start=0):
         """
         Create a lazy sequence containing the texts of 'n' big papers from the
         corpus. If 'n' is -1, then return all the big papers.
+        See _sized_papers_content() for the rest of the parameters.
         :param n: The amount of big papers to return.
         :param show_progress: Bool representing whether we show the progress of
         the function or not.
         :return: A lazy sequence of strings.
         """
-        return self._sized_papers_content('big', n, show_progress)
+        return self._sized_papers_content('big', n, show_progress, n_workers,
+                                          cord_uids, shard_index, shard_count,
+                                          start)
 
-    def random_small_papers(self, n=-1, show_progress=False):
+    def random_small_papers(self, n=-1, show_progress=False, n_workers=1,
+                            seed=None, shard_index=0, shard_count=1,
+                            start=0):
         """
         Create a random sequence with the text of 'n' small papers. If 'n' is -1,
         then return the content of all small papers in a random order.
+        See _random_papers_content() for the rest of the parameters.
         :param n: The amount of small papers to return.
         :param show_progress: Bool representing whether we show the progress of
         the function or not.
         :return: A lazy sequence of strings.
         """
-        return self._random_papers_content('small', n, show_progress)
+        return self._random_papers_content('small', n, show_progress, n_workers,
+                                           seed, shard_index, shard_count, start)
 
-    def random_medium_papers(self, n=-1, show_progress=False):
+    def random_medium_papers(self, n=-1, show_progress=False, n_workers=1,
+                             seed=None, shard_index=0, shard_count=1,
+                             start=0):
         """
         Create a random sequence with the text of 'n' medium papers. If 'n' is
         -1, then return the content of all medium papers in a random order.
+        See _random_papers_content() for the rest of the parameters.
         :param n: The amount of medium papers to return.
         :param show_progress: Bool representing whether we show the progress of
         the function or not.
         :return: A lazy sequence of strings.
         """
-        return self._random_papers_content('medium', n, show_progress)
+        return self._random_papers_content('medium', n, show_progress, n_workers,
+                                           seed, shard_index, shard_count, start)
 
-    def random_big_papers(self, n=-1, show_progress=False):
+    def random_big_papers(self, n=-1, show_progress=False, n_workers=1,
+                          seed=None, shard_index=0, shard_count=1,
+                          start=0):
         """
         Create a random sequence with the text of 'n' big papers. If 'n' is -1,
         then return the content of all big papers in a random order.
+        See _random_papers_content() for the rest of the parameters.
         :param n: The amount of big papers to return.
         :param show_progress: Bool representing whether we show the progress of
         the function or not.
         :return: A lazy sequence of strings.
         """
-        return self._random_papers_content('big', n, show_progress)
+        return self._random_papers_content('big', n, show_progress, n_workers,
+                                           seed, shard_index, shard_count, start)
 
-    def _sized_papers_content(self, papers_size, n=-1, show_progress=False):
+    def _sized_papers_content(self, papers_size, n=-1, show_progress=False,
+                               n_workers=1, cord_uids=None, shard_index=0,
+                               shard_count=1, start=0):
         """
         Create a lazy sequence containing the texts of the type of papers
         indicated by 'papers_size'. If 'n' is -1, then return the content of all
         the papers with that size.
         *** The papers are not selected randomly.
-        *** Papers with more than 1,000,000 characters are ignored (they have
-        conflicts with Spacy).
+        *** Papers with more than 1,000,000 characters are included, the
+        tokenizer processes long texts in chunks.
         :param papers_size: A string containing 'small', 'medium' or 'big'.
         :param n: The number of papers we need to return.
         :param show_progress: Bool representing whether we show the progress of
         the function or not.
+        :param n_workers: The number of processes used to extract the text of the
+        papers. The papers are still returned in the same order.
+        :param cord_uids: An iterable with the 'cord_uid' of the papers that can
+        be selected (e.g. the papers published in a year). If it's None, all
+        the papers of the given size can be selected.
+        :param shard_index: The shard of the papers to return, from 0 to
+        'shard_count' - 1. The first 'n' papers are selected before splitting
+        them in shards, so the shards together contain the same papers as the
+        unsharded sequence.
+        :param shard_count: The number of shards the papers are split into (e.g.
+        one for each machine processing the corpus).
+        :param start: The number of papers of the shard that are skipped
+        without reading them (e.g. the papers tokenized before a tokenization
+        was interrupted).
         :return: A lazy sequence of strings.
         """
         # Get index for the given size of papers.
-        if papers_size == 'small':
-            papers = list(self.small_papers)
-        elif papers_size == 'medium':
-            papers = list(self.medium_papers)
-        elif papers_size == 'big':
-            papers = list(self.big_papers)
-        else:
-            raise NameError("The type of papers is not specified.")
+        papers = list(self._size_index(papers_size))
+
+        # Only keep the selected papers, in the order of the index.
+        if cord_uids is not None:
+            selected_uids = set(cord_uids)
+            papers = [cord_uid for cord_uid in papers if cord_uid in selected_uids]
 
         # The number of papers to return.
         if n < 0:
@@ -204,126 +394,290 @@ class PapersAnalyzer:
         else:
             total = min(n, len(papers))
 
+        # Only keep the papers of the shard, after the skipped ones.
+        papers = shard_papers(papers[:total], shard_index, shard_count)[start:]
+        total = len(papers)
+
         # Progress iteration variable.
         count = 0
-        # Return the first 'total' papers from the given type.
-        for cord_uid in papers[:total]:
-            # Load the papers' content.
-            paper_content = self.cord19_papers.paper_full_text(cord_uid)
+        # Load the content of the first 'total' papers from the given type.
+        papers_content = self.cord19_papers.papers_full_text(papers, n_workers)
+        # Return the papers' content.
+        for paper_content in papers_content:
             yield paper_content
             # Display the progress of the function.
             if show_progress:
                 count += 1
                 progress_bar(count, total)
 
-    def _random_papers_content(self, papers_size, n=-1, show_progress=False):
+    def _random_papers_content(self, papers_size, n=-1, show_progress=False,
+                                n_workers=1, seed=None, shard_index=0,
+                                shard_count=1, start=0):
         """
         Create a sequence with the text of ramdom papers selected from the given
         paper size. If 'n' is -1, then we return all the available papers in a
         random order.
-        *** Papers with more than 1,000,000 characters are ignored (they have
-        conflicts with Spacy).
+        *** Papers with more than 1,000,000 characters are included, the
+        tokenizer processes long texts in chunks.
         :param papers_size: A string containing 'small', 'medium' or 'big'.
         :param n: The number of papers we need to return.
         :param show_progress: Bool representing whether we show the progress of
         the function or not.
+        :param n_workers: The number of processes used to extract the text of the
+        papers.
+        :param seed: The seed used to select and shuffle the papers. With the
+        same seed, the same papers are returned in the same order. If it's
+        None, the papers change every time.
+        :param shard_index: The shard of the papers to return, from 0 to
+        'shard_count' - 1. The papers are selected before splitting them in
+        shards, so the same seed has to be used in all the shards.
+        :param shard_count: The number of shards the papers are split into (e.g.
+        one for each machine processing the corpus).
+        :param start: The number of papers of the shard that are skipped
+        without reading them (e.g. the papers tokenized before a tokenization
+        was interrupted).
         :return: A lazy sequence of strings.
         """
-        # Get index for the given size of papers.
-        if papers_size == 'small':
-            papers = list(self.small_papers)
-        elif papers_size == 'medium':
-            papers = list(self.medium_papers)
-        elif papers_size == 'big':
-            papers = list(self.big_papers)
-        else:
-            raise NameError("The type of papers is not specified.")
-
-        # The number of papers to return.
-        if n < 0:
-            total = len(papers)
-        else:
-            total = min(n, len(papers))
-
+        # The shards need to split the same sample of papers.
+        if shard_count > 1 and seed is None:
+            raise Exception("A seed is needed to split random papers in shards.")
         # Get the papers in a random order.
-        random_papers = sample(papers, total)
-
+        random_papers = self.sample_papers(papers_size, n, seed)
+        rng = seeded_random(seed, papers_size + '-order')
+        rng.shuffle(random_papers)
+        random_papers = shard_papers(random_papers, shard_index, shard_count)
+        random_papers = random_papers[start:]
+        # Load the content of the papers.
+        return self.papers_content(random_papers, show_progress, n_workers)
+
+    def papers_content(self, cord_uids, show_progress=False, n_workers=1):
+        """
+        Create a lazy sequence with the texts of the given papers (e.g. a
+        sample of the papers), in the same order.
+        :param cord_uids: A list with the 'cord_uid' of the papers.
+        :param show_progress: Bool representing whether we show the progress of
+        the function or not.
+        :param n_workers: The number of processes used to extract the text of the
+        papers.
+        :return: A lazy sequence of strings.
+        """
         # Iteration progress variable.
+        total = len(cord_uids)
         count = 0
+        # Load the content of the papers.
+        papers_content = self.cord19_papers.papers_full_text(cord_uids,
+                                                             n_workers)
         # Iterate through the papers and return their content.
-        for cord_uid in random_papers:
-            # Load the papers' content.
-            paper_content = self.cord19_papers.paper_full_text(cord_uid)
+        for paper_content in papers_content:
             yield paper_content
             # Display the progress of the function.
             if show_progress:
                 count += 1
                 progress_bar(count, total)
 
+    def _size_index(self, papers_size):
+        """
+        Get the index of the papers with the given size.
+        :param papers_size: A string containing 'small', 'medium' or 'big'.
+        :return: The dictionary with the papers of that size.
+        """
+        if papers_size == 'small':
+            return self.small_papers
+        elif papers_size == 'medium':
+            return self.medium_papers
+        elif papers_size == 'big':
+            return self.big_papers
+        else:
+            raise NameError("The type of papers is not specified.")
+
+    def sample_papers(self, papers_size, n=-1, seed=None):
+        """
+        Select 'n' random papers of the given size using reservoir sampling, so
+        only the selected papers are kept in memory. With the same seed and the
+        same indexes, the same papers are selected.
+        :param papers_size: A string containing 'small', 'medium' or 'big'.
+        :param n: The number of papers to select. If it's -1, all the papers of
+        the given size are returned.
+        :param seed: An int or string with the seed of the selection.
+        :return: A list with the 'cord_uid' of the papers, in the order of the
+        index.
+        """
+        papers_index = self._size_index(papers_size)
+        if n < 0 or n >= len(papers_index):
+            return list(papers_index)
+        rng = seeded_random(seed, papers_size)
+        return reservoir_sample(papers_index, n, rng)
+
+    def stream_sample_papers(self, papers_size, n=-1, seed=None):
+        """
+        Create a lazy sequence with the 'cord_uid' of 'n' random papers of the
+        given size, deciding if each paper is selected while going through the
+        index. The selected papers are not kept in memory, so the sample can be
+        as big as the index.
+        :param papers_size: A string containing 'small', 'medium' or 'big'.
+        :param n: The number of papers to select. If it's -1, all the papers of
+        the given size are returned.
+        :param seed: An int or string with the seed of the selection.
+        :return: A lazy sequence with the 'cord_uid' of the papers, in the order
+        of the index.
+        """
+        papers_index = self._size_index(papers_size)
+        total = len(papers_index)
+        if n < 0:
+            n = total
+        rng = seeded_random(seed, papers_size)
+        return selection_sample(papers_index, total, n, rng)
+
+    def stratified_sample(self, n, seed=None, papers_sizes=('small', 'medium', 'big'),
+                          by_year=False):
+        """
+        Select 'n' random papers keeping the proportion of each size (and
+        publish year) they have in the corpus. Each group gets its share of the
+        sample (rounded using the largest remainders), and the papers of each
+        group are selected with reservoir sampling.
+        :param n: The number of papers to select.
+        :param seed: An int or string with the seed of the selection.
+        :param papers_sizes: The sizes of the papers that can be selected.
+        :param by_year: Bool to determine if the papers are also grouped by the
+        year they were published.
+        :return: A list with the 'cord_uid' of the selected papers, grouped by
+        size (and year), in the order of the indexes.
+        """
+        # Create the groups of papers.
+        groups = {}
+        for papers_size in papers_sizes:
+            papers_index = self._size_index(papers_size)
+            if not by_year:
+                groups[papers_size] = list(papers_index)
+                continue
+            papers_info = self.cord19_papers.papers_index
+            for cord_uid in papers_index:
+                year = papers_info[cord_uid]['publish_time'][:4] or 'unknown'
+                groups.setdefault(f'{papers_size}-{year}', []).append(cord_uid)
+
+        # Share the sample between the groups.
+        total = sum(len(group_uids) for group_uids in groups.values())
+        n = min(n, total)
+        if not total:
+            return []
+        shares = {name: len(group_uids) * n // total
+                  for name, group_uids in groups.items()}
+        remainders = sorted(groups, reverse=True,
+                            key=lambda name: (len(groups[name]) * n) % total)
+        for name in remainders[:n - sum(shares.values())]:
+            shares[name] += 1
+
+        # Select the papers of each group.
+        sample = []
+        for name, group_uids in groups.items():
+            rng = seeded_random(seed, name)
+            sample += reservoir_sample(group_uids, shares[name], rng)
+        return sample
+
 
 def papers_analysis():
     """
     Analyze the CORD-19 papers, and classify them by the amount of characters
-    they have.
+    they have, using the statistics saved by PapersStats.
     """
-    # Get the papers and the amount available in the current database.
-    the_papers = Papers()
-    total = len(the_papers.papers_index)
-    print(f"\nAmount of papers in CORD-19: {big_number(total)}.")
-
-    # Counters for the different size of the papers.
-    small = 0  # 0-300 characters (small paragraph)
-    medium = 0  # 301-3,000 characters (less than a page)
-    big = 0  # 3,001 - ... characters (bigger than a page)
-
-    # Iteration variables.
-    count = 0
-    # Iterate through the papers contents to see how many of each size we have.
-    print("\nAnalyzing the size of the papers...")
-    for paper_content in the_papers.all_papers_full_text():
-        # Update counter of papers viewed.
-        count += 1
-        # Print progress bar.
-        progress_bar(count, total)
-
-        # Check the size of the paper.
-        if len(paper_content) < 301:
-            small += 1
-        elif len(paper_content) < 3_001:
-            medium += 1
-        else:
-            big += 1
-    
-    print(f"\n\nPapers of one paragraph or less: {big_number(small)}.")
+    # Get the statistics of the papers (reading them only if they weren't
+    # collected before).
+    print("\nLoading the statistics of the papers...")
+    papers_stats = PapersStats(show_progress=True)
+    print(f"\n\nAmount of papers in CORD-19: {big_number(len(papers_stats))}.")
+
+    # Count the papers of each size:
+    # - 0-300 characters (small paragraph)
+    # - 301-3,000 characters (less than a page)
+    # - 3,001 - ... characters (bigger than a page)
+    small, medium, big = papers_stats.bucket_counts((300, 3_000))
+
+    print(f"\nPapers of one paragraph or less: {big_number(small)}.")
     print(f"\nPapers of one page or less: {big_number(medium)}.")
     print(f"\nPapers bigger than a page: {big_number(big)}.")
 
 
 def biggest_papers():
     """
-    Get how many papers are bigger than 1,000,000 characters.
+    Get how many papers are bigger than 1,000,000 characters (the maximum
+    length of a text in Spacy, the tokenizer processes them in chunks), using
+    the statistics saved by PapersStats.
+    """
+    # Get the statistics of the papers.
+    print("\nLoading the statistics of the papers...")
+    papers_stats = PapersStats(show_progress=True)
+    print(f"\n\nAmount of papers in CORD-19: {big_number(len(papers_stats))}.")
+
+    biggest = len(papers_stats.papers_over(1_000_000))
+    print(f"\nPapers with more than 1,000,000 characters: {big_number(biggest)}.\n")
+
+
+def content_extraction_benchmark(n=20):
+    """
+    Compare the time it takes to extract the content of the 'n' biggest papers
+    (the ones with more than 1,000,000 characters come first) decoding the
+    whole JSON documents and adding the paragraphs one by one, against
+    decoding only their 'body_text' and joining the paragraphs once.
+    :param n: The number of papers used in the benchmark.
+    """
+    # Get the biggest papers using the sizes saved in the index.
+    analyzer = PapersAnalyzer()
+    the_papers = analyzer.cord19_papers
+    biggest = sorted(analyzer.big_papers.values(),
+                     key=lambda paper_dict: paper_dict['size'], reverse=True)
+    biggest_uids = [paper_dict['cord_uid'] for paper_dict in biggest[:n]]
+    papers_paths = [the_papers.paper_json_paths(cord_uid)
+                    for cord_uid in biggest_uids]
+    print(f"\nExtracting the content of the {len(papers_paths)} biggest papers...")
+
+    # Load the files once, so both methods find them in the disk cache.
+    for doc_json_paths in papers_paths:
+        read_paper_content(doc_json_paths)
+
+    # Time the full decoding of the documents.
+    stopwatch = TimeKeeper()
+    full_contents = [_full_decode_content(doc_json_paths)
+                     for doc_json_paths in papers_paths]
+    full_time = stopwatch.total_runtime()
+
+    # Time the decoding of the 'body_text' only.
+    stopwatch.restart()
+    fast_contents = [read_paper_content(doc_json_paths)
+                     for doc_json_paths in papers_paths]
+    fast_time = stopwatch.total_runtime()
+
+    # Report the results.
+    print(f"Same content extracted: {full_contents == fast_contents}")
+    print(f"Full JSON decoding: {full_time:.3f} seconds.")
+    print(f"Body text decoding: {fast_time:.3f} seconds.")
+    if fast_time:
+        print(f"Speedup: {full_time / fast_time:.2f}x")
+
+
+def _full_decode_content(doc_json_paths):
+    """
+    Extract the content of a paper decoding all its JSON documents, and adding
+    the paragraphs one by one to the body text. Used as reference in the
+    content_extraction_benchmark().
+    :param doc_json_paths: A list with the paths of the JSON files of the paper.
+    :return: A string with the content of the paper.
     """
-    # Get the papers and the amount available in the current database.
-    the_papers = Papers()
-    total = len(the_papers.papers_index)
-    print(f"\nAmount of papers in CORD-19: {big_number(total)}.")
-
-    # Iteration variables.
-    biggest = 0
-    count = 0
-    # Iterate through the papers contents to see how many of each size we have.
-    print("\nAnalyzing the size of the papers...")
-    for paper_content in the_papers.all_papers_full_text():
-        # Update counter of papers viewed.
-        count += 1
-        # Print progress bar.
-        progress_bar(count, total)
-
-        # Check the size of the paper.
-        if len(paper_content) > 1_000_000:
-            biggest += 1
-
-    print(f"\n\nPapers with more than 1,000,000 characters: {big_number(biggest)}.\n")
+    body_text = ''
+    for doc_json_path in doc_json_paths:
+        with open(doc_json_path, 'r') as f_json:
+            full_text_dict = json.load(f_json)
+            last_section = ''
+            for paragraph_dict in full_text_dict['body_text']:
+                section_name = paragraph_dict['section']
+                paragraph_text = paragraph_dict['text']
+                if section_name == last_section:
+                    body_text += paragraph_text + '\n\n'
+                else:
+                    body_text += '<< ' + section_name + ' >>\n' + paragraph_text + '\n\n'
+                last_section = section_name
+            if body_text:
+                break
+    return body_text
 
 
 # Test and check the sizes of the papers in CORD-19.
@@ -0,0 +1,228 @@
+# Gelin Eguinosa Rosique
+
+import numpy as np
+from os import replace
+from os.path import join, isfile
+
+from papers import Papers
+from extra_funcs import progress_bar, big_number
+from time_keeper import TimeKeeper
+
+
+class PapersStats:
+    """
+    Columnar store with the statistics of the full text of the CORD-19 papers:
+    the number of characters, paragraphs, sections and (estimated) tokens of
+    each paper. The statistics are collected with one pass through the corpus,
+    and after that the histograms, size buckets and size queries are computed
+    over the saved columns without reading the papers again.
+    """
+    # Class Data Locations
+    data_folder = 'project_data'
+    stats_file = 'papers_stats.npz'
+
+    # The statistics saved for each paper.
+    columns = ('chars', 'paragraphs', 'sections', 'tokens')
+
+    def __init__(self, cord19_papers=None, show_progress=False, n_workers=1):
+        """
+        Load the saved statistics of the papers, or collect them if they don't
+        exist or belong to a different dataset.
+        :param cord19_papers: The Papers of the CORD-19 dataset. If it's None, a
+        new instance of Papers is created.
+        :param show_progress: Bool representing whether we show the progress of
+        the function or not.
+        :param n_workers: The number of processes used to read the papers.
+        """
+        # Get the CORD-19 papers.
+        if cord19_papers is None:
+            cord19_papers = Papers()
+        current_dataset = cord19_papers.current_dataset
+
+        # Load the statistics if they were saved.
+        stats_path = join(self.data_folder, self.stats_file)
+        stats_dataset = None
+        if isfile(stats_path):
+            with np.load(stats_path, allow_pickle=False) as stats_data:
+                stats_dataset = str(stats_data['dataset'])
+                self.cord_uids = stats_data['cord_uids']
+                self.stats = {column: stats_data[column]
+                              for column in self.columns}
+
+        # Collect the statistics if they are missing or outdated.
+        if stats_dataset != current_dataset:
+            papers_update = cord19_papers.last_update
+            if (stats_dataset and papers_update
+                    and papers_update['from_dataset'] == stats_dataset
+                    and papers_update['to_dataset'] == current_dataset):
+                # Only read the papers that changed in the new release.
+                self._update_stats(cord19_papers, papers_update, show_progress,
+                                   n_workers)
+            else:
+                self.cord_uids, self.stats = self._collect_stats(
+                    cord19_papers, cord19_papers.papers_index, show_progress,
+                    n_workers)
+            self._save_stats(current_dataset)
+        # Show progress if required.
+        elif show_progress:
+            total = len(self.cord_uids)
+            progress_bar(total, total)
+
+        # Position of each paper in the columns (created when it's needed).
+        self._uids_rows = None
+
+    def __len__(self):
+        return len(self.cord_uids)
+
+    @classmethod
+    def _collect_stats(cls, cord19_papers, cord_uids, show_progress=False,
+                       n_workers=1):
+        """
+        Read the papers once to get the statistics of their full text.
+        :param cord19_papers: The Papers of the CORD-19 dataset.
+        :param cord_uids: The 'cord_uid' of the papers to read.
+        :param show_progress: Bool representing whether we show the progress of
+        the function or not.
+        :param n_workers: The number of processes used to read the papers.
+        :return: Tuple with the array of the 'cord_uid' of the papers and the
+        dictionary with the array of each statistic.
+        """
+        total = len(cord_uids)
+        uids = []
+        columns_values = [np.zeros(total, dtype=np.int64) for _ in cls.columns]
+        papers_stats = cord19_papers.papers_full_text_stats(cord_uids, n_workers)
+        for row, paper_stats in enumerate(papers_stats):
+            uids.append(paper_stats[0])
+            for column_values, value in zip(columns_values, paper_stats[1:]):
+                column_values[row] = value
+            # Show Progress if required.
+            if show_progress:
+                progress_bar(row + 1, total)
+
+        stats = dict(zip(cls.columns, columns_values))
+        return np.array(uids, dtype=str), stats
+
+    def _update_stats(self, cord19_papers, papers_update, show_progress=False,
+                      n_workers=1):
+        """
+        Update the statistics to a new CORD-19 release, reading only the papers
+        added or changed in the release, and dropping the removed ones.
+        :param cord19_papers: The Papers of the CORD-19 dataset.
+        :param papers_update: Dictionary with the 'cord_uid' of the 'added',
+        'changed' and 'removed' papers.
+        :param show_progress: Bool representing whether we show the progress of
+        the function or not.
+        :param n_workers: The number of processes used to read the papers.
+        """
+        # Keep the rows of the papers that didn't change.
+        outdated_uids = papers_update['removed'] + papers_update['changed']
+        keep_rows = ~np.isin(self.cord_uids, outdated_uids)
+        # Read the new and changed papers.
+        new_uids = papers_update['added'] + papers_update['changed']
+        new_cord_uids, new_stats = self._collect_stats(
+            cord19_papers, new_uids, show_progress, n_workers)
+
+        self.cord_uids = np.concatenate([self.cord_uids[keep_rows], new_cord_uids])
+        self.stats = {
+            column: np.concatenate([self.stats[column][keep_rows], new_stats[column]])
+            for column in self.columns
+        }
+
+    def _save_stats(self, dataset):
+        """
+        Save the columns of the statistics and the dataset they belong to,
+        using a temporary file so an interrupted save doesn't leave a broken
+        file behind.
+        :param dataset: The name of the CORD-19 dataset of the statistics.
+        """
+        stats_path = join(self.data_folder, self.stats_file)
+        temp_path = stats_path + '.temp'
+        with open(temp_path, 'wb') as file:
+            np.savez(file, dataset=np.array(dataset), cord_uids=self.cord_uids,
+                     **self.stats)
+        replace(temp_path, stats_path)
+
+    def column(self, name):
+        """
+        Get the values of a statistic for all the papers.
+        :param name: String with the name of the statistic ('chars',
+        'paragraphs', 'sections' or 'tokens').
+        :return: A numpy array with the values, in the order of 'cord_uids'.
+        """
+        if name not in self.stats:
+            raise Exception(f"The statistic '{name}' is not available.")
+        return self.stats[name]
+
+    def paper_stats(self, cord_uid):
+        """
+        Get the statistics of the paper 'cord_uid'.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: A dictionary with the value of each statistic.
+        """
+        if self._uids_rows is None:
+            self._uids_rows = {cord_uid: row for row, cord_uid
+                               in enumerate(self.cord_uids.tolist())}
+        row = self._uids_rows[cord_uid]
+        return {column: int(self.stats[column][row]) for column in self.columns}
+
+    def histogram(self, column='chars', bins=10):
+        """
+        Count how many papers fall in each interval of the values of a
+        statistic.
+        :param column: The name of the statistic.
+        :param bins: The number of intervals, or a list with their edges.
+        :return: Tuple with the counts of each interval and their edges.
+        """
+        return np.histogram(self.column(column), bins=bins)
+
+    def bucket_counts(self, thresholds=(300, 3_000), column='chars'):
+        """
+        Count the papers in each of the buckets defined by the thresholds.
+        :param thresholds: Sorted list with the maximum value of each bucket.
+        The papers bigger than the last threshold go to an extra bucket.
+        :param column: The name of the statistic used to classify the papers.
+        :return: A list with the number of papers in each bucket.
+        """
+        buckets = np.searchsorted(thresholds, self.column(column), side='left')
+        return np.bincount(buckets, minlength=len(thresholds) + 1).tolist()
+
+    def size_buckets(self, thresholds=(300, 3_000), column='chars'):
+        """
+        Classify the papers in the buckets defined by the thresholds. With the
+        default thresholds the buckets are the small (0-300 characters), medium
+        (301-3,000) and big (3,001 or more) papers used by PapersAnalyzer.
+        :param thresholds: Sorted list with the maximum value of each bucket.
+        The papers bigger than the last threshold go to an extra bucket.
+        :param column: The name of the statistic used to classify the papers.
+        :return: A list with the 'cord_uid' of the papers in each bucket.
+        """
+        buckets = np.searchsorted(thresholds, self.column(column), side='left')
+        return [self.cord_uids[buckets == bucket].tolist()
+                for bucket in range(len(thresholds) + 1)]
+
+    def papers_over(self, n_chars):
+        """
+        Find the papers with more than 'n_chars' characters in their full text.
+        :param n_chars: The number of characters.
+        :return: A list with the 'cord_uid' of the papers.
+        """
+        return self.cord_uids[self.stats['chars'] > n_chars].tolist()
+
+
+# Test the class.
+if __name__ == '__main__':
+    # Record the Runtime of the Program
+    stopwatch = TimeKeeper()
+
+    print("\nLoading the Statistics of the Papers...")
+    papers_stats = PapersStats(show_progress=True)
+    print("\nDone.")
+    print(f"[{stopwatch.formatted_runtime()}]")
+
+    print(f"\nAmount of papers: {big_number(len(papers_stats))}")
+    print("\nPapers by number of characters:")
+    counts, edges = papers_stats.histogram('chars', bins=[0, 300, 3_000, 30_000,
+                                                          300_000, 3_000_000])
+    for count, low, high in zip(counts, edges[:-1], edges[1:]):
+        print(f"  {big_number(int(low))} - {big_number(int(high))}: {big_number(int(count))}")
+    print(f"[{stopwatch.formatted_runtime()}]")
@@ -0,0 +1,149 @@
+# Gelin Eguinosa Rosique
+
+import os
+from collections import deque
+from os.path import dirname, basename
+from concurrent.futures import ThreadPoolExecutor
+
+from time_keeper import TimeKeeper
+
+
+def read_ahead(items, window=64, n_threads=4):
+    """
+    Read the files of the given items in background threads, ahead of the
+    consumer of the iterator. The files are read in windows of 'window' items:
+    while the consumer goes through one window, the files of the next one are
+    being read. Inside a window the files are requested sorted by directory
+    and name, so the disk reads them in the order they are saved, but the
+    items are still returned in their original order.
+    :param items: An iterable of tuples with a key and the path of the file to
+    read. If the path is None, no file is read for that item.
+    :param window: The number of items in each window.
+    :param n_threads: The number of threads reading the files.
+    :return: An iterator of tuples with the key of each item and the bytes of
+    its file (None if the item had no path).
+    """
+    executor = ThreadPoolExecutor(max_workers=n_threads)
+    # Windows with the keys and the futures of their files.
+    pending = deque()
+    try:
+        for window_items in _windows(items, window):
+            pending.append(_submit_window(executor, window_items))
+            # Return the previous window, while this one is being read.
+            if len(pending) > 1:
+                yield from _window_results(pending.popleft())
+        # Return the last window.
+        while pending:
+            yield from _window_results(pending.popleft())
+    finally:
+        # Don't read the files of windows the consumer no longer needs.
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _windows(items, window):
+    """
+    Group the items in lists of 'window' items.
+    """
+    window_items = []
+    for item in items:
+        window_items.append(item)
+        if len(window_items) == window:
+            yield window_items
+            window_items = []
+    if window_items:
+        yield window_items
+
+
+def _submit_window(executor, window_items):
+    """
+    Send the files of a window to the threads, sorted by their location.
+    :return: A list with the key and the future of each item, in the original
+    order.
+    """
+    futures = [None] * len(window_items)
+    locality_order = sorted(
+        (i for i, (_, path) in enumerate(window_items) if path is not None),
+        key=lambda i: (dirname(window_items[i][1]), basename(window_items[i][1]))
+    )
+    for i in locality_order:
+        futures[i] = executor.submit(read_file_bytes, window_items[i][1])
+    return [(key, future) for (key, _), future in zip(window_items, futures)]
+
+
+def _window_results(window_futures):
+    """
+    Wait for the files of a window, in the original order of the items.
+    """
+    for key, future in window_futures:
+        yield key, future.result() if future else None
+
+
+def read_file_bytes(path):
+    """
+    Read the whole content of a file.
+    :param path: The path of the file.
+    :return: The bytes of the file.
+    """
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def drop_file_cache(path):
+    """
+    Ask the operating system to remove the file from the page cache, so the
+    next read has to go to the disk. Only works on systems with posix_fadvise
+    (Linux), on the rest it does nothing.
+    :param path: The path of the file.
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def read_ahead_benchmark(cord19_papers, n=1_000, window=64, n_threads=4):
+    """
+    Compare the time it takes to extract the full text of 'n' papers with the
+    disk cache cold, reading their JSON files one at a time and using the
+    read-ahead. The files of the papers are removed from the page cache before
+    each run.
+    :param cord19_papers: The Papers of the CORD-19 dataset.
+    :param n: The number of papers used in the benchmark.
+    :param window: The number of papers read ahead of the consumer.
+    :param n_threads: The number of threads reading the files.
+    """
+    cord_uids = list(cord19_papers.papers_index)[:n]
+    papers_paths = [path for cord_uid in cord_uids
+                    for path in cord19_papers.paper_json_paths(cord_uid)]
+    # Don't use the text store, we want to read the JSON files.
+    text_store = cord19_papers.text_store
+    cord19_papers.text_store = None
+    print(f"\nExtracting the full text of {len(cord_uids)} papers (cold cache)...")
+
+    results = []
+    for name, papers_window in [('One file at a time', 0),
+                                (f'Read-ahead ({window} papers, {n_threads} threads)',
+                                 window)]:
+        for path in papers_paths:
+            drop_file_cache(path)
+        stopwatch = TimeKeeper()
+        texts = list(cord19_papers.papers_full_text(
+            cord_uids, read_ahead=papers_window, read_ahead_threads=n_threads))
+        run_time = stopwatch.total_runtime()
+        results.append(texts)
+        print(f"{name}: {run_time:.3f} seconds.")
+
+    cord19_papers.text_store = text_store
+    print(f"Same texts extracted: {results[0] == results[1]}")
+
+
+# Measure the read-ahead with the CORD-19 papers.
+if __name__ == '__main__':
+    from papers import Papers
+
+    read_ahead_benchmark(Papers())
+    print("Done.")
@@ -0,0 +1,197 @@
+# Gelin Eguinosa Rosique
+
+import json
+import zlib
+from os import mkdir, listdir, remove, replace
+from os.path import join, isfile, isdir
+
+
+class PapersTextStore:
+    """
+    Store with the body text of the CORD-19 papers already extracted from their
+    JSON files. The texts are compressed and saved in a few shard files, with
+    an index containing the location of each paper, so getting the content of
+    a paper only takes one seek and one decompression.
+    """
+    # Class Data Locations
+    data_folder = 'project_data'
+    store_folder = 'papers_text'
+    store_index_file = 'text_store_index.json'
+    shard_prefix = 'text_shard_'
+
+    def __init__(self):
+        """
+        Load the index of the store. The shard files are opened the first time
+        one of their papers is requested.
+        """
+        index_path = join(self.data_folder, self.store_folder,
+                          self.store_index_file)
+        with open(index_path, 'r') as file:
+            store_index = json.load(file)
+        # The dataset of the texts, the names of the shards and the location of
+        # each paper: [shard number, offset, compressed size, text size].
+        self.dataset = store_index['dataset']
+        self.shards = store_index['shards']
+        self.papers_info = store_index['papers']
+        # Opened shard files.
+        self._shard_files = {}
+
+    def __contains__(self, cord_uid):
+        return cord_uid in self.papers_info
+
+    def __len__(self):
+        return len(self.papers_info)
+
+    def paper_content(self, cord_uid):
+        """
+        Get the body text of the paper 'cord_uid' from its shard.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: A string with the content of the paper.
+        """
+        shard_i, offset, compressed_size, _ = self.papers_info[cord_uid]
+        # Open the shard if it's the first time we use it.
+        if shard_i not in self._shard_files:
+            shard_path = join(self.data_folder, self.store_folder,
+                              self.shards[shard_i])
+            self._shard_files[shard_i] = open(shard_path, 'rb')
+        shard_file = self._shard_files[shard_i]
+        # Read and decompress the text.
+        shard_file.seek(offset)
+        compressed_text = shard_file.read(compressed_size)
+        return zlib.decompress(compressed_text).decode('utf-8')
+
+    def content_size(self, cord_uid):
+        """
+        Get the number of characters in the body text of the paper 'cord_uid',
+        without reading it.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: An int with the size of the content of the paper.
+        """
+        return self.papers_info[cord_uid][3]
+
+    def close(self):
+        """
+        Close the opened shard files.
+        """
+        for shard_file in self._shard_files.values():
+            shard_file.close()
+        self._shard_files = {}
+
+    @classmethod
+    def create(cls, dataset, compressed_contents, total, n_shards=16):
+        """
+        Save the compressed contents of the papers in 'n_shards' files, and
+        create the index of the store. The papers are assigned to the shards in
+        contiguous blocks, keeping the order in which they were received. The
+        index is written at the end, so an interrupted extraction is never
+        mistaken for a complete store.
+        :param dataset: The name of the CORD-19 dataset the texts belong to.
+        :param compressed_contents: An iterable with tuples containing the
+        'cord_uid', the compressed text and the size of the text of each paper.
+        :param total: The number of papers in 'compressed_contents'.
+        :param n_shards: The number of shard files used to save the texts.
+        :return: The created PapersTextStore.
+        """
+        # Create the folder of the store, or delete the previous store.
+        store_folder_path = join(cls.data_folder, cls.store_folder)
+        if not isdir(store_folder_path):
+            mkdir(store_folder_path)
+        for file_name in listdir(store_folder_path):
+            file_path = join(store_folder_path, file_name)
+            if isfile(file_path):
+                remove(file_path)
+
+        # Don't create empty shards.
+        n_shards = max(1, min(n_shards, total))
+        shards = [cls.shard_prefix + str(shard_i) + '.bin'
+                  for shard_i in range(n_shards)]
+        papers_info = {}
+
+        # Save the texts in their shards.
+        shard_i = -1
+        shard_file = None
+        for count, paper_info in enumerate(compressed_contents):
+            cord_uid, compressed_text, text_size = paper_info
+            # Check if the paper goes to the next shard.
+            if count * n_shards // total != shard_i:
+                if shard_file:
+                    shard_file.close()
+                shard_i = count * n_shards // total
+                shard_file = open(join(store_folder_path, shards[shard_i]), 'wb')
+            # Save the text and its location.
+            papers_info[cord_uid] = [shard_i, shard_file.tell(),
+                                     len(compressed_text), text_size]
+            shard_file.write(compressed_text)
+        if shard_file:
+            shard_file.close()
+
+        # Save the index of the store.
+        store_index = {'dataset': dataset, 'shards': shards, 'papers': papers_info}
+        cls._save_index(store_index)
+        return cls()
+
+    @classmethod
+    def update(cls, dataset, compressed_contents, removed_uids):
+        """
+        Update the saved store to a new dataset, adding the compressed contents
+        of the new or changed papers in a new shard, and removing the papers
+        that are no longer in the dataset. The texts in the previous shards are
+        not rewritten.
+        :param dataset: The name of the CORD-19 dataset of the update.
+        :param compressed_contents: An iterable with tuples containing the
+        'cord_uid', the compressed text and the size of the text of the new and
+        changed papers.
+        :param removed_uids: A list with the 'cord_uid' of the removed papers.
+        :return: The updated PapersTextStore.
+        """
+        text_store = cls()
+        shards = text_store.shards
+        papers_info = text_store.papers_info
+        # Remove the papers not in the dataset.
+        for cord_uid in removed_uids:
+            papers_info.pop(cord_uid, None)
+
+        # Save the new texts in a new shard.
+        shard_i = len(shards)
+        shards.append(cls.shard_prefix + str(shard_i) + '.bin')
+        shard_path = join(cls.data_folder, cls.store_folder, shards[shard_i])
+        with open(shard_path, 'wb') as shard_file:
+            for cord_uid, compressed_text, text_size in compressed_contents:
+                papers_info[cord_uid] = [shard_i, shard_file.tell(),
+                                         len(compressed_text), text_size]
+                shard_file.write(compressed_text)
+
+        # Save the updated index of the store.
+        store_index = {'dataset': dataset, 'shards': shards, 'papers': papers_info}
+        cls._save_index(store_index)
+        return cls()
+
+    @classmethod
+    def _save_index(cls, store_index):
+        """
+        Save the index of the store, using a temporary file so the index is
+        never left half written.
+        """
+        index_path = join(cls.data_folder, cls.store_folder, cls.store_index_file)
+        temp_path = index_path + '.temp'
+        with open(temp_path, 'w') as file:
+            json.dump(store_index, file)
+        replace(temp_path, index_path)
+
+    @classmethod
+    def is_store_saved(cls):
+        """
+        Check if the texts of the papers were extracted and saved.
+        :return: Bool representing if the store is ready to be used.
+        """
+        index_path = join(cls.data_folder, cls.store_folder, cls.store_index_file)
+        return isfile(index_path)
+
+
+def compress_content(content):
+    """
+    Compress the text of a paper to save it in the PapersTextStore.
+    :param content: A string with the content of the paper.
+    :return: Tuple with the compressed text and the size of the text.
+    """
+    return zlib.compress(content.encode('utf-8')), len(content)
@@ -0,0 +1,352 @@
+# Gelin Eguinosa Rosique
+
+import json
+import shutil
+import tempfile
+import numpy as np
+from array import array
+from os import replace, listdir, remove, fsync
+from os.path import join, isfile, getsize
+
+from time_keeper import TimeKeeper
+
+
+class PackedTokenStore:
+    """
+    Store with the tokens of the documents of a corpus packed in a single
+    integer array. The tokens are saved as ids of a vocabulary table, with the
+    tokens of all the documents one after the other, and an array with the
+    offset where each document starts. Both arrays are memory-mapped, so
+    reading a document doesn't need to open or decode any file.
+    """
+    # Files of the Store (inside the folder given to the store).
+    vocabulary_file = 'token_vocabulary.json'
+    token_ids_file = 'token_ids.bin'
+    doc_offsets_file = 'doc_offsets.bin'
+    checkpoint_file = 'store_checkpoint.json'
+    doc_keys_file = 'doc_keys.json'
+
+    def __init__(self, store_folder):
+        """
+        Load the vocabulary of the store and memory-map its arrays.
+        :param store_folder: The path of the folder where the store is saved.
+        """
+        if not self.is_store_saved(store_folder):
+            raise Exception(f"No token store saved in '{store_folder}'.")
+        self.store_folder = store_folder
+        with open(join(store_folder, self.vocabulary_file), 'r') as file:
+            self.vocabulary = json.load(file)
+        # The offsets of the documents (one more than the documents).
+        self.doc_offsets = np.memmap(join(store_folder, self.doc_offsets_file),
+                                     dtype=np.uint64, mode='r')
+        # The ids of the tokens (numpy can't map an empty file).
+        token_ids_path = join(store_folder, self.token_ids_file)
+        if getsize(token_ids_path):
+            self.token_ids = np.memmap(token_ids_path, dtype=np.uint32, mode='r')
+        else:
+            self.token_ids = np.zeros(0, dtype=np.uint32)
+        # The keys of the documents (e.g. their cord_uid), if they were saved.
+        # Only the keys of the documents in the offsets are used.
+        self.doc_keys = None
+        doc_keys_path = join(store_folder, self.doc_keys_file)
+        if isfile(doc_keys_path):
+            with open(doc_keys_path, 'r') as file:
+                self.doc_keys = json.load(file)[:len(self)]
+
+    def __len__(self):
+        return len(self.doc_offsets) - 1
+
+    def doc_ids(self, position):
+        """
+        Get the ids of the tokens of a document, without copying them.
+        :param position: The position of the document in the store.
+        :return: A numpy array (a view of the memory-mapped file).
+        """
+        start = int(self.doc_offsets[position])
+        end = int(self.doc_offsets[position + 1])
+        return self.token_ids[start:end]
+
+    def doc_tokens(self, position):
+        """
+        Get the tokens of a document.
+        :param position: The position of the document in the store.
+        :return: A list of strings with the tokens of the document.
+        """
+        vocabulary = self.vocabulary
+        return [vocabulary[token_id] for token_id in self.doc_ids(position).tolist()]
+
+    def docs_tokens(self):
+        """
+        Iterate through the tokens of the documents, in the order of the store.
+        :return: An iterator of lists of strings.
+        """
+        for position in range(len(self)):
+            yield self.doc_tokens(position)
+
+    def docs_ids(self):
+        """
+        Iterate through the ids of the tokens of the documents, in the order of
+        the store.
+        :return: An iterator of numpy arrays.
+        """
+        for position in range(len(self)):
+            yield self.doc_ids(position)
+
+    def disk_size(self):
+        """
+        Get the number of bytes used by the files of the store.
+        """
+        return sum(getsize(join(self.store_folder, file_name))
+                   for file_name in [self.vocabulary_file, self.token_ids_file,
+                                     self.doc_offsets_file, self.doc_keys_file]
+                   if isfile(join(self.store_folder, file_name)))
+
+    @classmethod
+    def create(cls, store_folder, docs_tokens, checkpoint_every=None,
+               resume=False, keyed=False):
+        """
+        Save the tokens of the documents in a new store, going through the
+        documents only once. The files are written with temporary names and
+        renamed at the end, so a previous store in the same folder can still be
+        read while the new one is created.
+        Every 'checkpoint_every' documents, the tokens written so far are
+        flushed to the disk and a checkpoint with the vocabulary and the offsets
+        of the documents is saved, so the creation of the store can be resumed
+        if it's interrupted.
+        :param store_folder: The path of the folder of the store.
+        :param docs_tokens: An iterable with the list of tokens of each
+        document. When resuming, it has to start after the documents saved in
+        the last checkpoint.
+        :param checkpoint_every: The number of documents between checkpoints.
+        If it's None, no checkpoints are saved.
+        :param resume: Bool to determine if we continue from the last
+        checkpoint of the folder, or start the store from scratch.
+        :param keyed: Bool to determine if the items of 'docs_tokens' are tuples
+        with the key of the document (e.g. its cord_uid) and its tokens. The
+        keys are saved with the store.
+        :return: The created PackedTokenStore.
+        """
+        vocabulary = []
+        doc_offsets = array('Q', [0])
+        doc_keys = [] if keyed else None
+        token_ids_path = join(store_folder, cls.token_ids_file)
+        checkpoint_path = join(store_folder, cls.checkpoint_file)
+        ids_file_mode = 'wb'
+        # Load the documents saved before the interruption.
+        if resume and cls.checkpoint_position(store_folder):
+            with open(checkpoint_path, 'r') as file:
+                checkpoint = json.load(file)
+            vocabulary = checkpoint['vocabulary']
+            doc_offsets = array('Q', checkpoint['doc_offsets'])
+            if keyed:
+                doc_keys = checkpoint['doc_keys']
+            ids_file_mode = 'r+b'
+        elif isfile(checkpoint_path):
+            remove(checkpoint_path)
+        token2id = {token: token_id for token_id, token in enumerate(vocabulary)}
+
+        with open(token_ids_path + '.temp', ids_file_mode) as ids_file:
+            # Remove the tokens written after the last checkpoint (4 bytes per
+            # token id).
+            ids_file.truncate(doc_offsets[-1] * 4)
+            ids_file.seek(0, 2)
+            for doc_tokens in docs_tokens:
+                if keyed:
+                    doc_key, doc_tokens = doc_tokens
+                    doc_keys.append(doc_key)
+                doc_length = cls._write_doc_ids(ids_file, doc_tokens, vocabulary,
+                                                token2id)
+                doc_offsets.append(doc_offsets[-1] + doc_length)
+                # Save a checkpoint of the documents written.
+                if checkpoint_every and (len(doc_offsets) - 1) % checkpoint_every == 0:
+                    cls._save_checkpoint(store_folder, ids_file, vocabulary,
+                                         doc_offsets, doc_keys)
+
+        # Save the offsets, the vocabulary and the keys of the documents.
+        doc_offsets_path = join(store_folder, cls.doc_offsets_file)
+        with open(doc_offsets_path + '.temp', 'wb') as file:
+            doc_offsets.tofile(file)
+        vocabulary_path = join(store_folder, cls.vocabulary_file)
+        with open(vocabulary_path + '.temp', 'w') as file:
+            json.dump(vocabulary, file)
+        doc_keys_path = join(store_folder, cls.doc_keys_file)
+        if keyed:
+            with open(doc_keys_path + '.temp', 'w') as file:
+                json.dump(doc_keys, file)
+        elif isfile(doc_keys_path):
+            remove(doc_keys_path)
+
+        # Replace the previous store.
+        new_files = [token_ids_path, doc_offsets_path, vocabulary_path]
+        if keyed:
+            new_files.append(doc_keys_path)
+        for file_path in new_files:
+            replace(file_path + '.temp', file_path)
+        # The store is complete, the checkpoint is no longer needed.
+        if isfile(checkpoint_path):
+            remove(checkpoint_path)
+        return cls(store_folder)
+
+    def append(self, docs_tokens, keyed=False):
+        """
+        Add new documents at the end of the store, without rewriting the
+        tokens of the documents already saved. The offsets of the documents are
+        updated last, so if the process is interrupted the store still has its
+        previous documents.
+        :param docs_tokens: An iterable with the list of tokens of each new
+        document (or tuples with their keys and tokens, if 'keyed' is True).
+        :param keyed: Bool to determine if the documents come with their keys.
+        It has to match the way the store was created.
+        :return: The PackedTokenStore with the new documents.
+        """
+        if keyed != (self.doc_keys is not None):
+            raise Exception("The documents have to be keyed in the same way as"
+                            " the documents of the store.")
+        vocabulary = list(self.vocabulary)
+        token2id = {token: token_id for token_id, token in enumerate(vocabulary)}
+        doc_offsets = array('Q', [int(self.doc_offsets[-1])])
+        doc_keys = list(self.doc_keys) if keyed else None
+        store_folder = self.store_folder
+        # Close the memory-mapped arrays before changing their files.
+        self.token_ids = self.doc_offsets = None
+
+        token_ids_path = join(store_folder, self.token_ids_file)
+        with open(token_ids_path, 'r+b') as ids_file:
+            # Remove the tokens of an append that was interrupted.
+            ids_file.truncate(doc_offsets[0] * 4)
+            ids_file.seek(0, 2)
+            for doc_tokens in docs_tokens:
+                if keyed:
+                    doc_key, doc_tokens = doc_tokens
+                    doc_keys.append(doc_key)
+                doc_length = self._write_doc_ids(ids_file, doc_tokens, vocabulary,
+                                                 token2id)
+                doc_offsets.append(doc_offsets[-1] + doc_length)
+            ids_file.flush()
+            fsync(ids_file.fileno())
+
+        # Save the new vocabulary and keys, before the offsets make the new
+        # documents visible.
+        vocabulary_path = join(store_folder, self.vocabulary_file)
+        with open(vocabulary_path + '.temp', 'w') as file:
+            json.dump(vocabulary, file)
+        replace(vocabulary_path + '.temp', vocabulary_path)
+        if keyed:
+            doc_keys_path = join(store_folder, self.doc_keys_file)
+            with open(doc_keys_path + '.temp', 'w') as file:
+                json.dump(doc_keys, file)
+            replace(doc_keys_path + '.temp', doc_keys_path)
+        with open(join(store_folder, self.doc_offsets_file), 'ab') as file:
+            doc_offsets[1:].tofile(file)
+        return self.__class__(store_folder)
+
+    @classmethod
+    def _write_doc_ids(cls, ids_file, doc_tokens, vocabulary, token2id):
+        """
+        Write the ids of the tokens of a document in the file, adding the new
+        tokens to the vocabulary.
+        :return: The number of tokens of the document.
+        """
+        doc_ids = array('I')
+        for token in doc_tokens:
+            token_id = token2id.get(token)
+            if token_id is None:
+                token_id = len(vocabulary)
+                token2id[token] = token_id
+                vocabulary.append(token)
+            doc_ids.append(token_id)
+        doc_ids.tofile(ids_file)
+        return len(doc_ids)
+
+    @classmethod
+    def _save_checkpoint(cls, store_folder, ids_file, vocabulary, doc_offsets,
+                         doc_keys=None):
+        """
+        Make sure the tokens written are on the disk, and save the vocabulary
+        and the offsets of the documents. The checkpoint is written with a
+        temporary name and then renamed, so an interruption while it's saved
+        doesn't damage the previous checkpoint.
+        """
+        ids_file.flush()
+        fsync(ids_file.fileno())
+        checkpoint = {
+            'documents': len(doc_offsets) - 1,
+            'vocabulary': vocabulary,
+            'doc_offsets': doc_offsets.tolist(),
+            'doc_keys': doc_keys,
+        }
+        checkpoint_path = join(store_folder, cls.checkpoint_file)
+        with open(checkpoint_path + '.temp', 'w') as file:
+            json.dump(checkpoint, file)
+            file.flush()
+            fsync(file.fileno())
+        replace(checkpoint_path + '.temp', checkpoint_path)
+
+    @classmethod
+    def checkpoint_position(cls, store_folder):
+        """
+        Get the number of documents saved in the last checkpoint of a store
+        that was not finished.
+        :param store_folder: The path of the folder of the store.
+        :return: The number of documents, or 0 if there is no checkpoint.
+        """
+        checkpoint_path = join(store_folder, cls.checkpoint_file)
+        token_ids_path = join(store_folder, cls.token_ids_file)
+        if not isfile(checkpoint_path) or not isfile(token_ids_path + '.temp'):
+            return 0
+        with open(checkpoint_path, 'r') as file:
+            return json.load(file)['documents']
+
+    @classmethod
+    def is_store_saved(cls, store_folder):
+        """
+        Check if there is a token store saved in the folder.
+        :param store_folder: The path of the folder of the store.
+        :return: Bool representing if the store can be loaded.
+        """
+        for file_name in [cls.vocabulary_file, cls.token_ids_file,
+                          cls.doc_offsets_file]:
+            if not isfile(join(store_folder, file_name)):
+                return False
+        return True
+
+
+def token_store_comparison(token_store):
+    """
+    Compare the disk space and the time it takes to go through the documents
+    of a PackedTokenStore, against saving each document in its own JSON file
+    (the layout used before the store). The JSON files are created in a
+    temporary folder, and deleted at the end.
+    :param token_store: The PackedTokenStore with the tokens of the corpus.
+    """
+    temp_folder = tempfile.mkdtemp()
+    try:
+        # Save the documents in the JSON layout.
+        for position, doc_tokens in enumerate(token_store.docs_tokens()):
+            with open(join(temp_folder, f'doc_tokens_{position + 1}.json'), 'w') as file:
+                json.dump(doc_tokens, file)
+        json_size = sum(getsize(join(temp_folder, file_name))
+                        for file_name in listdir(temp_folder))
+
+        # Time the iteration over the JSON files.
+        stopwatch = TimeKeeper()
+        json_tokens = 0
+        for position in range(len(token_store)):
+            with open(join(temp_folder, f'doc_tokens_{position + 1}.json'), 'r') as file:
+                json_tokens += len(json.load(file))
+        json_time = stopwatch.total_runtime()
+
+        # Time the iteration over the store.
+        stopwatch.restart()
+        store_tokens = 0
+        for doc_tokens in token_store.docs_tokens():
+            store_tokens += len(doc_tokens)
+        store_time = stopwatch.total_runtime()
+    finally:
+        shutil.rmtree(temp_folder)
+
+    print(f"\nDocuments: {len(token_store)}, Tokens: {store_tokens}")
+    print(f"JSON files: {json_size / 2**20:.2f} MB, {json_time:.3f} seconds.")
+    print(f"Packed store: {token_store.disk_size() / 2**20:.2f} MB, "
+          f"{store_time:.3f} seconds.")
+    print(f"Same tokens: {json_tokens == store_tokens}")
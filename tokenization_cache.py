@@ -0,0 +1,136 @@
+# Gelin Eguinosa Rosique
+
+import sqlite3
+import numpy as np
+from os import mkdir
+from os.path import isdir, join
+from hashlib import blake2b
+
+
+class TokenizationCache:
+    """
+    Persistent cache with the tokens of the texts already tokenized, so the
+    papers of the CORD-19 that have the same text under different cord_uids
+    (e.g. the PMC and PDF parses of the same paper) are only processed once by
+    spaCy. The texts are identified by the hash of their normalized content
+    and of the configuration of the tokenizer, so a change in the model or in
+    the token filter doesn't use the tokens of the previous configuration.
+    The cache is a SQLite database (portable, and without a limit on the size
+    of the values), with the tokens of each text saved as the uint32 ids of a
+    vocabulary table, like in the PackedTokenStore.
+    """
+    # Location Class Data
+    data_folder = 'project_data'
+    cache_name = 'tokenization_cache.sqlite'
+    # The number of new texts saved between the commits of the database.
+    commit_every = 100
+
+    def __init__(self, config_signature):
+        """
+        Open the cache saved in the data folder (or create it).
+        :param config_signature: A string identifying the configuration of the
+        tokenizer (see docs_tokenization.tokenizer_signature()).
+        """
+        # Create data folder if it doesn't exist.
+        if not isdir(self.data_folder):
+            mkdir(self.data_folder)
+        self.config_signature = config_signature
+        self.db = sqlite3.connect(join(self.data_folder, self.cache_name))
+        self.db.execute("CREATE TABLE IF NOT EXISTS vocabulary"
+                        " (token_id INTEGER PRIMARY KEY, token TEXT NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS texts"
+                        " (text_key BLOB PRIMARY KEY, token_ids BLOB NOT NULL)")
+        # Load the vocabulary of the tokens.
+        self.vocabulary = [token for token, in self.db.execute(
+            "SELECT token FROM vocabulary ORDER BY token_id")]
+        self.token2id = {token: token_id for token_id, token
+                         in enumerate(self.vocabulary)}
+        self.unsaved_texts = 0
+        # The documents served from the cache and the ones tokenized by spaCy.
+        self.hits = 0
+        self.misses = 0
+
+    def text_key(self, text):
+        """
+        Create the key of a text in the cache.
+        :param text: The string with the text of the document.
+        :return: The bytes of the key.
+        """
+        text_hash = blake2b(digest_size=16)
+        text_hash.update(self.config_signature.encode('utf-8'))
+        text_hash.update(b'\0')
+        text_hash.update(normalize_text(text).encode('utf-8', 'surrogatepass'))
+        return text_hash.digest()
+
+    def __contains__(self, key):
+        row = self.db.execute("SELECT 1 FROM texts WHERE text_key = ?", (key,))
+        return row.fetchone() is not None
+
+    def doc_tokens(self, key):
+        """
+        Get the tokens of a text saved in the cache.
+        :param key: The key of the text.
+        :return: The list of tokens, or None if the text is not in the cache.
+        """
+        row = self.db.execute("SELECT token_ids FROM texts WHERE text_key = ?",
+                              (key,)).fetchone()
+        if row is None:
+            return None
+        self.hits += 1
+        vocabulary = self.vocabulary
+        token_ids = np.frombuffer(row[0], dtype='<u4').tolist()
+        return [vocabulary[token_id] for token_id in token_ids]
+
+    def save_tokens(self, key, doc_tokens):
+        """
+        Save the tokens of a text tokenized by spaCy.
+        :param key: The key of the text.
+        :param doc_tokens: The list of tokens of the text.
+        """
+        self.misses += 1
+        # Add the new tokens to the vocabulary.
+        token2id = self.token2id
+        token_ids = []
+        for token in doc_tokens:
+            token_id = token2id.get(token)
+            if token_id is None:
+                token_id = len(self.vocabulary)
+                self.vocabulary.append(token)
+                token2id[token] = token_id
+                self.db.execute("INSERT INTO vocabulary VALUES (?, ?)",
+                                (token_id, token))
+            token_ids.append(token_id)
+        self.db.execute("INSERT OR REPLACE INTO texts VALUES (?, ?)",
+                        (key, np.array(token_ids, dtype='<u4').tobytes()))
+        # Save the changes every few texts.
+        self.unsaved_texts += 1
+        if self.unsaved_texts >= self.commit_every:
+            self.db.commit()
+            self.unsaved_texts = 0
+
+    def report(self):
+        """
+        Print the number of documents served from the cache, that is, the
+        number of times spaCy was not needed.
+        """
+        total = self.hits + self.misses
+        print(f"Documents served from the tokenization cache: {self.hits} of "
+              f"{total} (spaCy calls saved: {self.hits}).")
+
+    def close(self):
+        """
+        Save the last texts and close the database of the cache.
+        """
+        self.db.commit()
+        self.db.close()
+
+
+def normalize_text(text):
+    """
+    Normalize a text before creating its hash, so texts that only differ in
+    their line endings or in the whitespace at their beginning and end are
+    considered the same. These changes don't modify the tokens of the text.
+    :param text: The string with the text.
+    :return: The normalized string.
+    """
+    return text.replace('\r\n', '\n').strip()
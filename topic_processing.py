@@ -1,11 +1,12 @@
 # Gelin Eguinosa Rosique
 
+import json
 import pickle
-from os import mkdir, listdir, remove
+from os import mkdir, listdir, remove, replace
 from os.path import isdir, isfile, join
 from gensim import corpora
 from gensim.corpora import Dictionary
-from gensim.models import LdaModel
+from gensim.models import LdaModel, LdaMulticore
 
 
 class TopicManager:
@@ -16,6 +17,7 @@ class TopicManager:
     data_folder = 'project_data'
     dict_file = 'dictionary.dict'
     corpus_file = 'corpus_bow.mm'
+    corpus_ids_file = 'corpus_doc_ids.json'
     lda_folder = 'lda_models'
     lda_index_file = 'index_lda_model.pickle'
     lda_prefix = 'lda_model_'
@@ -46,6 +48,17 @@ class TopicManager:
                                 " was not saved.")
             # Load the corpus bag-of-words
             self.corpus_bow = corpora.MmCorpus(corpus_path)
+            # Load the ids of the documents of the bag-of-words (not saved by
+            # the previous versions of the class).
+            self.corpus_doc_ids = None
+            self.doc_positions = None
+            corpus_ids_path = join(self.data_folder, self.corpus_ids_file)
+            if isfile(corpus_ids_path):
+                with open(corpus_ids_path, 'r') as file:
+                    self.corpus_doc_ids = json.load(file)
+                # The row of each document in the bag-of-words.
+                self.doc_positions = {doc_id: position for position, doc_id
+                                      in enumerate(self.corpus_doc_ids)}
 
             # Check if the LDA Model index file exists.
             lda_index_path = join(self.data_folder, self.lda_folder,
@@ -56,6 +69,16 @@ class TopicManager:
             # Load the lda index:
             with open(lda_index_path, 'rb') as file:
                 self.lda_index = pickle.load(file)
+            # Update the keys of the index saved by the previous versions of
+            # the class (only single-process models with alpha='auto').
+            if any(len(lda_params) == 5 for lda_params in self.lda_index):
+                self.lda_index = {
+                    (lda_params + ('single', None, 'auto')
+                     if len(lda_params) == 5 else lda_params): lda_model_file
+                    for lda_params, lda_model_file in self.lda_index.items()
+                }
+                with open(lda_index_path, 'wb') as file:
+                    pickle.dump(self.lda_index, file)
 
         # Create the TopicManager from scratch
         else:
@@ -83,6 +106,15 @@ class TopicManager:
             corpus_path = join(self.data_folder, self.corpus_file)
             corpora.MmCorpus.serialize(corpus_path, self._lazy_corpus_bow(tokenizer))
             self.corpus_bow = corpora.MmCorpus(corpus_path)
+            # Save the id of the document (e.g. its cord_uid) of each row of
+            # the corpus bag-of-words.
+            self.corpus_doc_ids = tokenizer.corpus_doc_ids()
+            corpus_ids_path = join(self.data_folder, self.corpus_ids_file)
+            with open(corpus_ids_path, 'w') as file:
+                json.dump(self.corpus_doc_ids, file)
+            # The row of each document in the bag-of-words.
+            self.doc_positions = {doc_id: position for position, doc_id
+                                  in enumerate(self.corpus_doc_ids)}
 
             # Create an index to keep track of the lda models that will be
             # created and save it.
@@ -111,8 +143,21 @@ class TopicManager:
         for doc in tokenizer.corpus_tokens():
             yield self.dictionary.doc2bow(doc)
 
+    def document_bow(self, doc_id):
+        """
+        Get the bag-of-words of a document of the corpus.
+        :param doc_id: The id of the document (e.g. its cord_uid).
+        :return: A list of tuples with the id of each word and its frequency.
+        """
+        if self.doc_positions is None:
+            raise Exception("The ids of the documents of the corpus were not"
+                            " saved.")
+        if doc_id not in self.doc_positions:
+            raise Exception(f"The document '{doc_id}' is not in the corpus.")
+        return self.corpus_bow[self.doc_positions[doc_id]]
+
     def lda_model(self, num_topics, chunksize, passes=20, iterations=400,
-                  eval_every=None):
+                  eval_every=None, workers=None, estimate_alpha=False):
         """
         Creates a LDA Model with the specified parameters, if the desired model
         was already created and saved, then it will be loaded from the saved
@@ -125,10 +170,24 @@ class TopicManager:
         inferring the topic distribution of a corpus.
         :param eval_every: Log perplexity is estimated every that many updates.
         Setting this to one slows down training by ~2x.
+        :param workers: The number of worker processes used to train the model
+        with LdaMulticore. If it's None, the model is trained in one process
+        with LdaModel and alpha='auto'.
+        :param estimate_alpha: LdaMulticore can't learn alpha during the
+        training, so it uses a symmetric alpha (1 / num_topics). If this is
+        True, an asymmetric alpha is estimated from the corpus after the
+        training. Ignored if 'workers' is None.
         :return: The LDA Model.
         """
+        # The engine and the prior of the model.
+        if workers is None:
+            engine, alpha_mode = 'single', 'auto'
+        else:
+            engine = 'multicore'
+            alpha_mode = 'estimated' if estimate_alpha else 'symmetric'
         # Save the parameters in a tuple, so they are easier to use.
-        lda_params = (num_topics, chunksize, passes, iterations, eval_every)
+        lda_params = (num_topics, chunksize, passes, iterations, eval_every,
+                      engine, workers, alpha_mode)
 
         # Check if a LDA Model with these parameters was already calculated.
         if lda_params in self.lda_index:
@@ -152,34 +211,45 @@ class TopicManager:
             id2word = self.dictionary.id2token
 
             # Create and Train the LDA Model
-            lda_model = LdaModel(
-                corpus=self.corpus_bow,
-                id2word=id2word,
-                chunksize=chunksize,
-                alpha='auto',
-                eta='auto',
-                iterations=iterations,
-                num_topics=num_topics,
-                passes=passes,
-                eval_every=eval_every
-            )
+            if engine == 'single':
+                lda_model = LdaModel(
+                    corpus=self.corpus_bow,
+                    id2word=id2word,
+                    chunksize=chunksize,
+                    alpha='auto',
+                    eta='auto',
+                    iterations=iterations,
+                    num_topics=num_topics,
+                    passes=passes,
+                    eval_every=eval_every
+                )
+            # Train the LDA Model with several processes.
+            else:
+                lda_model = LdaMulticore(
+                    corpus=self.corpus_bow,
+                    id2word=id2word,
+                    workers=workers,
+                    chunksize=chunksize,
+                    alpha='symmetric',
+                    eta='auto',
+                    iterations=iterations,
+                    num_topics=num_topics,
+                    passes=passes,
+                    eval_every=eval_every
+                )
+                if estimate_alpha:
+                    self._estimate_alpha(lda_model, chunksize)
 
             # Saving the LDA Model:
             # Create the name.
-            lda_id = len(self.lda_index) + 1
-            lda_model_name = self.lda_prefix + str(lda_id)
+            lda_model_name = self.new_lda_name()
             # Save the LDA Model in a file
             lda_model_path = join(self.data_folder, self.lda_folder,
                                   lda_model_name)
             lda_model.save(lda_model_path)
 
             # Save the name of the LDA Model in the Index.
-            self.lda_index[lda_params] = lda_model_name
-            # Update the value of the Index of the LDA Model
-            lda_index_path = join(self.data_folder, self.lda_folder,
-                                  self.lda_index_file)
-            with open(lda_index_path, 'wb') as file:
-                pickle.dump(self.lda_index, file)
+            self.add_lda_model(lda_params, lda_model_name)
 
             # Update the latest use LDA Model to use in Jupyter Notebook
             current_lda_path = join(self.data_folder, self.current_lda_file)
@@ -187,6 +257,65 @@ class TopicManager:
             # Return the calculated LDA Model
             return lda_model
 
+    def new_lda_name(self, reserved_names=()):
+        """
+        Create the name of the file of a new LDA Model, after the names of the
+        models in the index.
+        :param reserved_names: Names that are going to be used by models not
+        yet in the index (e.g. the models of a sweep being trained).
+        :return: A string with the name of the model.
+        """
+        lda_ids = [int(lda_model_name[len(self.lda_prefix):])
+                   for lda_model_name in list(self.lda_index.values()) + list(reserved_names)]
+        lda_id = max(lda_ids, default=0) + 1
+        return self.lda_prefix + str(lda_id)
+
+    def add_lda_model(self, lda_params, lda_model_name):
+        """
+        Save the name of a trained LDA Model in the index of the models.
+        :param lda_params: The tuple with the parameters of the model.
+        :param lda_model_name: The name of the file of the model.
+        """
+        self.lda_index[lda_params] = lda_model_name
+        # Update the value of the Index of the LDA Model
+        lda_index_path = join(self.data_folder, self.lda_folder,
+                              self.lda_index_file)
+        with open(lda_index_path + '.temp', 'wb') as file:
+            pickle.dump(self.lda_index, file)
+        replace(lda_index_path + '.temp', lda_index_path)
+
+    def _estimate_alpha(self, lda_model, chunksize):
+        """
+        Estimate an asymmetric alpha for a trained LDA Model, going once through
+        the corpus. For each chunk of documents, their topic weights are
+        inferred with the model, and alpha is updated with the same Newton step
+        LdaModel uses with alpha='auto'.
+        :param lda_model: The trained LDA Model.
+        :param chunksize: Number of documents in each chunk.
+        """
+        chunk = []
+        chunk_number = 0
+        for doc_bow in self.corpus_bow:
+            chunk.append(doc_bow)
+            if len(chunk) < chunksize:
+                continue
+            chunk_number += 1
+            self._update_alpha(lda_model, chunk, chunk_number)
+            chunk = []
+        if chunk:
+            self._update_alpha(lda_model, chunk, chunk_number + 1)
+
+    @staticmethod
+    def _update_alpha(lda_model, chunk, chunk_number):
+        """
+        Update the alpha of the model with the topic weights of a chunk of
+        documents. The step gets smaller with each chunk, like the updates of
+        the model during its training.
+        """
+        gamma, _ = lda_model.inference(chunk)
+        rho = pow(lda_model.offset + chunk_number, -lda_model.decay)
+        lda_model.update_alpha(gamma, rho)
+
     @classmethod
     def is_topic_manager_saved(cls):
         """